@@ -1,51 +1,772 @@
-from flask import Flask, render_template, request, jsonify, session, send_from_directory
+from flask import Flask, render_template, request, jsonify, session, send_from_directory, stream_with_context, g, has_app_context, has_request_context
 import sqlite3
 import os
 import re 
+import threading
+import heapq
+import random
+import time
+import itertools
+import json
+import hmac
+import base64
+import csv
+from collections import deque, OrderedDict
 from datetime import datetime, timedelta
-import joblib 
 import numpy as np
+from scipy.optimize import linear_sum_assignment
+import model_registry
+from metrics import Counter, Gauge, Histogram, Registry, process_rss_bytes, CONTENT_TYPE as METRICS_CONTENT_TYPE
 
 # Create Flask app
 app = Flask(__name__)
 app.secret_key = 'serbas_hospital_secret_key' 
 
 DB_NAME = 'hospital_hybrid_final.db'
+DB_TIMEOUT = 10  # seconds a writer waits on busy_timeout for the lock
+DB_WRITE_RETRIES = 5
+# Sharded storage: one database file per hospital in this directory plus catalog.db (hospitals, logins,
+# transfer costs), so branches no longer share one write lock. Unset = everything in DB_NAME.
+# Create the layout from an existing DB_NAME with split_db.py.
+SHARD_DIR = os.environ.get('SERBAS_SHARD_DIR')
+CATALOG_NAME = 'catalog.db'
+
+# --- METRICS ---
+# Served on /metrics. Stages: rules, random_forest, kmeans, bed_csp, lock_wait (BEGIN IMMEDIATE), commit.
+METRICS = Registry()
+STAGE_SECONDS = METRICS.register(Histogram('serbas_stage_seconds', 'Time spent per admission pipeline stage', ['stage']))
+REQUEST_SECONDS = METRICS.register(Histogram('serbas_request_seconds', 'Request latency per route', ['route', 'method', 'status']))
+REQUEST_QUERIES = METRICS.register(Histogram('serbas_request_db_queries', 'SQLite statements executed per request', ['route'], buckets=(0, 1, 2, 5, 10, 20, 50, 100, 200, 500)))
+DB_QUERY_SECONDS = METRICS.register(Histogram('serbas_db_query_seconds', 'SQLite statement execution time by statement kind', ['kind']))
+ML_FALLBACKS = METRICS.register(Counter('serbas_ml_fallbacks_total', 'Predictions answered without the model', ['model', 'reason']))
+
+def free_beds_gauge():
+    with FREE_BEDS_LOCK: return {(hid, t): len(beds) for hid, types in FREE_BEDS.items() for t, beds in types.items()}
+
+def waiting_gauge():
+    with WAITING_LOCK: return {(): len(WAITING_ENTRIES)}
+
+METRICS.register(Gauge('serbas_free_beds', 'Free beds in the in-memory index', ['hospital', 'type'], free_beds_gauge))
+METRICS.register(Gauge('serbas_waiting_patients', 'Patients in the in-memory waiting queue', [], waiting_gauge))
+
+# --- PREDICTION CACHE ---
+# Vitals are whole numbers (temperature to 0.1 °C) over narrow clinical ranges, so the same feature tuples
+# recur constantly. Model outputs are memoised per tuple in a bounded LRU; load_ml_models() clears it.
+PREDICTION_CACHE_SIZE = int(os.environ.get('SERBAS_PREDICTION_CACHE_SIZE', 20000))  # entries per model, 0 disables
+PREDICTION_CACHE_PREWARM = os.environ.get('SERBAS_PREWARM_CACHE') == '1'  # fill from TRAINING_CSVS at startup
+TRAINING_CSVS = ('new_random_synthetic_data.csv', 'synthetic_triage_data.csv')
+PREDICTION_CACHE_EVENTS = METRICS.register(Counter('serbas_prediction_cache_total', 'Prediction cache hits, misses and evictions', ['model', 'result']))
+
+class PredictionCache:
+    def __init__(self, model, size):
+        self.model, self.size = model, size
+        self.entries = OrderedDict()
+        self.generation = 0  # bumped by clear(); results computed against an older model are not stored
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        if key is None or not self.size: return None
+        with self.lock:
+            value = self.entries.get(key)
+            if value is not None: self.entries.move_to_end(key)
+        PREDICTION_CACHE_EVENTS.inc(self.model, 'miss' if value is None else 'hit')
+        return value
+
+    def put(self, key, value, generation):
+        if key is None or not self.size: return
+        with self.lock:
+            if generation != self.generation: return
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            evicted = max(0, len(self.entries) - self.size)
+            for _ in range(evicted): self.entries.popitem(last=False)
+        if evicted: PREDICTION_CACHE_EVENTS.inc(self.model, 'eviction', amount=evicted)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.generation += 1
+
+SEVERITY_CACHE = PredictionCache('random_forest', PREDICTION_CACHE_SIZE)
+CLUSTER_CACHE = PredictionCache('kmeans', PREDICTION_CACHE_SIZE)
+METRICS.register(Gauge('serbas_prediction_cache_entries', 'Entries held by the prediction cache', ['model'],
+                       lambda: {(cache.model,): len(cache.entries) for cache in (SEVERITY_CACHE, CLUSTER_CACHE)}))
 
 # --- MODEL LOADING ---
-ML_MODEL = None
-KMEANS_MODEL = None
-SCALER = None
-HIGH_RISK_CLUSTER = None
-MODEL_LOAD_SUCCESS = False
-KMEANS_LOAD_SUCCESS = False
-
-RF_MODEL_PATH = 'random_forest_model.joblib'
-KMEANS_MODEL_PATH = 'kmeans_model.joblib'
-SCALER_PATH = 'vitals_scaler.joblib'
-HIGH_RISK_INDEX_PATH = 'high_risk_cluster_index.joblib'
-
-def load_ml_models():
-    global ML_MODEL, MODEL_LOAD_SUCCESS, KMEANS_MODEL, SCALER, HIGH_RISK_CLUSTER, KMEANS_LOAD_SUCCESS
-    try:
-        ML_MODEL = joblib.load(RF_MODEL_PATH)
-        MODEL_LOAD_SUCCESS = True
-        print(f"✅ Supervised Model Loaded")
-    except Exception as e:
-        print(f"❌ Supervised Failed: {e}")
-        MODEL_LOAD_SUCCESS = False
+# The active ModelBundle (model_registry.py). Prediction code reads it once per call via current_models()
+# and uses that reference throughout, so a hot swap is one reference assignment: in-flight requests
+# finish on the bundle they started with and the next call sees the new one.
+MODELS = None
+MODELS_LOCK = threading.RLock()
+MODEL_WATCHER_PID = None
+PROCESS_STARTED = time.time()
+STARTUP_SECONDS = None  # process start -> first bundle ready, per worker
+
+# 'sklearn' (joblib artifacts) or 'compiled' (flat arrays from compile_models.py, same predictions, far less overhead)
+INFERENCE_ENGINE = os.environ.get('SERBAS_INFERENCE_ENGINE', 'sklearn')
+# Load at import (gunicorn --preload: loaded once in the master, pages shared by the forked workers)
+# instead of on the first prediction
+PRELOAD_MODELS = os.environ.get('SERBAS_PRELOAD_MODELS') == '1'
+MODEL_WATCH_INTERVAL = float(os.environ.get('SERBAS_MODEL_WATCH', 0))  # seconds between models/CURRENT polls, 0 = off
+ADMIN_TOKEN = os.environ.get('SERBAS_ADMIN_TOKEN')  # X-Admin-Token for /api/admin/*; unset disables them
+
+def load_ml_models(engine=None, version=None):
+    """Loads a model version (default: the registry's active one), warms it up off the request path and
+    swaps it in. Returns the new bundle. A replacement that lost a model the running bundle has is
+    refused, so a broken publish cannot silently put the app on rule-only triage."""
+    global MODELS, STARTUP_SECONDS
+    bundle = model_registry.load_bundle(version, engine or INFERENCE_ENGINE)
+    bundle.warm_up()
+    with MODELS_LOCK:
+        old = MODELS
+        if old is not None and ((old.rf_ready and not bundle.rf_ready) or (old.kmeans_ready and not bundle.kmeans_ready)):
+            raise RuntimeError(f"Model version {bundle.version} did not load completely; keeping {old.version}")
+        MODELS = bundle
+        # Cached predictions belong to the previous models
+        SEVERITY_CACHE.clear(); CLUSTER_CACHE.clear()
+    if STARTUP_SECONDS is None: STARTUP_SECONDS = time.time() - PROCESS_STARTED
+    print(f"🔄 Models active: {bundle.version} ({bundle.engine}, {bundle.load_seconds:.2f}s)")
+    return bundle
+
+def current_models():
+    """The active bundle, loaded on first use. Also starts this worker's registry watcher (threads do not
+    survive a fork, so it is started lazily in each worker rather than at import)."""
+    global MODELS
+    if MODEL_WATCH_INTERVAL and MODEL_WATCHER_PID != os.getpid(): start_model_watcher()
+    models = MODELS
+    if models is None:
+        with MODELS_LOCK:
+            if MODELS is None:
+                try: load_ml_models()
+                except Exception as e:
+                    print(f"❌ Model loading failed: {e}. Using rule-based triage.")
+                    MODELS = model_registry.ModelBundle(None, INFERENCE_ENGINE, None, None, None, None, None, 0.0)
+            models = MODELS
+    return models
+
+def start_model_watcher():
+    """Polls models/CURRENT and hot-swaps this worker when another process activates a version"""
+    global MODEL_WATCHER_PID
+    with MODELS_LOCK:
+        if MODEL_WATCHER_PID == os.getpid(): return
+        MODEL_WATCHER_PID = os.getpid()
+    def watch():
+        failed = None  # don't retry a version that failed until the pointer moves again
+        while True:
+            time.sleep(MODEL_WATCH_INTERVAL)
+            with MODELS_LOCK:
+                version = model_registry.active_version()
+                if MODELS is None or version in (MODELS.version, failed): continue
+                try: load_ml_models(version=version)
+                except Exception as e:
+                    failed = version
+                    print(f"⚠️ Model reload failed: {e}")
+    threading.Thread(target=watch, name='serbas-model-watcher', daemon=True).start()
+
+def models_info_gauge():
+    models = MODELS
+    return {(models.version, models.engine): 1} if models else {}
+
+METRICS.register(Gauge('serbas_model_info', 'Model version and engine serving this process', ['version', 'engine'], models_info_gauge))
+METRICS.register(Gauge('serbas_model_load_seconds', 'Time taken to load the active model version', [],
+                       lambda: {(): round(MODELS.load_seconds, 4)} if MODELS else {}))
+METRICS.register(Gauge('serbas_startup_seconds', 'Process start until the first model version was ready', [],
+                       lambda: {(): round(STARTUP_SECONDS, 4)} if STARTUP_SECONDS is not None else {}))
+METRICS.register(Gauge('serbas_process_resident_bytes', 'Resident memory of this worker', [], lambda: {(): process_rss_bytes()}))
+
+if PRELOAD_MODELS: load_ml_models()
+
+# --- FREE-BED INDEX ---
+# hospital_id -> bed type -> {bed_id: None}. Dicts keep insertion order, so popitem() is an O(1) pop
+# and re-inserting a freed bed is an O(1) push. SQLite stays the source of truth (write-through).
+FREE_BEDS = {}
+FREE_BEDS_LOCK = threading.Lock()
+FREE_BEDS_READY = False
+
+def rebuild_bed_index(conn):
+    """Reloads the free-bed index from the beds table (startup, or after a rolled back write)"""
+    global FREE_BEDS, FREE_BEDS_READY
+    index = {}
+    # Descending ids so the first pop hands out the lowest id, like the old LIMIT 1 probe
+    for db in data_dbs(conn):
+        for hid, bed_type, bid in db.execute("SELECT hospital_id, type, id FROM beds WHERE status='available' ORDER BY hospital_id, type, id DESC"):
+            index.setdefault(hid, {}).setdefault(bed_type, {})[bid] = None
+    with FREE_BEDS_LOCK:
+        FREE_BEDS = index
+        FREE_BEDS_READY = True
+
+def ensure_bed_index(conn):
+    if not FREE_BEDS_READY: rebuild_bed_index(conn)
+
+def free_bed_counts(hid):
+    with FREE_BEDS_LOCK:
+        return {bed_type: len(beds) for bed_type, beds in FREE_BEDS.get(hid, {}).items()}
+
+def pop_free_bed(hid, bed_type):
+    with FREE_BEDS_LOCK:
+        beds = FREE_BEDS.get(hid, {}).get(bed_type)
+        return beds.popitem()[0] if beds else None
+
+def push_free_bed(hid, bed_type, bed_id):
+    with FREE_BEDS_LOCK:
+        FREE_BEDS.setdefault(hid, {}).setdefault(bed_type, {})[bed_id] = None
+
+def drop_free_bed(hid, bed_type, bed_id):
+    with FREE_BEDS_LOCK:
+        FREE_BEDS.get(hid, {}).get(bed_type, {}).pop(bed_id, None)
+
+def push_free_beds(hid, bed_type, bed_ids):
+    with FREE_BEDS_LOCK:
+        FREE_BEDS.setdefault(hid, {}).setdefault(bed_type, {}).update(dict.fromkeys(bed_ids))
+
+def drop_free_beds(hid, bed_type, bed_ids):
+    with FREE_BEDS_LOCK:
+        beds = FREE_BEDS.get(hid, {}).get(bed_type, {})
+        for bed_id in bed_ids: beds.pop(bed_id, None)
+
+# --- WAITING QUEUE ---
+# hospital_id -> bed type -> heap of (-priority_score, arrival rowid, patient_id). A waiting patient is pushed onto
+# the heap of every bed type their search order accepts; WAITING_ENTRIES holds each patient's live entry, so the
+# copies left in the other heaps (patient placed, discharged or re-queued) are skipped lazily when popped.
+WAITING_HEAPS = {}
+WAITING_ENTRIES = {}
+WAITING_LOCK = threading.Lock()
+WAITING_READY = False
+
+def rebuild_waiting_queue(conn):
+    global WAITING_HEAPS, WAITING_ENTRIES, WAITING_READY
+    heaps, entries = {}, {}
+    rows = (row for db in data_dbs(conn) for row in db.execute("SELECT rowid, id, hospital_id, priority_score, severity, doctor_recommendation FROM patients WHERE status='waiting'"))
+    for rowid, pid, hid, priority, sev, pref in rows:
+        entry = entries[pid] = (-(priority or 0), rowid, pid)
+        for bed_type in bed_search_order(sev, pref)[1]:
+            heaps.setdefault(hid, {}).setdefault(bed_type, []).append(entry)
+    for by_type in heaps.values():
+        for heap in by_type.values(): heapq.heapify(heap)
+    with WAITING_LOCK:
+        WAITING_HEAPS, WAITING_ENTRIES = heaps, entries
+        WAITING_READY = True
+
+def ensure_waiting_queue(conn):
+    if not WAITING_READY: rebuild_waiting_queue(conn)
+
+def enqueue_waiting(hid, pid, priority, arrival, sev, pref):
+    entry = (-(priority or 0), arrival, pid)
+    with WAITING_LOCK:
+        WAITING_ENTRIES[pid] = entry
+        for bed_type in bed_search_order(sev, pref)[1]:
+            heapq.heappush(WAITING_HEAPS.setdefault(hid, {}).setdefault(bed_type, []), entry)
 
+def peek_waiting(hid, bed_type):
+    """Highest priority (then earliest) live waiting patient who accepts bed_type, or None.
+    Stale entries on top are discarded; the patient stays queued until remove_waiting."""
+    with WAITING_LOCK:
+        heap = WAITING_HEAPS.get(hid, {}).get(bed_type)
+        while heap:
+            entry = heap[0]
+            if WAITING_ENTRIES.get(entry[2]) is entry: return entry[2]
+            heapq.heappop(heap)
+    return None
+
+def remove_waiting(pid):
+    with WAITING_LOCK: WAITING_ENTRIES.pop(pid, None)
+
+def waiting_snapshot(hid):
+    """Live queue per bed type, best first. O(n log n), meant for the API listing only."""
+    with WAITING_LOCK:
+        return {bed_type: [e for e in sorted(heap) if WAITING_ENTRIES.get(e[2]) is e] for bed_type, heap in WAITING_HEAPS.get(hid, {}).items()}
+
+def reload_bed_state(conn):
+    """Resyncs every in-memory structure with SQLite, e.g. after a rolled back transaction"""
+    rebuild_bed_index(conn)
+    rebuild_waiting_queue(conn)
+    reset_dashboard_stats()
+    reset_routing_table()
+
+# --- DASHBOARD COUNTERS ---
+# hospital_id -> {'total_beds', 'available_beds', 'icu_beds', 'flexible_beds', 'critical_load', 'version', 'db_version'}.
+# Loaded once per hospital with compute_dashboard_stats(), then kept current by bump_dashboard() from every
+# bed/patient mutation. Deltas are applied only after their transaction commits, under COMMIT_LOCK, so a
+# concurrent first load can neither miss nor double count a change. Counters are per process, so every
+# transaction that bumps them also increments the hospital's row in dashboard_versions. A worker remembers
+# the version its counters reflect and reloads them (new ETag) when the database has moved past it, i.e.
+# when another process committed a change.
+DASHBOARD_STATS = {}
+COMMIT_LOCK = threading.RLock()
+DASHBOARD_VERSION = itertools.count(1)
+PROCESS_EPOCH = f"{os.getpid():x}{int(time.time()):x}"  # ETags from another worker or a restart never match
+
+def compute_dashboard_stats(conn, hid=None):
+    """All counters from a single grouped aggregate over beds and the patients holding them"""
+    sql = """SELECT b.hospital_id, COUNT(*), SUM(b.status='available'), SUM(b.type='icu'), SUM(b.type='flexible'),
+                    SUM(b.status='occupied' AND p.status='allocated' AND p.severity='high')
+             FROM beds b LEFT JOIN patients p ON p.id = b.patient_id"""
+    sql += " WHERE b.hospital_id=? GROUP BY b.hospital_id" if hid else " GROUP BY b.hospital_id"
+    return {r[0]: {'total_beds': r[1], 'available_beds': r[2] or 0, 'icu_beds': r[3] or 0, 'flexible_beds': r[4] or 0, 'critical_load': r[5] or 0}
+            for r in conn.execute(sql, (hid,) if hid else ())}
+
+def stats_version(conn, hid):
+    """How many counter-changing transactions have been committed for hid, by any process"""
+    row = conn.execute("SELECT version FROM dashboard_versions WHERE hospital_id=?", (hid,)).fetchone()
+    return row[0] if row else 0
+
+def load_dashboard_stats(conn, hid):
+    stats = DASHBOARD_STATS.get(hid)
+    if stats is not None: return stats
+    with COMMIT_LOCK:  # no commit can land between the aggregate and publishing the counters
+        stats = DASHBOARD_STATS.get(hid)
+        if stats is None:
+            own = not conn.in_transaction
+            if own: conn.execute('BEGIN')  # the aggregate and its version from one snapshot
+            try:
+                db_version = stats_version(conn, hid)
+                stats = compute_dashboard_stats(conn, hid).get(hid) or {'total_beds': 0, 'available_beds': 0, 'icu_beds': 0, 'flexible_beds': 0, 'critical_load': 0}
+            finally:
+                if own: conn.commit()
+            stats['version'], stats['db_version'] = next(DASHBOARD_VERSION), db_version
+            DASHBOARD_STATS[hid] = stats
+    return stats
+
+def drop_stale_dashboard(conn, hid):
+    """Forgets hid's counters if another process committed a change since they were loaded"""
+    stats = DASHBOARD_STATS.get(hid)
+    if stats is None or stats['db_version'] == stats_version(conn, hid): return
+    with COMMIT_LOCK:
+        if DASHBOARD_STATS.get(hid) is stats: del DASHBOARD_STATS[hid]
+
+def public_stats(stats):
+    out = {k: v for k, v in stats.items() if k not in ('version', 'db_version')}
+    out['occupied_beds'] = out['total_beds'] - out['available_beds']
+    return out
+
+def bump_dashboard(hid, **deltas):
+    """Queues counter deltas for hid; they are applied when the current write transaction commits"""
+    versions = getattr(DB_LOCAL, 'stats_versions', None)
+    if versions is not None and hid not in versions:
+        # Once per transaction and hospital: record the change for the other workers
+        conn = DB_LOCAL.tx_conn
+        conn.execute("INSERT INTO dashboard_versions (hospital_id, version) VALUES (?, 1) ON CONFLICT(hospital_id) DO UPDATE SET version = version + 1", (hid,))
+        versions[hid] = stats_version(conn, hid)
+    written = versions.get(hid) if versions is not None else None
+    def apply():
+        stats = DASHBOARD_STATS.get(hid)
+        if stats is None: return  # not loaded yet; the first poll reads the committed rows instead
+        if written is not None:
+            if stats['db_version'] not in (written - 1, written):
+                del DASHBOARD_STATS[hid]  # missed another process's commit: reload on the next poll
+                return
+            stats['db_version'] = written
+        for key, delta in deltas.items(): stats[key] += delta
+        stats['version'] = next(DASHBOARD_VERSION)
+    after_commit(apply)
+
+def reset_dashboard_stats():
+    with COMMIT_LOCK: DASHBOARD_STATS.clear()
+
+# --- EVENT STREAM ---
+# Every committed change is a row in the events table of the hospital's database, appended on the write
+# transaction that made it, so changes from every worker process reach every stream. A process polls each
+# database file from one EventDispatcher thread (every EVENT_POLL seconds, at once after a local commit) while
+# it has subscribers, and fans the new rows out to per-hospital channels with a fresh 'stats' event after each
+# batch. /api/events streams a channel from the Flask worker, which parks one server thread per open stream;
+# event_server.py serves the same stream to every dashboard from a single asyncio thread (see README).
+# Event ids are the rows' seq, so a browser can resume on any worker and after a restart.
+EVENT_BUFFER_SIZE = int(os.environ.get('SERBAS_EVENT_BUFFER', 1000))  # events kept per database file, and per channel
+EVENT_POLL = float(os.environ.get('SERBAS_EVENT_POLL', 0.25))  # seconds between polls of the events table
+EVENT_KEEPALIVE = 15  # seconds between comment lines, so proxies keep idle streams open
+EVENT_PRUNE_EVERY = 256  # appends between trims of the events table
+EVENT_CHANNELS = {}   # hospital_id -> {'log': deque of (seq, event, json), 'evicted': newest seq dropped, 'cond': Condition}
+EVENT_CHANNELS_LOCK = threading.Lock()
+EVENT_DISPATCHERS = {}  # database path -> EventDispatcher, while it has subscribers
+
+def events_db_path(hid):
+    return shard_path(hid) if SHARD_DIR else DB_NAME
+
+def append_event(c, hid, event, payload):
+    c.execute("INSERT INTO events (hospital_id, event, data) VALUES (?, ?, ?)", (hid, event, json.dumps(payload)))
+    if c.lastrowid % EVENT_PRUNE_EVERY == 0: c.execute("DELETE FROM events WHERE seq <= ?", (c.lastrowid - EVENT_BUFFER_SIZE,))
+
+def publish_event(hid, event, **payload):
+    """Records a delta for hid's subscribers on the current write transaction; it is streamed once committed"""
+    conn = getattr(DB_LOCAL, 'tx_conn', None)
+    if conn is None:
+        write_transaction(get_db(hid), lambda c: append_event(c, hid, event, payload))
+        return
+    append_event(conn.cursor(), hid, event, payload)
+    after_commit(wake_dispatchers, key=wake_dispatchers)
+
+def publish_patient(c, hid, pid, action):
+    """Patient delta in the same shape as an /api/allocated-patients row"""
+    c.execute(ALLOCATED_PATIENT_SQL + " WHERE p.id=?", (pid,))
+    row = c.fetchone()
+    publish_event(hid, 'patient', action=action, patient=allocated_patient_view(row) if row else {'id': pid})
+
+def latest_event(conn):
+    return conn.execute("SELECT COALESCE(MAX(seq), 0) FROM events").fetchone()[0]
+
+def stats_event(conn, hid):
+    drop_stale_dashboard(conn, hid)
+    return json.dumps(public_stats(load_dashboard_stats(conn, hid)))
+
+def resume_point(conn, hid, last_event_id):
+    """(latest seq, events of hid after last_event_id, stats json) for a new stream. The events are None when
+    they can no longer be replayed (trimmed, or an id from another database) and the browser must resync."""
+    oldest, latest = conn.execute("SELECT COALESCE(MIN(seq), 1), COALESCE(MAX(seq), 0) FROM events").fetchone()
+    if not last_event_id: return latest, [], None
+    if not last_event_id.isdigit() or not oldest - 1 <= int(last_event_id) <= latest: return latest, None, None
+    replay = conn.execute("SELECT seq, event, data FROM events WHERE hospital_id=? AND seq > ? ORDER BY seq", (hid, int(last_event_id))).fetchall()
+    return latest, replay, stats_event(conn, hid) if replay else None
+
+def event_batches(conn, after, hids):
+    """(newest seq read, {hid: [(seq, event, json), ...]}) for the events after seq `after`, limited to hids.
+    Each hospital's batch ends with a 'stats' event unless it only holds upgrade suggestions."""
+    rows = conn.execute("SELECT seq, hospital_id, event, data FROM events WHERE seq > ? ORDER BY seq LIMIT ?", (after, EVENT_BUFFER_SIZE)).fetchall()
+    batches = {}
+    for seq, hid, event, data in rows:
+        if hid in hids: batches.setdefault(hid, []).append((seq, event, data))
+    for hid, events in batches.items():
+        if any(event != 'upgrade' for _, event, _ in events): events.append((events[-1][0], 'stats', stats_event(conn, hid)))
+    return (rows[-1][0] if rows else after), batches
+
+def sse_frame(seq, event, data='{}'):
+    return f"id: {seq}\nevent: {event}\ndata: {data}\n\n"
+
+def event_channel(hid):
+    channel = EVENT_CHANNELS.get(hid)
+    if channel is None:
+        with EVENT_CHANNELS_LOCK:
+            channel = EVENT_CHANNELS.setdefault(hid, {'log': deque(maxlen=EVENT_BUFFER_SIZE), 'evicted': 0, 'cond': threading.Condition()})
+    return channel
+
+class EventDispatcher:
+    """Polls one database file's events table for this process's subscribers and fills their channels"""
+    def __init__(self, path, after):
+        self.path, self.seq, self.subscribers = path, after, 0
+        self.wake = threading.Event()
+        threading.Thread(target=self.run, name=f'events-{os.path.basename(path)}', daemon=True).start()
+
+    def run(self):
+        while True:
+            self.wake.wait(EVENT_POLL); self.wake.clear()
+            with EVENT_CHANNELS_LOCK:
+                if not self.subscribers:
+                    del EVENT_DISPATCHERS[self.path]
+                    break
+                hids = set(EVENT_CHANNELS)
+            try: self.poll(hids)
+            except sqlite3.Error: pass  # locked or gone; the next poll retries
+        close_thread_dbs()
+
+    def poll(self, hids):
+        before = self.seq
+        self.seq, batches = event_batches(pooled_db(self.path), before, hids)
+        for hid, events in batches.items():
+            channel = event_channel(hid)
+            with channel['cond']:
+                for event in events:
+                    if len(channel['log']) == channel['log'].maxlen: channel['evicted'] = channel['log'][0][0]
+                    channel['log'].append(event)
+                channel['cond'].notify_all()
+        if self.seq - before >= EVENT_BUFFER_SIZE: self.wake.set()  # a full page: read on without waiting
+
+def wake_dispatchers():
+    for dispatcher in list(EVENT_DISPATCHERS.values()): dispatcher.wake.set()
+
+def subscribe_events(conn, hid):
+    """Registers a stream for hid. Call before resume_point(): the dispatcher starts from the events table's
+    newest row at this moment, so nothing committed between the two is missed."""
+    path = events_db_path(hid)
+    event_channel(hid)
+    with EVENT_CHANNELS_LOCK:
+        dispatcher = EVENT_DISPATCHERS.get(path)
+        if dispatcher is None: dispatcher = EVENT_DISPATCHERS[path] = EventDispatcher(path, latest_event(conn))
+        dispatcher.subscribers += 1
+    return dispatcher
+
+def unsubscribe_events(dispatcher):
+    with EVENT_CHANNELS_LOCK: dispatcher.subscribers -= 1
+
+def event_stream(hid, last_event_id=None):
+    """SSE frames for hid, first replaying what the browser missed since last_event_id when the events table
+    still holds it; otherwise a 'resync' event tells it to reload"""
+    with app.app_context():
+        conn = get_db(hid)
+        dispatcher = subscribe_events(conn, hid)
+        seq, replay, stats = resume_point(conn, hid, last_event_id)
     try:
-        KMEANS_MODEL = joblib.load(KMEANS_MODEL_PATH)
-        SCALER = joblib.load(SCALER_PATH)
-        HIGH_RISK_CLUSTER = joblib.load(HIGH_RISK_INDEX_PATH)
-        KMEANS_LOAD_SUCCESS = True
-        print(f"✅ Unsupervised Loaded (Cluster {HIGH_RISK_CLUSTER})")
-    except Exception as e:
-        print(f"⚠️ Unsupervised Failed: {e}")
-        KMEANS_LOAD_SUCCESS = False
+        if replay is None: yield sse_frame(seq, 'resync')
+        yield "retry: 3000\n" + sse_frame(last_event_id if replay else seq, 'hello')
+        for event in replay or (): yield sse_frame(*event)
+        if stats: yield sse_frame(seq, 'stats', stats)
+        channel = event_channel(hid)
+        while True:
+            with channel['cond']:
+                log = channel['log']
+                if not log or log[-1][0] <= seq: channel['cond'].wait(EVENT_KEEPALIVE)
+                missed = channel['evicted'] > seq
+                pending = [e for e in log if e[0] > seq] if not missed else []
+                newest = log[-1][0] if log else seq
+            if missed:
+                seq = newest
+                yield sse_frame(seq, 'resync')
+            elif not pending:
+                yield ": keepalive\n\n"
+            for event in pending:
+                seq = event[0]
+                yield sse_frame(*event)
+    finally:
+        unsubscribe_events(dispatcher)
 
-load_ml_models()
+# --- DB ACCESS ---
+# Requests check a connection out of a bounded pool per database file on first use and hand it back when
+# their app context ends, so the threaded dev server (a new thread per request) reuses connections instead
+# of opening one per request. Streamed responses (NDJSON listings) keep theirs until the response is closed
+# (hold_request_dbs). Code outside an app context (startup, scripts, benchmarks, background threads)
+# keeps one connection per thread; close_thread_dbs() closes them.
+DB_PRAGMAS = (
+    ('journal_mode', 'WAL'),      # readers stop blocking behind the writer
+    ('synchronous', 'NORMAL'),    # fsync at checkpoints only; still crash-safe under WAL
+    ('cache_size', -16000),       # ~16 MB page cache per connection
+    ('mmap_size', 268435456),     # serve reads from a 256 MB memory map
+    ('temp_store', 'MEMORY'),
+)
+
+# (user_version, statements). Append only; every database is brought up to the last version on first use.
+SCHEMA_MIGRATIONS = [
+    (1, ["CREATE INDEX IF NOT EXISTS idx_beds_hospital_type_status ON beds (hospital_id, type, status)",
+         "CREATE INDEX IF NOT EXISTS idx_patients_hospital_status ON patients (hospital_id, status)"]),
+    # Keyset pagination order of the two listings
+    (2, ["CREATE INDEX IF NOT EXISTS idx_patients_hospital_status_admitted ON patients (hospital_id, status, admission_date)",
+         "CREATE INDEX IF NOT EXISTS idx_beds_hospital_type_id ON beds (hospital_id, type, id)"]),
+    # Last bed number issued per hospital and id prefix (see reserve_bed_numbers)
+    (3, ["CREATE TABLE IF NOT EXISTS bed_sequences (hospital_id TEXT NOT NULL, prefix TEXT NOT NULL, value INTEGER NOT NULL, PRIMARY KEY (hospital_id, prefix)) WITHOUT ROWID"]),
+    # Stored discharge timeline for /api/discharge-forecast; existing stays are due at midnight of their date
+    (4, ["ALTER TABLE patients ADD COLUMN expected_discharge TEXT",
+         "UPDATE patients SET expected_discharge = datetime(admission_date, '+' || expected_stay_days || ' days') WHERE status='allocated' AND expected_stay_days",
+         "CREATE INDEX IF NOT EXISTS idx_patients_hospital_status_discharge ON patients (hospital_id, status, expected_discharge)"]),
+    # Configured cost (e.g. minutes by ambulance) of diverting a patient between two hospitals, for overflow routing
+    (5, ["CREATE TABLE IF NOT EXISTS transfer_costs (from_hospital TEXT NOT NULL, to_hospital TEXT NOT NULL, cost REAL NOT NULL, PRIMARY KEY (from_hospital, to_hospital)) WITHOUT ROWID"]),
+    # Per-hospital count of committed dashboard counter changes, so each worker can spot other workers' writes
+    (6, ["CREATE TABLE IF NOT EXISTS dashboard_versions (hospital_id TEXT PRIMARY KEY, version INTEGER NOT NULL) WITHOUT ROWID"]),
+    # Committed changes for /api/events and event_server.py, read by every worker process (see EVENT STREAM)
+    (7, ["CREATE TABLE IF NOT EXISTS events (seq INTEGER PRIMARY KEY AUTOINCREMENT, hospital_id TEXT NOT NULL, event TEXT NOT NULL, data TEXT NOT NULL)"]),
+]
+
+DB_POOL_SIZE = int(os.environ.get('SERBAS_DB_POOL_SIZE', 8))  # most open connections per database file
+DB_POOLS = {}  # path -> ConnectionPool
+DB_POOLS_LOCK = threading.Lock()
+DB_LOCAL = threading.local()
+SCHEMA_READY = set()  # database paths already brought up to the current schema by this process
+
+def query_kind(sql):
+    return sql.lstrip()[:6].upper().rstrip()  # SELECT, INSERT, UPDATE, DELETE, BEGIN, PRAGMA, ...
+
+class MeteredCursor(sqlite3.Cursor):
+    """Times every statement into DB_QUERY_SECONDS and counts it against the current request"""
+    def execute(self, sql, params=()):
+        DB_LOCAL.queries = getattr(DB_LOCAL, 'queries', 0) + 1
+        start = time.perf_counter()
+        try: return super().execute(sql, params)
+        finally: DB_QUERY_SECONDS.observe(time.perf_counter() - start, query_kind(sql))
+
+    def executemany(self, sql, seq):
+        DB_LOCAL.queries = getattr(DB_LOCAL, 'queries', 0) + 1
+        start = time.perf_counter()
+        try: return super().executemany(sql, seq)
+        finally: DB_QUERY_SECONDS.observe(time.perf_counter() - start, query_kind(sql))
+
+class MeteredConnection(sqlite3.Connection):
+    def cursor(self, factory=MeteredCursor): return super().cursor(factory)
+    def execute(self, sql, params=()): return self.cursor().execute(sql, params)
+    def executemany(self, sql, seq): return self.cursor().executemany(sql, seq)
+
+def open_db(path):
+    # Pooled connections move between request threads, but only ever serve one request at a time
+    conn = sqlite3.connect(path, timeout=DB_TIMEOUT, factory=MeteredConnection, check_same_thread=False)
+    for name, value in DB_PRAGMAS: conn.execute(f"PRAGMA {name}={value}")
+    return conn
+
+def migrate_db(conn):
+    """Applies SCHEMA_MIGRATIONS newer than PRAGMA user_version, one transaction per version"""
+    for version, statements in SCHEMA_MIGRATIONS:
+        if conn.execute("PRAGMA user_version").fetchone()[0] >= version: continue
+        conn.execute("BEGIN IMMEDIATE")
+        # Re-check under the write lock: another worker may have applied it while we waited
+        if conn.execute("PRAGMA user_version").fetchone()[0] < version:
+            for sql in statements: conn.execute(sql)
+            conn.execute(f"PRAGMA user_version = {version}")
+        conn.commit()
+
+def shard_path(hid):
+    if not hid or os.sep in hid or '/' in hid or hid.startswith('.'): raise ValueError(f"Invalid hospital id for a shard: {hid!r}")
+    return os.path.join(SHARD_DIR, f"{hid}.db")
+
+class ConnectionPool:
+    """At most `size` open connections to one database file, idle ones reused most recently returned first"""
+    def __init__(self, path, size):
+        self.path, self.idle = path, []
+        self.slots = threading.BoundedSemaphore(size)
+        self.lock = threading.Lock()
+
+    def checkout(self):
+        if not self.slots.acquire(timeout=DB_TIMEOUT):
+            raise sqlite3.OperationalError(f"No free connection to {self.path} after {DB_TIMEOUT}s")
+        with self.lock: conn = self.idle.pop() if self.idle else None
+        try: return conn or open_db(self.path)
+        except:
+            self.slots.release()
+            raise
+
+    def checkin(self, conn):
+        try:
+            if conn.in_transaction: conn.rollback()  # never hand a half-finished transaction to the next request
+            with self.lock: self.idle.append(conn)
+        except sqlite3.Error:
+            conn.close()
+        finally:
+            self.slots.release()
+
+def db_pool(path):
+    pool = DB_POOLS.get(path)
+    if pool is None:
+        with DB_POOLS_LOCK: pool = DB_POOLS.setdefault(path, ConnectionPool(path, DB_POOL_SIZE))
+    return pool
+
+def checkin_dbs(conns):
+    for path, conn in conns.items(): db_pool(path).checkin(conn)
+
+def release_request_dbs():
+    """Returns the connections the current app context checked out to their pools"""
+    checkin_dbs(g.pop('db_conns', {}))
+
+def hold_request_dbs(resp):
+    """Keeps the request's connections out of the pool until resp is closed, for responses that stream rows
+    off an open cursor after the request's teardown has run"""
+    held = g.pop('db_conns', {})
+    resp.call_on_close(lambda: checkin_dbs(held))
+    return resp
+
+def close_thread_dbs():
+    for conn in (getattr(DB_LOCAL, 'conns', None) or {}).values(): conn.close()
+    DB_LOCAL.conns = None
+
+def pooled_db(path):
+    """A connection to path for the current request (checked out of its pool) or, outside an app context,
+    for this thread. Opened, and the schema migrated, on first use."""
+    if has_app_context():
+        held = g.setdefault('db_conns', {})
+        conn = held.get(path)
+        if conn is None: conn = held[path] = db_pool(path).checkout()
+    else:
+        conns = getattr(DB_LOCAL, 'conns', None)
+        if conns is None or DB_LOCAL.layout != (DB_NAME, SHARD_DIR):
+            # DB_NAME / SHARD_DIR were repointed (tests, benchmarks): drop connections to the old layout
+            close_thread_dbs()
+            conns = DB_LOCAL.conns = {}
+            DB_LOCAL.layout = (DB_NAME, SHARD_DIR)
+        conn = conns.get(path)
+        if conn is None: conn = conns[path] = open_db(path)
+    if path not in SCHEMA_READY:
+        create_tables(conn.cursor()); conn.commit()
+        migrate_db(conn)
+        SCHEMA_READY.add(path)
+    return conn
+
+def get_db(hid=None):
+    """The pooled connection for hid's beds and patients. Routes must not close it; it goes back to the pool
+    when the request ends.
+
+    Single-file mode: always DB_NAME. Sharded mode: hid's shard, by default the session's hospital;
+    the catalog when there is neither.
+    """
+    if not SHARD_DIR: return pooled_db(DB_NAME)
+    if hid is None and has_request_context(): hid = session.get('hospital_id')
+    return pooled_db(shard_path(hid)) if hid else get_catalog_db()
+
+def get_catalog_db():
+    """Connection holding the hospitals and transfer_costs tables (the same one as get_db() in single-file mode)"""
+    if not SHARD_DIR: return pooled_db(DB_NAME)
+    os.makedirs(SHARD_DIR, exist_ok=True)
+    return pooled_db(os.path.join(SHARD_DIR, CATALOG_NAME))
+
+def hospital_ids():
+    return [hid for (hid,) in get_catalog_db().execute("SELECT id FROM hospitals ORDER BY id")]
+
+def data_dbs(conn):
+    """Connections holding bed and patient rows, for whole-system rebuilds: conn itself in single-file mode,
+    every hospital's shard in sharded mode"""
+    return [get_db(hid) for hid in hospital_ids()] if SHARD_DIR else [conn]
+
+def after_commit(fn, key=None):
+    """Runs fn once the enclosing write_transaction commits (dropped on rollback); immediately outside one.
+    Registering again with the same key replaces the earlier callback and moves it to the end."""
+    pending = getattr(DB_LOCAL, 'after_commit', None)
+    if pending is None:
+        with COMMIT_LOCK: fn()
+        return
+    if key is None: key = object()
+    pending.pop(key, None)
+    pending[key] = fn
+
+def write_transaction(conn, work):
+    """Runs work(cursor) inside BEGIN IMMEDIATE and commits.
+
+    IMMEDIATE takes the write lock up front, so concurrent workers queue on the busy timeout instead of
+    failing a read->write lock upgrade half way through. If the lock still cannot be had the attempt is
+    retried with jittered backoff. If work itself fails, in-memory bed state is resynced and the error re-raised.
+    Callbacks registered with after_commit() run right after the commit, under COMMIT_LOCK.
+    """
+    for attempt in range(DB_WRITE_RETRIES):
+        try:
+            with STAGE_SECONDS.time('lock_wait'): conn.execute('BEGIN IMMEDIATE')
+        except sqlite3.OperationalError:
+            if attempt == DB_WRITE_RETRIES - 1: raise
+            time.sleep(random.uniform(0, 0.05 * 2 ** attempt))
+            continue
+        DB_LOCAL.after_commit, DB_LOCAL.stats_versions, DB_LOCAL.tx_conn = {}, {}, conn
+        try:
+            result = work(conn.cursor())
+            with COMMIT_LOCK:
+                with STAGE_SECONDS.time('commit'): conn.commit()
+                for fn in DB_LOCAL.after_commit.values(): fn()
+            return result
+        except Exception:
+            conn.rollback(); reload_bed_state(conn)
+            raise
+        finally:
+            DB_LOCAL.after_commit = DB_LOCAL.stats_versions = DB_LOCAL.tx_conn = None
+
+def next_patient_id(c, hid=None):
+    """Atomic PATnnn sequence; must run inside the caller's write transaction. Each shard keeps its own
+    sequence, so sharded ids carry the hospital ("HOSP001-PAT042") to stay unique across shards."""
+    c.execute("UPDATE id_sequences SET value = value + 1 WHERE name='patient'")
+    if c.rowcount == 0:
+        # First admission on this database: continue from the highest id already issued
+        c.execute("SELECT COALESCE(MAX(CAST(SUBSTR(id, 4) AS INTEGER)), 0) + 1 FROM patients WHERE id LIKE 'PAT%'")
+        c.execute("INSERT INTO id_sequences (name, value) VALUES ('patient', ?)", (c.fetchone()[0],))
+    c.execute("SELECT value FROM id_sequences WHERE name='patient'")
+    n = c.fetchone()[0]
+    return f"{hid}-PAT{n:03d}" if SHARD_DIR and hid else f"PAT{n:03d}"
+
+def claim_bed(c, bed_id, pid):
+    """Marks a bed occupied only if SQLite still has it available; False means another worker got there first"""
+    c.execute("UPDATE beds SET status='occupied', patient_id=?, last_occupied_date=? WHERE id=? AND status='available'", (pid, datetime.now().strftime('%Y-%m-%d'), bed_id))
+    return c.rowcount == 1
+
+def take_free_bed(c, hid, bed_type, pid):
+    """Claims a free bed of bed_type for pid. Index entries another worker already claimed are dropped;
+    if the index runs dry, SQLite is asked for beds freed by other workers this process never saw."""
+    while True:
+        bed = pop_free_bed(hid, bed_type)
+        if not bed or claim_bed(c, bed, pid): break
+    if not bed:
+        c.execute("SELECT id FROM beds WHERE hospital_id=? AND type=? AND status='available' LIMIT 1", (hid, bed_type))
+        row = c.fetchone()
+        bed = row[0] if row and claim_bed(c, row[0], pid) else None
+    if bed:
+        bump_dashboard(hid, available_beds=-1)
+        publish_event(hid, 'bed', bed_id=bed, type=bed_type, status='occupied', patient_id=pid)
+    return bed
 
 # --- HELPER FUNCTIONS ---
 
@@ -61,36 +782,55 @@ def get_next_bed_id(cursor, hospital_id, prefix):
             if num > max_num: max_num = num
     return max_num + 1
 
+def reserve_bed_numbers(c, hospital_id, prefix, n):
+    """Reserves n consecutive bed numbers for prefix and returns the first; must run inside the caller's write transaction"""
+    c.execute("UPDATE bed_sequences SET value = value + ? WHERE hospital_id=? AND prefix=?", (n, hospital_id, prefix))
+    if c.rowcount == 0:
+        # First resize of this prefix: continue from the beds that already exist (one-off scan)
+        c.execute("INSERT INTO bed_sequences (hospital_id, prefix, value) VALUES (?, ?, ?)", (hospital_id, prefix, get_next_bed_id(c, hospital_id, prefix) - 1 + n))
+    c.execute("SELECT value FROM bed_sequences WHERE hospital_id=? AND prefix=?", (hospital_id, prefix))
+    return c.fetchone()[0] - n + 1
+
+# Capacity changes touching more beds than this are announced as a reload instead of listing every bed
+CAPACITY_EVENT_MAX_BEDS = 500
+
 def adjust_bed_capacity(conn, hospital_id, bed_type, target_count, prefix, name):
     c = conn.cursor()
-    c.execute("SELECT id, status FROM beds WHERE hospital_id=? AND type=?", (hospital_id, bed_type))
-    current_beds = c.fetchall()
-    current_count = len(current_beds)
+    c.execute("SELECT COUNT(*) FROM beds WHERE hospital_id=? AND type=?", (hospital_id, bed_type))
+    current_count = c.fetchone()[0]
     
     if target_count > current_count:
         needed = target_count - current_count
-        next_num = get_next_bed_id(c, hospital_id, prefix)
-        for i in range(needed):
-            new_id = f"{prefix}{next_num + i:03d}"
-            c.execute("INSERT INTO beds VALUES (?, ?, ?, ?, 'available', NULL, NULL)", (new_id, hospital_id, bed_type, name))
+        next_num = reserve_bed_numbers(c, hospital_id, prefix, needed)
+        new_ids = [f"{prefix}{next_num + i:03d}" for i in range(needed)]
+        c.executemany("INSERT INTO beds VALUES (?, ?, ?, ?, 'available', NULL, NULL)", [(bid, hospital_id, bed_type, name) for bid in new_ids])
+        push_free_beds(hospital_id, bed_type, new_ids)
+        if needed > CAPACITY_EVENT_MAX_BEDS: publish_event(hospital_id, 'capacity', bed_type=bed_type, ward=name, added=[], removed=[], reload=True)
+        else: publish_event(hospital_id, 'capacity', bed_type=bed_type, ward=name, added=new_ids, removed=[])
+        bump_dashboard(hospital_id, total_beds=needed, available_beds=needed, **dashboard_type_delta(bed_type, needed))
             
     elif target_count < current_count:
         to_remove = current_count - target_count
-        available_ids = [b[0] for b in current_beds if b[1] == 'available']
-        if len(available_ids) < to_remove:
-            raise Exception(f"Cannot reduce {bed_type.upper()} beds to {target_count}. {current_count - len(available_ids)} occupy beds.")
-        ids_to_delete = available_ids[-to_remove:]
-        for bid in ids_to_delete:
-            c.execute("DELETE FROM beds WHERE id=?", (bid,))
-
-def calculate_expected_discharge(admission_date, expected_stay_days):
-    if admission_date and expected_stay_days:
-        try:
-            adm = datetime.strptime(admission_date, '%Y-%m-%d')
-            dis = adm + timedelta(days=int(expected_stay_days))
-            return dis.strftime('%Y-%m-%d')
-        except: return None
-    return None
+        # Newest available beds go first
+        c.execute("SELECT id FROM beds WHERE hospital_id=? AND type=? AND status='available' ORDER BY rowid DESC LIMIT ?", (hospital_id, bed_type, to_remove))
+        ids_to_delete = [row[0] for row in c.fetchall()]
+        if len(ids_to_delete) < to_remove:
+            raise Exception(f"Cannot reduce {bed_type.upper()} beds to {target_count}. {current_count - len(ids_to_delete)} occupy beds.")
+        c.executemany("DELETE FROM beds WHERE id=?", [(bid,) for bid in ids_to_delete])
+        drop_free_beds(hospital_id, bed_type, ids_to_delete)
+        if to_remove > CAPACITY_EVENT_MAX_BEDS: publish_event(hospital_id, 'capacity', bed_type=bed_type, ward=name, added=[], removed=[], reload=True)
+        else: publish_event(hospital_id, 'capacity', bed_type=bed_type, ward=name, added=[], removed=ids_to_delete)
+        bump_dashboard(hospital_id, total_beds=-to_remove, available_beds=-to_remove, **dashboard_type_delta(bed_type, -to_remove))
+
+def dashboard_type_delta(bed_type, n):
+    return {'icu_beds': n} if bed_type == 'icu' else ({'flexible_beds': n} if bed_type == 'flexible' else {})
+
+# patients.expected_discharge uses SQLite's datetime() text format, so stored values compare and
+# range-scan correctly against each other and against datetime() arithmetic in SQL
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+def expected_discharge_at(stay_days, start=None):
+    return ((start or datetime.now()) + timedelta(days=int(stay_days))).strftime(TIMESTAMP_FORMAT)
 
 def get_rule_based_severity(data):
     try:
@@ -105,25 +845,130 @@ def get_rule_based_severity(data):
     elif (spo2 >= 92 and spo2 < 95) or (hr >= 100 and hr <= 130) or (temp >= 38.5 and temp < 40.0) or (age >= 70): return 'medium'
     return 'low'
 
+RF_FEATURES = ('age', 'heart_rate', 'blood_pressure_systolic', 'blood_pressure_diastolic', 'spO2', 'temperature')
+KMEANS_FEATURES = RF_FEATURES[1:]
+
+def build_ml_data(data):
+    """Pulls the vitals the models need out of an admission form payload"""
+    return {
+        'age': data.get('age', 0), 'heart_rate': data.get('heart_rate', 0),
+        'blood_pressure_systolic': data.get('blood_pressure_systolic', 0),
+        'blood_pressure_diastolic': data.get('blood_pressure_diastolic', 0),
+        'spO2': data.get('spO2', 0), 'temperature': data.get('temperature', 0),
+        'condition': data.get('admission_cause', '')
+    }
+
+def feature_matrix(rows, keys):
+    return np.array([[float(d.get(k, 0)) for k in keys] for d in rows])
+
+def vitals_key(data, keys):
+    """Prediction cache key: the row's features, if they sit on the clinical grid (whole numbers,
+    temperature to 0.1). Anything else returns None and always goes to the model, so hits are exact."""
+    try: values = tuple(float(data.get(k, 0)) for k in keys)
+    except: return None
+    key = tuple(round(v, 1 if k == 'temperature' else 0) for k, v in zip(keys, values))
+    return key if key == values else None
+
 def predict_severity_ml(data):
-    rule = get_rule_based_severity(data)
-    if not MODEL_LOAD_SUCCESS: return rule, f"ML Offline. Using Rule: {rule.upper()}", 0.5
+    with STAGE_SECONDS.time('rules'): rule = get_rule_based_severity(data)
+    # Generation before the bundle: a swap in between makes the put() below a no-op, never a stale entry
+    generation = SEVERITY_CACHE.generation
+    models = current_models()
+    if not models.rf_ready:
+        ML_FALLBACKS.inc('random_forest', 'offline')
+        return rule, f"ML Offline. Using Rule: {rule.upper()}", 0.5
     try:
-        feats = np.array([float(data.get('age',0)), float(data.get('heart_rate',0)), float(data.get('blood_pressure_systolic',0)), float(data.get('blood_pressure_diastolic',0)), float(data.get('spO2',0)), float(data.get('temperature',0))]).reshape(1, -1)
-        ml = ML_MODEL.predict(feats)[0].lower()
+        key = vitals_key(data, RF_FEATURES)
+        ml = SEVERITY_CACHE.get(key)
+        if ml is None:
+            feats = feature_matrix([data], RF_FEATURES)
+            with STAGE_SECONDS.time('random_forest'): ml = models.forest.predict(feats)[0].lower()
+            SEVERITY_CACHE.put(key, ml, generation)
         msg = f"ML: {ml.upper()}. " + ("Differs from Rule." if ml != rule else "Matches Rule.")
         return ml, msg, 0.99
-    except: return rule, "ML Error", 0.5
+    except:
+        ML_FALLBACKS.inc('random_forest', 'error')
+        return rule, "ML Error", 0.5
+
+def predict_severity_ml_batch(rows):
+    """Scores many patients with a single forest call. Returns the same tuples as predict_severity_ml, in order."""
+    if not rows: return []
+    generation = SEVERITY_CACHE.generation
+    models = current_models()
+    if not models.rf_ready: return [predict_severity_ml(d) for d in rows]
+    keys = [vitals_key(d, RF_FEATURES) for d in rows]
+    preds = [SEVERITY_CACHE.get(k) for k in keys]
+    missing = [i for i, ml in enumerate(preds) if ml is None]
+    if missing:
+        try:
+            with STAGE_SECONDS.time('random_forest'): fresh = models.forest.predict(feature_matrix([rows[i] for i in missing], RF_FEATURES))
+        except: return [predict_severity_ml(d) for d in rows]  # isolate the bad row(s)
+        for i, ml in zip(missing, fresh):
+            preds[i] = ml.lower()
+            SEVERITY_CACHE.put(keys[i], preds[i], generation)
+    out = []
+    for d, ml in zip(rows, preds):
+        rule = get_rule_based_severity(d)
+        out.append((ml, f"ML: {ml.upper()}. " + ("Differs from Rule." if ml != rule else "Matches Rule."), 0.99))
+    return out
 
 def run_unsupervised_model(data):
-    if not KMEANS_LOAD_SUCCESS: return 0, 'Normal (Mock)'
+    generation = CLUSTER_CACHE.generation
+    models = current_models()
+    if not models.kmeans_ready:
+        ML_FALLBACKS.inc('kmeans', 'offline')
+        return 0, 'Normal (Mock)'
     try:
-        feats = np.array([float(data.get('heart_rate',0)), float(data.get('blood_pressure_systolic',0)), float(data.get('blood_pressure_diastolic',0)), float(data.get('spO2',0)), float(data.get('temperature',0))]).reshape(1, -1)
-        scaled = SCALER.transform(feats)
-        clust = KMEANS_MODEL.predict(scaled)[0]
-        if clust == HIGH_RISK_CLUSTER: return 40, f'⚠️ High Risk Cluster ({clust})'
+        key = vitals_key(data, KMEANS_FEATURES)
+        clust = CLUSTER_CACHE.get(key)
+        if clust is None:
+            feats = feature_matrix([data], KMEANS_FEATURES)
+            with STAGE_SECONDS.time('kmeans'): clust = int(models.assign_clusters(feats)[0])
+            CLUSTER_CACHE.put(key, clust, generation)
+        if clust == models.high_risk_cluster: return 40, f'⚠️ High Risk Cluster ({clust})'
         return 0, f'Cluster {clust} (Normal)'
-    except: return 0, 'Error'
+    except:
+        ML_FALLBACKS.inc('kmeans', 'error')
+        return 0, 'Error'
+
+def cluster_batch(rows):
+    """K-Means cluster ids for rows (one predict for the cache misses) and the bundle that assigned them.
+    clusters is None while the model is offline; a failing predict raises."""
+    generation = CLUSTER_CACHE.generation
+    models = current_models()
+    if not models.kmeans_ready: return None, models
+    keys = [vitals_key(d, KMEANS_FEATURES) for d in rows]
+    clusters = [CLUSTER_CACHE.get(k) for k in keys]
+    missing = [i for i, clust in enumerate(clusters) if clust is None]
+    if missing:
+        with STAGE_SECONDS.time('kmeans'): fresh = models.assign_clusters(feature_matrix([rows[i] for i in missing], KMEANS_FEATURES))
+        for i, clust in zip(missing, fresh):
+            clusters[i] = int(clust)
+            CLUSTER_CACHE.put(keys[i], clusters[i], generation)
+    return clusters, models
+
+def run_unsupervised_model_batch(rows):
+    """Vectorised run_unsupervised_model: one scaler transform and one K-Means predict for the whole list."""
+    if not rows: return []
+    try: clusters, models = cluster_batch(rows)
+    except: clusters = None
+    if clusters is None: return [run_unsupervised_model(d) for d in rows]  # offline or failed: per-row fallbacks
+    return [(40, f'⚠️ High Risk Cluster ({clust})') if clust == models.high_risk_cluster else (0, f'Cluster {clust} (Normal)') for clust in clusters]
+
+def prewarm_prediction_cache(paths=TRAINING_CSVS):
+    """Fills both prediction caches from the training CSVs in one batched pass per model"""
+    rows = []
+    for path in paths:
+        try:
+            with open(path, newline='') as f:
+                rows += [{'age': r['age'], 'heart_rate': r['heart_rate'], 'blood_pressure_systolic': r['bp_systolic'],
+                          'blood_pressure_diastolic': r['bp_diastolic'], 'spO2': r['spO2'], 'temperature': r['temperature']}
+                         for r in csv.DictReader(f)]
+        except OSError as e: print(f"⚠️ Cache prewarm skipped {path}: {e}")
+    predict_severity_ml_batch(rows); run_unsupervised_model_batch(rows)
+    print(f"✅ Prediction Cache Prewarmed ({len(SEVERITY_CACHE.entries)} severity / {len(CLUSTER_CACHE.entries)} cluster entries)")
+
+if PREDICTION_CACHE_PREWARM: prewarm_prediction_cache()
 
 def calculate_priority_score(sev, risk, doc, bonus):
     score = bonus
@@ -134,51 +979,367 @@ def calculate_priority_score(sev, risk, doc, bonus):
     if doc == 'icu': score += 20
     return score
 
-def solve_bed_csp(cursor, hid, priority, sev, pref):
+BED_TYPES = ('icu', 'general', 'flexible')
+STAY_DAYS = {'high': 7, 'medium': 5, 'low': 2}  # expected stay by severity
+STAY_EXTENSION_DAYS, MAX_STAY_EXTENSIONS = 2, 2  # /api/extend-stay, for patients recommended a flexible bed
+
+def bed_search_order(sev, pref):
+    """The CSP placement rule: returns the mandatory bed type and the fallback order to try"""
     mandatory = 'general'
     if sev == 'high': mandatory = 'icu'
     elif sev in ['medium', 'low'] and pref == 'flexible': mandatory = 'flexible'
     elif sev == 'low' and pref == 'flexible': mandatory = 'flexible'
 
-    search_order = list(dict.fromkeys([mandatory, pref, 'icu' if sev == 'high' else 'general', 'general', 'flexible']))
+    return mandatory, list(dict.fromkeys([mandatory, pref, 'icu' if sev == 'high' else 'general', 'general', 'flexible']))
+
+def solve_bed_csp(cursor, hid, priority, sev, pref, patient_id=None):
+    """Greedy placement. With patient_id the bed is claimed in SQLite (conditional UPDATE) on the caller's
+    transaction; without it the bed is only taken off the in-memory free list (planning/benchmarks)."""
+    mandatory, search_order = bed_search_order(sev, pref)
     
-    for bed_type in search_order:
-        cursor.execute(f"SELECT id FROM beds WHERE hospital_id=? AND type=? AND status='available' LIMIT 1", (hid, bed_type))
-        bed = cursor.fetchone()
-        if bed: return bed[0], f"Allocated {bed[0]} ({bed_type.upper()}) based on {sev.upper()} severity."
+    ensure_bed_index(cursor.connection)
+    with STAGE_SECONDS.time('bed_csp'):
+        for bed_type in search_order:
+            bed = take_free_bed(cursor, hid, bed_type, patient_id) if patient_id else pop_free_bed(hid, bed_type)
+            if bed: return bed, f"Allocated {bed} ({bed_type.upper()}) based on {sev.upper()} severity."
     
     return None, f"No beds found for {mandatory.upper()}."
 
+def mark_allocated(c, pid, bed_id):
+    now = datetime.now()
+    c.execute("UPDATE patients SET status='allocated', bed_id=?, admission_date=?, expected_discharge=datetime(?, '+' || expected_stay_days || ' days') WHERE id=?",
+              (bed_id, now.strftime('%Y-%m-%d'), now.strftime(TIMESTAMP_FORMAT), pid))
+    c.execute("SELECT hospital_id, severity FROM patients WHERE id=?", (pid,))
+    hid, sev = c.fetchone()
+    if sev == 'high': bump_dashboard(hid, critical_load=1)
+    publish_patient(c, hid, pid, 'allocated')
+
+def next_waiting_patient(c, hid, bed_type):
+    """Top of the waiting queue, skipping patients another worker already placed or discharged"""
+    while True:
+        pid = peek_waiting(hid, bed_type)
+        if not pid: return None
+        c.execute("SELECT status FROM patients WHERE id=?", (pid,))
+        row = c.fetchone()
+        if row and row[0] == 'waiting': return pid
+        remove_waiting(pid)
+
+def hand_off_bed(c, hid, bed_type, bed_id):
+    """Gives a bed just freed on this transaction to the top waiting patient for its type, or returns it
+    to the free list. Returns the patient id placed, if any."""
+    pid = next_waiting_patient(c, hid, bed_type)
+    if not pid or not claim_bed(c, bed_id, pid):
+        push_free_bed(hid, bed_type, bed_id)
+        return None
+    bump_dashboard(hid, available_beds=-1)
+    publish_event(hid, 'bed', bed_id=bed_id, type=bed_type, status='occupied', patient_id=pid)
+    remove_waiting(pid)
+    mark_allocated(c, pid, bed_id)
+    return pid
+
+def drain_waiting(c, hid):
+    """Hands free beds to waiting patients until either side runs out (after capacity grows)"""
+    placed = []
+    for bed_type in BED_TYPES:
+        while True:
+            pid = next_waiting_patient(c, hid, bed_type)
+            bed_id = take_free_bed(c, hid, bed_type, pid) if pid else None
+            if not bed_id: break
+            remove_waiting(pid)
+            mark_allocated(c, pid, bed_id)
+            placed.append({'patient_id': pid, 'bed_id': bed_id})
+    return placed
+
+def solve_bed_assignment(patients, free_counts):
+    """Globally optimal batch placement (weighted bipartite matching).
+
+    patients is a list of (priority, severity, doctor_recommendation); free_counts maps bed type -> free beds.
+    Maximises the total priority score served first and, among equal totals, how early in
+    bed_search_order each patient's bed type comes. Beds of one type are interchangeable, so each
+    type only needs min(free, len(patients)) columns and the matrix stays patients x (3 * patients).
+    Returns the chosen bed type (or None) for every patient, in input order.
+    """
+    n = len(patients)
+    if n == 0: return []
+    slot_types = [t for t in BED_TYPES for _ in range(min(free_counts.get(t, 0), n))]
+    if not slot_types: return [None] * n
+
+    # Lexicographic weight: one priority point is worth more than every patient's preference bonus combined
+    scale = len(BED_TYPES) * n + 1
+    cost = np.full((n, len(slot_types) + n), np.inf)
+    cost[:, len(slot_types):] = 0.0  # "stay waiting" columns, one per patient
+    col_of = {}
+    for j, t in enumerate(slot_types): col_of.setdefault(t, []).append(j)
+    for i, (priority, sev, pref) in enumerate(patients):
+        for rank, t in enumerate(bed_search_order(sev, pref)[1]):
+            if t in col_of: cost[i, col_of[t]] = -(priority * scale + len(BED_TYPES) - rank)
+
+    rows, cols = linear_sum_assignment(cost)
+    chosen = [None] * n
+    for i, j in zip(rows, cols):
+        if j < len(slot_types): chosen[i] = slot_types[j]
+    return chosen
+
+# --- OVERFLOW ROUTING ---
+# When a hospital has no acceptable bed, sister hospitals are ranked from the free-bed index (its per-type
+# dict sizes are the live capacity map, maintained by every mutation) and the transfer costs held in memory.
+# A query is O(hospitals x bed types) and never reads the beds table. Counts are this process's view.
+TRANSFER_COST_DEFAULT = float(os.environ.get('SERBAS_TRANSFER_COST_DEFAULT', 60))  # pairs with no configured cost
+OVERFLOW_MAX_ALTERNATIVES = 5
+TRANSFER_COSTS = {}  # from hospital -> {to hospital: cost}
+HOSPITAL_NAMES = {}
+ROUTING_LOCK = threading.Lock()
+ROUTING_READY = False
+
+def load_routing_table():
+    global TRANSFER_COSTS, HOSPITAL_NAMES, ROUTING_READY
+    conn = get_catalog_db()
+    costs = {}
+    for src, dst, cost in conn.execute("SELECT from_hospital, to_hospital, cost FROM transfer_costs"):
+        costs.setdefault(src, {})[dst] = cost
+    names = dict(conn.execute("SELECT id, name FROM hospitals"))
+    with ROUTING_LOCK:
+        TRANSFER_COSTS, HOSPITAL_NAMES = costs, names
+        ROUTING_READY = True
+
+def ensure_routing_table():
+    if not ROUTING_READY: load_routing_table()
+
+def reset_routing_table():
+    global ROUTING_READY
+    with ROUTING_LOCK: ROUTING_READY = False
+
+def set_transfer_costs(hid, costs):
+    with ROUTING_LOCK: TRANSFER_COSTS.setdefault(hid, {}).update(costs)
+
+def overflow_alternatives(hid, sev, pref, limit=OVERFLOW_MAX_ALTERNATIVES):
+    """Other hospitals with a bed this patient may take, best first: the most preferred bed type in the
+    patient's search order, then the lowest transfer cost from hid, then the most free beds of that type"""
+    search_order = bed_search_order(sev, pref)[1]
+    with ROUTING_LOCK: costs, names = TRANSFER_COSTS.get(hid, {}), HOSPITAL_NAMES
+    with FREE_BEDS_LOCK:
+        capacity = {other: [len(types.get(t, ())) for t in search_order] for other, types in FREE_BEDS.items() if other != hid}
+    ranked = []
+    for other, free in capacity.items():
+        rank = next((r for r, n in enumerate(free) if n), None)
+        if rank is None: continue
+        ranked.append((rank, costs.get(other, TRANSFER_COST_DEFAULT), -free[rank], other))
+    return [{'hospital_id': other, 'name': names.get(other, other), 'bed_type': search_order[rank],
+             'free_beds': -neg_free, 'transfer_cost': cost}
+            for rank, cost, neg_free, other in heapq.nsmallest(limit, ranked)]
+
+# --- VITALS INGESTION ---
+# Bedside monitors post readings to /api/vitals, one at a time or in batches. Each admitted patient keeps the
+# last VITALS_WINDOW readings in a fixed float32 ring in memory. Triage is re-run only for patients whose
+# newest reading in the batch falls in another get_rule_based_severity band or K-Means cluster than at the
+# previous check, so a steady stream costs a ring write per reading plus one patient lookup and one batched
+# cluster assignment per request. A re-triage rewrites severity, priority_score and risk_flag, re-queues a
+# waiting patient (or places them if their new search order has a free bed) and suggests a bed upgrade
+# for an allocated patient whose severity rose. Rings are per process and start from the stored vitals.
+VITALS_WINDOW = int(os.environ.get('SERBAS_VITALS_WINDOW', 32))  # readings kept per patient
+VITALS_MAX_BATCH = 5000
+VITALS_FIELDS = RF_FEATURES[1:]  # what a monitor reports; age comes from the admission record
+SEVERITY_RANK = {'low': 0, 'medium': 1, 'high': 2}
+VITALS = {}  # patient_id -> VitalsRing
+VITALS_LOCK = threading.Lock()
+VITALS_READINGS = METRICS.register(Counter('serbas_vitals_readings_total', 'Vitals readings posted, by result', ['result']))
+RETRIAGES = METRICS.register(Counter('serbas_retriage_total', 'Re-triage runs triggered by vitals, by outcome', ['outcome']))
+
+class VitalsRing:
+    __slots__ = ('values', 'times', 'count', 'last', 'band', 'cluster')
+
+    def __init__(self, baseline):
+        self.values = np.zeros((VITALS_WINDOW, len(RF_FEATURES)), dtype=np.float32)
+        self.times = np.zeros(VITALS_WINDOW)
+        self.count = 0
+        self.last = baseline                # newest full reading; fields missing from the next one carry over
+        self.band = self.cluster = None     # rule band and cluster at the previous check
+
+    def push(self, values, ts):
+        self.last = dict(self.last, **values)
+        i = self.count % VITALS_WINDOW
+        self.values[i] = [self.last[k] for k in RF_FEATURES]
+        self.times[i] = ts
+        self.count += 1
+
+    def recent(self, limit=VITALS_WINDOW):
+        n = min(self.count, VITALS_WINDOW, limit)
+        idx = [(self.count - n + j) % VITALS_WINDOW for j in range(n)]
+        return [dict(zip(VITALS_FIELDS, (round(float(v), 1) for v in self.values[i, 1:])), timestamp=float(self.times[i])) for i in idx]
+
+def parse_reading(r):
+    """(patient_id, {field: value}, epoch seconds) of one posted reading; raises ValueError/TypeError"""
+    pid = r.get('patient_id')
+    if not pid: raise ValueError('patient_id is required')
+    values = {k: float(r[k]) for k in VITALS_FIELDS if r.get(k) is not None}
+    if not values or not all(np.isfinite(v) for v in values.values()): raise ValueError('no valid vitals')
+    ts = r.get('timestamp')
+    if ts is None: ts = time.time()
+    elif isinstance(ts, str): ts = datetime.fromisoformat(ts).timestamp()
+    else: ts = float(ts)
+    return str(pid), values, ts
+
+VITALS_PATIENT_SQL = '''SELECT p.id, p.age, p.heart_rate, p.bp_systolic, p.bp_diastolic, p.spO2, p.temperature, p.severity,
+       p.health_risk, p.doctor_recommendation, p.priority_score, p.risk_flag, p.status, p.bed_id, b.type, p.name, p.rowid
+FROM patients p LEFT JOIN beds b ON b.id = p.bed_id
+WHERE p.hospital_id=? AND p.status IN ('waiting', 'allocated') AND p.id IN ({})'''
+
+def admitted_patients(conn, hid, pids, chunk=500):
+    """Current rows of the admitted patients among pids, keyed by id (chunked under SQLite's variable limit)"""
+    rows = {}
+    for i in range(0, len(pids), chunk):
+        part = pids[i:i + chunk]
+        rows.update((r[0], r) for r in conn.execute(VITALS_PATIENT_SQL.format(','.join('?' * len(part))), (hid, *part)))
+    return rows
+
+def ingest_vitals(conn, hid, readings):
+    """Stores readings in the rings and re-triages the patients that crossed a band or cluster boundary"""
+    by_patient, rejected = {}, []
+    for i, r in enumerate(readings):
+        try: pid, values, ts = parse_reading(r)
+        except (ValueError, TypeError, AttributeError) as e:
+            rejected.append({'index': i, 'reason': str(e) or 'invalid reading', 'readings': 1})
+            continue
+        by_patient.setdefault(pid, []).append((values, ts))
+    rows = admitted_patients(conn, hid, list(by_patient))
+    for pid in [pid for pid in by_patient if pid not in rows]:
+        rejected.append({'patient_id': pid, 'reason': 'not an admitted patient of this hospital', 'readings': len(by_patient.pop(pid))})
+        with VITALS_LOCK: VITALS.pop(pid, None)  # discharged: drop the ring
+    VITALS_READINGS.inc('rejected', amount=sum(r['readings'] for r in rejected))
+    accepted = sum(len(v) for v in by_patient.values())
+    VITALS_READINGS.inc('accepted', amount=accepted)
+    if not by_patient: return {'success': True, 'accepted': 0, 'rejected': rejected, 'retriaged': [], 'upgrades': []}
+
+    pids = list(by_patient)
+    with VITALS_LOCK:
+        fresh = [pid for pid in pids if pid not in VITALS]
+        for pid in fresh: VITALS[pid] = VitalsRing(dict(zip(RF_FEATURES, (float(v or 0) for v in rows[pid][1:7]))))
+        baselines = [VITALS[pid].last for pid in fresh]
+        for pid in pids:
+            ring = VITALS[pid]
+            for values, ts in sorted(by_patient[pid], key=lambda r: r[1]): ring.push(values, ts)
+        latest = [VITALS[pid].last for pid in pids]
+    try: clusters, _ = cluster_batch(baselines + latest)  # one K-Means call: new rings' baselines + every newest reading
+    except Exception: clusters = None
+    clusters = clusters or [None] * (len(baselines) + len(latest))
+
+    crossed = []
+    with VITALS_LOCK:
+        for pid, baseline, cluster in zip(fresh, baselines, clusters):
+            VITALS[pid].band, VITALS[pid].cluster = get_rule_based_severity(baseline), cluster
+        for pid, reading, cluster in zip(pids, latest, clusters[len(baselines):]):
+            ring, band = VITALS[pid], get_rule_based_severity(reading)
+            if band != ring.band or cluster != ring.cluster: crossed.append((pid, reading))
+            ring.band, ring.cluster = band, cluster
+    retriaged, upgrades = retriage_patients(conn, hid, crossed, rows) if crossed else ([], [])
+    return {'success': True, 'accepted': accepted, 'rejected': rejected, 'retriaged': retriaged, 'upgrades': upgrades}
+
+def retriage_patients(conn, hid, crossed, rows):
+    """Re-scores the crossed patients in one model pass and writes the changes in one transaction"""
+    readings = [reading for _, reading in crossed]
+    severities = [sev for sev, _, _ in predict_severity_ml_batch(readings)]
+    risks = run_unsupervised_model_batch(readings)
+    changes = []
+    for (pid, reading), sev, (bonus, flag) in zip(crossed, severities, risks):
+        row = rows[pid]
+        score = calculate_priority_score(sev, row[8], row[9], bonus)
+        if (sev, score, flag) == (row[7], row[10], row[11]): RETRIAGES.inc('unchanged')
+        else: changes.append((pid, reading, sev, score, flag))
+    if not changes: return [], []
+
+    def apply(c):
+        retriaged, upgrades, stale = [], [], []
+        for pid, reading, sev, score, flag in changes:
+            _, _, _, _, _, _, _, old_sev, _, pref, old_score, _, status, bed_id, bed_type, name, rowid = rows[pid]
+            c.execute("UPDATE patients SET heart_rate=?, bp_systolic=?, bp_diastolic=?, spO2=?, temperature=?, severity=?, priority_score=?, risk_flag=? WHERE id=? AND status=? AND bed_id IS ?",
+                      (*(reading[k] for k in VITALS_FIELDS), sev, score, flag, pid, status, bed_id))
+            if c.rowcount != 1:
+                stale.append(pid)  # placed or discharged since it was read; the next reading re-checks
+                continue
+            change = {'patient_id': pid, 'status': status, 'severity': sev, 'previous_severity': old_sev,
+                      'priority_score': score, 'previous_priority_score': old_score, 'risk_flag': flag}
+            if status == 'waiting':
+                placed, _ = solve_bed_csp(c, hid, score, sev, pref, patient_id=pid)
+                if placed:
+                    remove_waiting(pid)
+                    mark_allocated(c, pid, placed)
+                    change.update(status='allocated', bed_id=placed)
+                else: enqueue_waiting(hid, pid, score, rowid, sev, pref)
+            else:
+                if (sev == 'high') != (old_sev == 'high'): bump_dashboard(hid, critical_load=1 if sev == 'high' else -1)
+                target = bed_search_order(sev, pref)[0]
+                if SEVERITY_RANK.get(sev, 0) > SEVERITY_RANK.get(old_sev, 0) and bed_type != target:
+                    upgrade = {'patient_id': pid, 'name': name, 'bed_id': bed_id, 'from': bed_type, 'to': target, 'severity': sev,
+                               'priority_score': score, 'beds_free': free_bed_counts(hid).get(target, 0)}
+                    upgrades.append(upgrade)
+                    publish_event(hid, 'upgrade', **upgrade)
+                publish_patient(c, hid, pid, 'retriaged')
+            retriaged.append(change)
+        return retriaged, upgrades, stale
+
+    retriaged, upgrades, stale = write_transaction(conn, apply)
+    with VITALS_LOCK:
+        for pid in stale:
+            if pid in VITALS: VITALS[pid].band = None
+    RETRIAGES.inc('changed', amount=len(retriaged))
+    if stale: RETRIAGES.inc('stale', amount=len(stale))
+    return retriaged, upgrades
+
 # --- DB INIT ---
-def init_db():
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
+def create_tables(c):
     c.execute('''CREATE TABLE IF NOT EXISTS hospitals (id TEXT PRIMARY KEY, name TEXT, address TEXT, contact TEXT, total_beds INT, icu_beds INT, password TEXT)''')
     c.execute('''CREATE TABLE IF NOT EXISTS patients (id TEXT PRIMARY KEY, name TEXT, age INT, heart_rate INT, bp_systolic INT, bp_diastolic INT, spO2 INT, temperature REAL, blood_group TEXT, condition TEXT, severity TEXT, health_risk TEXT, doctor_recommendation TEXT, priority_score INT, status TEXT, bed_id TEXT, admission_date TEXT, discharge_date TEXT, expected_stay_days INT, hospital_id TEXT, extended_stay INT DEFAULT 0, risk_flag TEXT)''')
     c.execute('''CREATE TABLE IF NOT EXISTS beds (id TEXT PRIMARY KEY, hospital_id TEXT, type TEXT, ward TEXT, status TEXT, patient_id TEXT, last_occupied_date TEXT)''')
+    c.execute('''CREATE TABLE IF NOT EXISTS id_sequences (name TEXT PRIMARY KEY, value INTEGER NOT NULL)''')
+
+def init_db():
+    catalog = get_catalog_db()
     
-    c.execute("SELECT COUNT(*) FROM hospitals")
-    if c.fetchone()[0] == 0:
-        c.execute("INSERT INTO hospitals VALUES ('HOSP001', 'CMH Rawalpindi', 'Cantt', '051-111', 150, 20, 'password123')")
+    if catalog.execute("SELECT COUNT(*) FROM hospitals").fetchone()[0] == 0:
+        catalog.execute("INSERT INTO hospitals VALUES ('HOSP001', 'CMH Rawalpindi', 'Cantt', '051-111', 150, 20, 'password123')")
+        catalog.commit()
+        conn = get_db('HOSP001')  # the catalog itself in single-file mode
+        c = conn.cursor()
         for i in range(1, 101): c.execute("INSERT OR IGNORE INTO beds VALUES (?, ?, 'general', 'Ward A', 'available', NULL, NULL)", (f"BED{i:03d}", 'HOSP001'))
         for i in range(1, 21): c.execute("INSERT OR IGNORE INTO beds VALUES (?, ?, 'icu', 'ICU 1', 'available', NULL, NULL)", (f"ICU{i:03d}", 'HOSP001'))
         for i in range(1, 31): c.execute("INSERT OR IGNORE INTO beds VALUES (?, ?, 'flexible', 'Flex 1', 'available', NULL, NULL)", (f"FLEX{i:03d}", 'HOSP001'))
         create_sample_patients(conn, 'HOSP001')
+        conn.commit()
 
-    conn.commit()
-    conn.close()
+    reload_bed_state(catalog)
+    # Waiting patients left over from a previous run get first claim on any free beds
+    for hid in hospital_ids():
+        conn = get_db(hid)
+        drain_waiting(conn.cursor(), hid)
+        conn.commit()
 
 def create_sample_patients(conn, hospital_id):
     c = conn.cursor()
     # P1 assigned to ICU001
-    p1 = ('PAT001', 'Ramesh Kumar', 67, 140, 100, 70, 90, 39.5, 'B+', 'Cardiac', 'high', 'critical', 'icu', 80, 'allocated', 'ICU001', datetime.now().strftime('%Y-%m-%d'), None, 7, hospital_id, 0, 'High Risk Cluster')
+    p1 = ('PAT001', 'Ramesh Kumar', 67, 140, 100, 70, 90, 39.5, 'B+', 'Cardiac', 'high', 'critical', 'icu', 80, 'allocated', 'ICU001', datetime.now().strftime('%Y-%m-%d'), None, 7, hospital_id, 0, 'High Risk Cluster', expected_discharge_at(7))
     try:
-        c.execute('''INSERT OR IGNORE INTO patients VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)''', p1)
+        c.execute('''INSERT OR IGNORE INTO patients (id, name, age, heart_rate, bp_systolic, bp_diastolic, spO2, temperature, blood_group, condition, severity, health_risk, doctor_recommendation, priority_score, status, bed_id, admission_date, discharge_date, expected_stay_days, hospital_id, extended_stay, risk_flag, expected_discharge) VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)''', p1)
         c.execute("UPDATE beds SET status='occupied', patient_id='PAT001' WHERE id='ICU001'")
     except: pass
 
 # --- ROUTES ---
 
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+    DB_LOCAL.queries = 0
+
+@app.after_request
+def record_request_metrics(resp):
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    REQUEST_SECONDS.observe(time.perf_counter() - g.request_start, route, request.method, resp.status_code)
+    REQUEST_QUERIES.observe(DB_LOCAL.queries, route)
+    return resp
+
+@app.teardown_appcontext
+def release_db(exc):
+    release_request_dbs()
+
 @app.route('/static/<path:filename>')
 def static_files_route(filename): return send_from_directory('static', filename)
 
@@ -188,11 +1349,10 @@ def home(): return render_template('index.html')
 @app.route('/login', methods=['POST'])
 def login():
     data = request.json
-    conn = sqlite3.connect(DB_NAME)
+    conn = get_catalog_db()
     c = conn.cursor()
     c.execute("SELECT * FROM hospitals WHERE id=? AND password=?", (data.get('hospital_id'), data.get('password')))
     res = c.fetchone()
-    conn.close()
     if res:
         session['hospital_id'] = res[0]
         return jsonify({'success': True, 'hospital_name': res[1]})
@@ -201,21 +1361,29 @@ def login():
 @app.route('/api/dashboard-data')
 def dashboard_data():
     if 'hospital_id' not in session: return jsonify({'error': 'Unauthorized'}), 401
-    conn = sqlite3.connect(DB_NAME); c = conn.cursor()
     hid = session['hospital_id']
     
-    # Stats
-    c.execute("SELECT COUNT(*) FROM beds WHERE hospital_id=?", (hid,))
-    total_beds = c.fetchone()[0]
-    c.execute("SELECT COUNT(*) FROM beds WHERE hospital_id=? AND status='available'", (hid,))
-    avail_beds = c.fetchone()[0]
-    c.execute("SELECT COUNT(*) FROM beds WHERE hospital_id=? AND type='icu'", (hid,))
-    icu_total = c.fetchone()[0]
-    c.execute("SELECT COUNT(*) FROM patients WHERE hospital_id=? AND severity='high' AND status='allocated'", (hid,))
-    critical_load = c.fetchone()[0]
+    conn = get_db()
+    drop_stale_dashboard(conn, hid)  # one primary-key lookup; another worker's commits force a reload
+    
+    # Unchanged since the browser's last poll: answer from memory
+    cached = DASHBOARD_STATS.get(hid)
+    if cached is not None and request.if_none_match.contains(f"{PROCESS_EPOCH}-{cached['version']}"):
+        resp = app.response_class(status=304)
+        resp.set_etag(f"{PROCESS_EPOCH}-{cached['version']}")
+        return resp
     
-    conn.close()
-    return jsonify({'stats': {'total_beds': total_beds, 'available_beds': avail_beds, 'icu_beds': icu_total, 'critical_load': critical_load}, 'recent_patients': []})
+    loaded = load_dashboard_stats(conn, hid)
+    stats, version = public_stats(loaded), loaded['version']
+    body = {'stats': stats, 'version': version, 'recent_patients': []}
+    if request.args.get('verify'):
+        # ?verify=1 recounts from SQLite and reports whether the incremental counters drifted
+        fresh = compute_dashboard_stats(conn, hid).get(hid, {})
+        body['verified'] = {'stats': fresh, 'consistent': all(stats[k] == v for k, v in fresh.items())}
+    resp = jsonify(body)
+    resp.set_etag(f"{PROCESS_EPOCH}-{version}")
+    resp.headers['Cache-Control'] = 'no-cache'  # browsers revalidate every poll with If-None-Match
+    return resp
 
 @app.route('/api/update-capacity', methods=['POST'])
 def update_capacity():
@@ -223,6 +1391,7 @@ def update_capacity():
     data = request.json
     hid = session['hospital_id']
     
+    conn = get_db()
     try:
         new_total = int(data['total_beds'])
         new_icu = int(data['icu_beds'])
@@ -231,144 +1400,480 @@ def update_capacity():
         
         if new_general < 0: return jsonify({'success': False, 'message': 'Invalid counts!'})
 
-        conn = sqlite3.connect(DB_NAME)
-        conn.execute("UPDATE hospitals SET total_beds=?, icu_beds=? WHERE id=?", (new_total, new_icu, hid))
-        
-        adjust_bed_capacity(conn, hid, 'general', new_general, 'BED', 'General Ward')
-        adjust_bed_capacity(conn, hid, 'icu', new_icu, 'ICU', 'ICU')
-        adjust_bed_capacity(conn, hid, 'flexible', new_flex, 'FLEX', 'Flex Ward')
-        
-        conn.commit()
-        return jsonify({'success': True, 'message': 'Hospital capacity updated successfully!'})
+        ensure_bed_index(conn); ensure_waiting_queue(conn)
+        def record_capacity(c): c.execute("UPDATE hospitals SET total_beds=?, icu_beds=? WHERE id=?", (new_total, new_icu, hid))
+        def resize(c):
+            if not SHARD_DIR: record_capacity(c)
+            adjust_bed_capacity(conn, hid, 'general', new_general, 'BED', 'General Ward')
+            adjust_bed_capacity(conn, hid, 'icu', new_icu, 'ICU', 'ICU')
+            adjust_bed_capacity(conn, hid, 'flexible', new_flex, 'FLEX', 'Flex Ward')
+            return drain_waiting(c, hid)
+        # A failed resize is rolled back and the in-memory bed state resynced by write_transaction
+        promoted = write_transaction(conn, resize)
+        # Sharded: the hospitals row lives in the catalog, updated in its own short transaction
+        if SHARD_DIR: write_transaction(get_catalog_db(), record_capacity)
+        return jsonify({'success': True, 'message': 'Hospital capacity updated successfully!', 'promoted_waiting': promoted})
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)})
-    finally: conn.close()
 
 @app.route('/api/patient-details/<patient_id>')
 def patient_details(patient_id):
     if 'hospital_id' not in session: return jsonify({'error': 'Unauthorized'}), 401
-    conn = sqlite3.connect(DB_NAME); c = conn.cursor()
-    c.execute('''SELECT name, age, heart_rate, bp_systolic, bp_diastolic, spO2, temperature, blood_group, condition, severity, health_risk, doctor_recommendation, priority_score, status, bed_id, admission_date, expected_stay_days, extended_stay, risk_flag, id FROM patients WHERE id=?''', (patient_id,))
+    conn = get_db(); c = conn.cursor()
+    c.execute('''SELECT name, age, heart_rate, bp_systolic, bp_diastolic, spO2, temperature, blood_group, condition, severity, health_risk, doctor_recommendation, priority_score, status, bed_id, admission_date, expected_stay_days, extended_stay, risk_flag, id, expected_discharge FROM patients WHERE id=?''', (patient_id,))
     p = c.fetchone()
-    conn.close()
     if not p: return jsonify({'success': False}), 404
     return jsonify({'success': True, 'details': {
         'name': p[0], 'age': p[1], 'heart_rate': p[2], 'bp_systolic': p[3], 'bp_diastolic': p[4],
         'spO2': p[5], 'temperature': p[6], 'blood_group': p[7], 'condition': p[8],
         'ml_severity': p[9], 'triage_risk_level': p[10], 'doctor_recommendation': p[11],
         'priority_score': p[12], 'status': p[13], 'bed_id': p[14], 'admission_date': p[15],
-        'expected_stay_days': p[16], 'extended_stay_count': p[17], 'risk_flag': p[18], 'patient_id': p[19]
+        'expected_stay_days': p[16], 'extended_stay_count': p[17], 'risk_flag': p[18], 'patient_id': p[19],
+        'expected_discharge': p[20]
     }})
 
+def admit_patient(c, hid, data, ml_data, sev, flag, score, planned=False, planned_type=None):
+    """Places one scored patient (or queues them as waiting) on the caller's write transaction. Does not commit.
+
+    With planned=True the bed type was already chosen by solve_bed_assignment (None means the plan leaves
+    the patient waiting); otherwise the greedy solve_bed_csp picks the bed.
+    """
+    ensure_waiting_queue(c.connection)
+    pid = next_patient_id(c, hid)
+    pref = data['doctor_recommendation']
+    if not planned:
+        bed_id, explain = solve_bed_csp(c, hid, score, sev, pref, patient_id=pid)
+    elif planned_type:
+        bed_id = take_free_bed(c, hid, planned_type, pid)
+        explain = f"Allocated {bed_id} ({planned_type.upper()}) by batch optimiser based on {sev.upper()} severity."
+        if not bed_id: bed_id, explain = solve_bed_csp(c, hid, score, sev, pref, patient_id=pid)
+    else:
+        bed_id, explain = None, f"No beds left for {bed_search_order(sev, pref)[0].upper()} after batch optimisation."
+    
+    stay = STAY_DAYS.get(sev, STAY_DAYS['low'])
+    status = 'allocated' if bed_id else 'waiting'
+    
+    c.execute('''INSERT INTO patients (id, name, age, heart_rate, bp_systolic, bp_diastolic, spO2, temperature, blood_group, condition, severity, health_risk, doctor_recommendation, priority_score, status, bed_id, admission_date, expected_stay_days, hospital_id, risk_flag, expected_discharge) VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)''', 
+              (pid, data['patient_name'], ml_data['age'], ml_data['heart_rate'], ml_data['blood_pressure_systolic'], ml_data['blood_pressure_diastolic'], ml_data['spO2'], ml_data['temperature'], data['blood_group'], data['admission_cause'], sev, data['health_risk'], data['doctor_recommendation'], score, status, bed_id, datetime.now().strftime('%Y-%m-%d'), stay, hid, flag,
+               expected_discharge_at(stay) if bed_id else None))
+    
+    if not bed_id:
+        enqueue_waiting(hid, pid, score, c.lastrowid, sev, pref)
+    elif sev == 'high':
+        bump_dashboard(hid, critical_load=1)
+    publish_patient(c, hid, pid, status)
+    
+    result = {
+        'success': True if bed_id else False,
+        'message': f"{explain} (ML: {sev}, Risk: {flag})",
+        'bed_id': bed_id, 'patient_id': pid, 'ml_severity': sev, 'risk_flag': flag
+    }
+    if not bed_id:
+        # Queued here; also point at sister hospitals that could take the patient now
+        ensure_routing_table()
+        result['alternatives'] = overflow_alternatives(hid, sev, pref)
+    return result
+
+def plan_optimal_batch(c, hid, patients, severities, scores):
+    """Runs solve_bed_assignment over the new batch plus everyone already waiting at the hospital.
+
+    Waiting patients who win a bed are placed immediately; returns the chosen bed type (or None)
+    for each new patient and the list of promoted waiting patients.
+    """
+    ensure_bed_index(c.connection); ensure_waiting_queue(c.connection)
+    c.execute("SELECT id, priority_score, severity, doctor_recommendation FROM patients WHERE hospital_id=? AND status='waiting' ORDER BY rowid", (hid,))
+    waiting = c.fetchall()
+    pending = [(score, sev, p['doctor_recommendation']) for p, sev, score in zip(patients, severities, scores)]
+    pending += [(w[1] or 0, w[2], w[3]) for w in waiting]
+    chosen = solve_bed_assignment(pending, free_bed_counts(hid))
+    
+    promoted = []
+    for w, bed_type in zip(waiting, chosen[len(patients):]):
+        bed = take_free_bed(c, hid, bed_type, w[0]) if bed_type else None
+        if not bed: continue
+        remove_waiting(w[0])
+        mark_allocated(c, w[0], bed)
+        promoted.append({'patient_id': w[0], 'bed_id': bed})
+    return chosen[:len(patients)], promoted
+
 @app.route('/api/allocate-bed', methods=['POST'])
 def allocate_bed():
     if 'hospital_id' not in session: return jsonify({'error': 'Unauthorized'}), 401
     data = request.json
     hid = session['hospital_id']
     
-    ml_data = {
-        'age': data.get('age', 0), 'heart_rate': data.get('heart_rate', 0),
-        'blood_pressure_systolic': data.get('blood_pressure_systolic', 0),
-        'blood_pressure_diastolic': data.get('blood_pressure_diastolic', 0),
-        'spO2': data.get('spO2', 0), 'temperature': data.get('temperature', 0),
-        'condition': data.get('admission_cause', '')
-    }
-    
+    ml_data = build_ml_data(data)
     sev, msg, _ = predict_severity_ml(ml_data)
     bonus, flag = run_unsupervised_model(ml_data)
     score = calculate_priority_score(sev, data['health_risk'], data['doctor_recommendation'], bonus)
     
-    conn = sqlite3.connect(DB_NAME); c = conn.cursor()
-    bed_id, explain = solve_bed_csp(c, hid, score, sev, data['doctor_recommendation'])
+    conn = get_db()
+    result = write_transaction(conn, lambda c: admit_patient(c, hid, data, ml_data, sev, flag, score))
+    return jsonify(result)
+
+BATCH_REQUIRED_FIELDS = ('patient_name', 'blood_group', 'admission_cause', 'health_risk', 'doctor_recommendation')
+
+@app.route('/api/allocate-beds-batch', methods=['POST'])
+def allocate_beds_batch():
+    """Mass-casualty intake: triage the whole list in one model pass and admit everyone in one transaction."""
+    if 'hospital_id' not in session: return jsonify({'error': 'Unauthorized'}), 401
+    data = request.json
+    hid = session['hospital_id']
+    patients = data.get('patients') if isinstance(data, dict) else data
     
-    c.execute("SELECT COUNT(*) FROM patients")
-    pid = f"PAT{c.fetchone()[0]+1:03d}"
-    stay = 7 if sev == 'high' else (5 if sev == 'medium' else 2)
-    status = 'allocated' if bed_id else 'waiting'
+    if not isinstance(patients, list) or not patients:
+        return jsonify({'success': False, 'message': 'Expected a non-empty list of patients.'}), 400
+    for i, p in enumerate(patients):
+        missing = [f for f in BATCH_REQUIRED_FIELDS if not isinstance(p, dict) or f not in p]
+        if missing: return jsonify({'success': False, 'message': f"Patient #{i + 1} is missing: {', '.join(missing)}"}), 400
     
-    c.execute('''INSERT INTO patients (id, name, age, heart_rate, bp_systolic, bp_diastolic, spO2, temperature, blood_group, condition, severity, health_risk, doctor_recommendation, priority_score, status, bed_id, admission_date, expected_stay_days, hospital_id, risk_flag) VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)''', 
-              (pid, data['patient_name'], ml_data['age'], ml_data['heart_rate'], ml_data['blood_pressure_systolic'], ml_data['blood_pressure_diastolic'], ml_data['spO2'], ml_data['temperature'], data['blood_group'], data['admission_cause'], sev, data['health_risk'], data['doctor_recommendation'], score, status, bed_id, datetime.now().strftime('%Y-%m-%d'), stay, hid, flag))
+    solver = data.get('solver', 'greedy') if isinstance(data, dict) else 'greedy'
+    if solver not in ('greedy', 'optimal'):
+        return jsonify({'success': False, 'message': "solver must be 'greedy' or 'optimal'"}), 400
     
-    if bed_id:
-        c.execute("UPDATE beds SET status='occupied', patient_id=?, last_occupied_date=? WHERE id=?", (pid, datetime.now().strftime('%Y-%m-%d'), bed_id))
+    ml_rows = [build_ml_data(p) for p in patients]
+    severities = [sev for sev, _, _ in predict_severity_ml_batch(ml_rows)]
+    risks = run_unsupervised_model_batch(ml_rows)
+    scores = [calculate_priority_score(sev, p['health_risk'], p['doctor_recommendation'], bonus) for p, sev, (bonus, _) in zip(patients, severities, risks)]
     
-    conn.commit(); conn.close()
-    return jsonify({
-        'success': True if bed_id else False,
-        'message': f"{explain} (ML: {sev}, Risk: {flag})",
-        'bed_id': bed_id, 'patient_id': pid, 'ml_severity': sev, 'risk_flag': flag
-    })
-
-@app.route('/api/allocated-patients')
-def allocated_patients():
-    if 'hospital_id' not in session: return jsonify({'error': 'Not logged in'}), 401
-    conn = sqlite3.connect(DB_NAME); cursor = conn.cursor()
+    def admit_all(c):
+        plan, promoted = [None] * len(patients), []
+        if solver == 'optimal':
+            plan, promoted = plan_optimal_batch(c, hid, patients, severities, scores)
+        results = [admit_patient(c, hid, p, ml_data, sev, flag, score, solver == 'optimal', bed_type)
+                   for p, ml_data, sev, (_, flag), score, bed_type in zip(patients, ml_rows, severities, risks, scores, plan)]
+        return results, promoted
     
-    # 🌟 FIX: Join with beds table to fetch REAL bed type
-    cursor.execute('''
+    conn = get_db()
+    try: results, promoted = write_transaction(conn, admit_all)
+    except Exception as e:
+        return jsonify({'success': False, 'message': f"Batch rolled back: {e}"}), 500
+    
+    allocated = sum(1 for r in results if r['success'])
+    return jsonify({'success': True, 'solver': solver, 'allocated': allocated, 'waiting': len(results) - allocated, 'results': results, 'promoted_waiting': promoted})
+
+# Row shape shared by /api/allocated-patients and the 'patient' events of /api/events
+# 🌟 FIX: Join with beds table to fetch REAL bed type
+ALLOCATED_PATIENT_SQL = '''
         SELECT p.id, p.name, p.age, p.blood_group, p.condition, p.bed_id, 
                p.admission_date, p.severity, p.expected_stay_days, p.extended_stay, 
                p.doctor_recommendation, p.risk_flag, p.heart_rate, p.spO2, p.temperature,
-               b.type 
+               b.type, date(p.expected_discharge),
+               p.rowid
         FROM patients p
-        LEFT JOIN beds b ON p.bed_id = b.id
-        WHERE p.hospital_id = ? AND p.status = 'allocated' 
-        ORDER BY p.admission_date DESC
-    ''', (session['hospital_id'],))
-    
-    patients = []
-    for p in cursor.fetchall():
-        patients.append({
-            'id': p[0], 'name': p[1], 'age': p[2], 'blood_group': p[3], 'condition': p[4],
-            'bed_id': p[5], 'admission_date': p[6], 'severity': p[7], 'expected_stay': p[8],
-            'extended_stay': p[9], 
-            'bed_type': p[15] if p[15] else p[10], # Use actual type from JOIN, or fallback to recommendation
-            'risk_flag': p[11],
-            'heart_rate': p[12], 'spO2': p[13], 'temperature': p[14],
-            'expected_discharge': calculate_expected_discharge(p[6], p[8]),
-            'can_extend': (p[15] == 'flexible' and p[9] < 2) # Check actual bed type
-        })
-    conn.close()
-    return jsonify({'patients': patients})
+        LEFT JOIN beds b ON p.bed_id = b.id'''
+
+def allocated_patient_view(p):
+    return {
+        'id': p[0], 'name': p[1], 'age': p[2], 'blood_group': p[3], 'condition': p[4],
+        'bed_id': p[5], 'admission_date': p[6], 'severity': p[7], 'expected_stay': p[8],
+        'extended_stay': p[9], 
+        'bed_type': p[15] if p[15] else p[10], # Use actual type from JOIN, or fallback to recommendation
+        'risk_flag': p[11],
+        'heart_rate': p[12], 'spO2': p[13], 'temperature': p[14],
+        'expected_discharge': p[16],
+        'can_extend': (p[15] == 'flexible' and p[9] < 2) # Check actual bed type
+    }
+
+# --- LISTINGS ---
+# Keyset paging: ?limit=N returns at most N rows plus an opaque next_cursor holding the sort key of the
+# last row; pass it back as ?cursor= to continue. Without limit the whole listing comes back in one go.
+LISTING_MAX_LIMIT = 500
+
+def encode_cursor(*key): return base64.urlsafe_b64encode(json.dumps(key).encode()).decode()
+
+def decode_cursor(token):
+    try:
+        key = json.loads(base64.urlsafe_b64decode(token.encode()))
+        return key if isinstance(key, list) and len(key) == 2 else False
+    except: return False
+
+def listing_args():
+    """(limit, cursor key) from the query string; the key is False when the cursor is malformed"""
+    limit = request.args.get('limit', type=int)
+    if limit is not None: limit = max(1, min(limit, LISTING_MAX_LIMIT))
+    return limit, decode_cursor(request.args['cursor']) if request.args.get('cursor') else None
+
+def listing_response(name, rows, view, sort_key, limit):
+    """Serialises a listing straight off the SQLite cursor (queried with LIMIT limit+1 when paging).
+
+    ?format=ndjson streams one JSON object per line as rows are read, so memory stays flat however long
+    the listing is; a final {"next_cursor": ...} line follows when there are more pages.
+    """
+    more = {}
+    def items():
+        last = None
+        for i, row in enumerate(rows):
+            if limit is not None and i == limit:
+                more['next_cursor'] = encode_cursor(*sort_key(last)); break
+            last = row
+            yield view(row)
+    if request.args.get('format') == 'ndjson':
+        def lines():
+            for item in items(): yield json.dumps(item) + '\n'
+            if more: yield json.dumps(more) + '\n'
+        return hold_request_dbs(app.response_class(stream_with_context(lines()), mimetype='application/x-ndjson'))
+    return jsonify({name: list(items()), 'next_cursor': more.get('next_cursor')})
+
+@app.route('/api/allocated-patients')
+def allocated_patients():
+    """Allocated patients, newest admission first. Filters: severity, bed_type, status (default 'allocated').
+    See listing_response for limit/cursor paging and ?format=ndjson."""
+    if 'hospital_id' not in session: return jsonify({'error': 'Not logged in'}), 401
+    limit, after = listing_args()
+    if after is False: return jsonify({'error': 'Invalid cursor'}), 400
+    where, params = ["p.hospital_id = ?", "p.status = ?"], [session['hospital_id'], request.args.get('status', 'allocated')]
+    if request.args.get('severity'): where.append("p.severity = ?"); params.append(request.args['severity'])
+    if request.args.get('bed_type'): where.append("b.type = ?"); params.append(request.args['bed_type'])
+    if after: where.append("(p.admission_date, p.rowid) < (?, ?)"); params += after
+    sql = ALLOCATED_PATIENT_SQL + " WHERE " + " AND ".join(where) + " ORDER BY p.admission_date DESC, p.rowid DESC"
+    if limit: sql += " LIMIT ?"; params.append(limit + 1)
+    rows = get_db().execute(sql, params)
+    return listing_response('patients', rows, allocated_patient_view, lambda p: (p[6], p[17]), limit)
 
 @app.route('/api/discharge-patient', methods=['POST'])
 def discharge_patient():
-    data = request.json
-    conn = sqlite3.connect(DB_NAME); c = conn.cursor()
-    c.execute('SELECT bed_id FROM patients WHERE id=?', (data.get('patient_id'),))
-    res = c.fetchone()
-    if res and res[0]: c.execute("UPDATE beds SET status='available', patient_id=NULL WHERE id=?", (res[0],))
-    c.execute("UPDATE patients SET status='discharged' WHERE id=?", (data.get('patient_id'),))
-    conn.commit(); conn.close()
-    return jsonify({'success': True})
+    if 'hospital_id' not in session: return jsonify({'error': 'Unauthorized'}), 401
+    hid = session['hospital_id']
+    pid = (request.get_json(silent=True) or {}).get('patient_id')
+    conn = get_db(hid)
+    ensure_bed_index(conn); ensure_waiting_queue(conn)
+    def discharge(c):
+        c.execute("SELECT p.bed_id, b.hospital_id, b.type, p.severity, p.status, p.hospital_id FROM patients p LEFT JOIN beds b ON b.id = p.bed_id WHERE p.id=? AND p.hospital_id=?", (pid, hid))
+        res = c.fetchone()
+        if not res: return False
+        handed_to = None
+        if res and res[0]:
+            # Only free the bed if this patient still holds it (a repeated discharge must not free someone else's bed)
+            c.execute("UPDATE beds SET status='available', patient_id=NULL WHERE id=? AND patient_id=?", (res[0], pid))
+            if c.rowcount == 1:
+                bump_dashboard(res[1], available_beds=1, critical_load=-1 if res[3] == 'high' and res[4] == 'allocated' else 0)
+                publish_event(res[1], 'bed', bed_id=res[0], type=res[2], status='available', patient_id=None)
+                handed_to = hand_off_bed(c, res[1], res[2], res[0])
+        c.execute("UPDATE patients SET status='discharged' WHERE id=? AND status!='discharged'", (pid,))
+        if c.rowcount == 1: publish_event(res[5], 'patient', action='discharged', patient={'id': pid})
+        remove_waiting(pid)  # discharged straight from the waiting list
+        return handed_to
+    handed_to = write_transaction(conn, discharge)
+    if handed_to is False: return jsonify({'success': False, 'message': 'Patient not found'}), 404
+    with VITALS_LOCK: VITALS.pop(pid, None)
+    return jsonify({'success': True, 'handed_off_to': handed_to})
+
+@app.route('/api/waiting-queue')
+def waiting_queue():
+    if 'hospital_id' not in session: return jsonify({'error': 'Unauthorized'}), 401
+    hid = session['hospital_id']
+    conn = get_db()
+    ensure_waiting_queue(conn)
+    rows = {r[0]: r for r in conn.execute("SELECT id, name, severity, priority_score, doctor_recommendation, admission_date FROM patients WHERE hospital_id=? AND status='waiting'", (hid,))}
+    
+    queues = {}
+    for bed_type, entries in waiting_snapshot(hid).items():
+        live = [rows[pid] for _, _, pid in entries if pid in rows]
+        queues[bed_type] = [{'position': i + 1, 'patient_id': p[0], 'name': p[1], 'severity': p[2], 'priority_score': p[3],
+                             'doctor_recommendation': p[4], 'since': p[5]} for i, p in enumerate(live)]
+    return jsonify({'queues': queues, 'total_waiting': len(rows)})
 
 @app.route('/api/available-beds')
 def available_beds():
+    """Beds of the hospital by type and id. Filters: bed_type, status. Paged like /api/allocated-patients."""
+    if 'hospital_id' not in session: return jsonify({'error': 'Unauthorized'}), 401
+    limit, after = listing_args()
+    if after is False: return jsonify({'error': 'Invalid cursor'}), 400
+    where, params = ["hospital_id=?"], [session['hospital_id']]
+    if request.args.get('bed_type'): where.append("type=?"); params.append(request.args['bed_type'])
+    if request.args.get('status'): where.append("status=?"); params.append(request.args['status'])
+    if after: where.append("(type, id) > (?, ?)"); params += after
+    sql = "SELECT id, type, ward, status, last_occupied_date FROM beds WHERE " + " AND ".join(where) + " ORDER BY type, id"
+    if limit: sql += " LIMIT ?"; params.append(limit + 1)
+    rows = get_db().execute(sql, params)
+    return listing_response('beds', rows, lambda b: {'id':b[0], 'type':b[1], 'ward':b[2], 'status':b[3], 'last_occupied':b[4]}, lambda b: (b[1], b[0]), limit)
+
+@app.route('/api/overflow-options')
+def overflow_options():
+    """Sister hospitals ranked for diverting a patient: ?patient_id= of a waiting patient, or ?severity= and
+    ?doctor_recommendation= for one not yet admitted. ?limit=N (default 5)."""
+    if 'hospital_id' not in session: return jsonify({'error': 'Unauthorized'}), 401
+    hid = session['hospital_id']
+    conn = get_db()
+    sev, pref = request.args.get('severity'), request.args.get('doctor_recommendation')
+    if request.args.get('patient_id'):
+        row = conn.execute("SELECT severity, doctor_recommendation FROM patients WHERE id=? AND hospital_id=?", (request.args['patient_id'], hid)).fetchone()
+        if not row: return jsonify({'error': 'Patient not found'}), 404
+        sev, pref = row
+    if sev not in ('low', 'medium', 'high') or pref not in BED_TYPES:
+        return jsonify({'error': 'severity must be low, medium or high and doctor_recommendation a bed type'}), 400
+    try: limit = max(1, min(int(request.args.get('limit', OVERFLOW_MAX_ALTERNATIVES)), 50))
+    except ValueError: return jsonify({'error': 'limit must be a whole number'}), 400
+    ensure_bed_index(conn); ensure_routing_table()
+    return jsonify({'hospital_id': hid, 'severity': sev, 'doctor_recommendation': pref,
+                    'local_free_beds': free_bed_counts(hid), 'alternatives': overflow_alternatives(hid, sev, pref, limit)})
+
+@app.route('/api/transfer-costs', methods=['GET', 'POST'])
+def transfer_costs():
+    """Transfer costs from the session's hospital to the others. POST {"costs": {"HOSP002": 25, ...}} sets them."""
+    if 'hospital_id' not in session: return jsonify({'error': 'Unauthorized'}), 401
+    hid = session['hospital_id']
+    conn = get_catalog_db()
+    ensure_routing_table()
+    if request.method == 'POST':
+        costs = (request.json or {}).get('costs')
+        if not isinstance(costs, dict): return jsonify({'success': False, 'message': 'costs must be an object of hospital id -> cost'}), 400
+        try: costs = {str(dst): float(cost) for dst, cost in costs.items()}
+        except (TypeError, ValueError): return jsonify({'success': False, 'message': 'Costs must be numbers'}), 400
+        with ROUTING_LOCK: known = set(HOSPITAL_NAMES)
+        unknown = sorted(dst for dst in costs if dst not in known or dst == hid)
+        if unknown: return jsonify({'success': False, 'message': f"Unknown or own hospital: {', '.join(unknown)}"}), 400
+        if any(cost < 0 for cost in costs.values()): return jsonify({'success': False, 'message': 'Costs cannot be negative'}), 400
+        def save(c):
+            c.executemany("INSERT OR REPLACE INTO transfer_costs (from_hospital, to_hospital, cost) VALUES (?, ?, ?)", [(hid, dst, cost) for dst, cost in costs.items()])
+            after_commit(lambda: set_transfer_costs(hid, costs))
+        write_transaction(conn, save)
+    with ROUTING_LOCK: configured = dict(TRANSFER_COSTS.get(hid, {}))
+    return jsonify({'success': True, 'hospital_id': hid, 'costs': configured, 'default_cost': TRANSFER_COST_DEFAULT})
+
+# --- DISCHARGE FORECAST ---
+FORECAST_MAX_HOURS = 24 * 30
+FORECAST_BUCKETS = {'hour': '%Y-%m-%d %H:00', 'day': '%Y-%m-%d'}
+
+def forecast_releases(conn, hid, hours, bucket='hour', now=None):
+    """Beds expected to free up at hid within `hours`, per bed type, bucketed by hour or day.
+
+    One range scan of idx_patients_hospital_status_discharge (hospital, 'allocated', expected_discharge <
+    horizon) grouped in SQL. Stays already past their expected discharge are counted as 'overdue'.
+    """
+    now = now or datetime.now()
+    start, until = now.strftime(TIMESTAMP_FORMAT), (now + timedelta(hours=hours)).strftime(TIMESTAMP_FORMAT)
+    rows = conn.execute(f"""
+        SELECT b.type, CASE WHEN p.expected_discharge < ? THEN 'overdue' ELSE strftime('{FORECAST_BUCKETS[bucket]}', p.expected_discharge) END AS slot,
+               COUNT(*), MIN(p.expected_discharge)
+        FROM patients p JOIN beds b ON b.id = p.bed_id
+        WHERE p.hospital_id=? AND p.status='allocated' AND p.expected_discharge < ?
+        GROUP BY b.type, slot ORDER BY b.type, slot""", (start, hid, until))
+    bed_types = {t: {'releasing': 0, 'overdue': 0, 'next_release': None, 'timeline': []} for t in BED_TYPES}
+    for bed_type, slot, n, first in rows:
+        f = bed_types.setdefault(bed_type, {'releasing': 0, 'overdue': 0, 'next_release': None, 'timeline': []})
+        f['releasing'] += n
+        if slot == 'overdue': f['overdue'] = n
+        else:
+            f['timeline'].append({'at': slot, 'beds': n})
+            if f['next_release'] is None: f['next_release'] = first  # slots arrive in time order
+    return {'from': start, 'until': until, 'bucket': bucket, 'bed_types': bed_types}
+
+@app.route('/api/discharge-forecast')
+def discharge_forecast():
+    """Beds expected to free up per type over ?hours=N (hourly buckets, default 24) or ?days=N (daily buckets)"""
     if 'hospital_id' not in session: return jsonify({'error': 'Unauthorized'}), 401
-    conn = sqlite3.connect(DB_NAME); c = conn.cursor()
-    c.execute("SELECT id, type, ward, status, last_occupied_date FROM beds WHERE hospital_id=? ORDER BY type, id", (session['hospital_id'],))
-    beds = [{'id':b[0], 'type':b[1], 'ward':b[2], 'status':b[3], 'last_occupied':b[4]} for b in c.fetchall()]
-    conn.close()
-    return jsonify({'beds': beds})
+    try:
+        if request.args.get('days'): hours, bucket = int(request.args['days']) * 24, 'day'
+        else: hours, bucket = int(request.args.get('hours', 24)), 'hour'
+    except ValueError: return jsonify({'error': 'hours and days must be whole numbers'}), 400
+    if not 0 < hours <= FORECAST_MAX_HOURS: return jsonify({'error': f'Forecast window must be 1 to {FORECAST_MAX_HOURS} hours'}), 400
+    hid = session['hospital_id']
+    conn = get_db()
+    ensure_bed_index(conn)
+    forecast = forecast_releases(conn, hid, hours, bucket)
+    free = free_bed_counts(hid)
+    for bed_type, f in forecast['bed_types'].items(): f['available_now'] = free.get(bed_type, 0)
+    return jsonify(forecast)
 
 @app.route('/api/extend-stay', methods=['POST'])
 def extend_stay():
-    data = request.json
-    conn = sqlite3.connect(DB_NAME); c = conn.cursor()
-    c.execute('SELECT expected_stay_days, extended_stay, doctor_recommendation FROM patients WHERE id=?', (data.get('patient_id'),))
-    p = c.fetchone()
-    if p and p[2] == 'flexible' and p[1] < 2:
-        c.execute('UPDATE patients SET expected_stay_days=?, extended_stay=? WHERE id=?', (p[0]+2, p[1]+1, data.get('patient_id')))
-        conn.commit(); conn.close()
-        return jsonify({'success': True, 'new_stay_days': p[0]+2})
-    conn.close()
-    return jsonify({'success': False})
+    if 'hospital_id' not in session: return jsonify({'error': 'Unauthorized'}), 401
+    hid = session['hospital_id']
+    pid = (request.get_json(silent=True) or {}).get('patient_id')
+    def extend(c):
+        # Conditional increment so two concurrent clicks cannot both pass the "< 2 extensions" check
+        c.execute("UPDATE patients SET expected_stay_days=expected_stay_days+?, extended_stay=extended_stay+1, expected_discharge=datetime(expected_discharge, ?) WHERE id=? AND hospital_id=? AND doctor_recommendation='flexible' AND extended_stay<?",
+                  (STAY_EXTENSION_DAYS, f'+{STAY_EXTENSION_DAYS} days', pid, hid, MAX_STAY_EXTENSIONS))
+        if c.rowcount != 1:
+            return None if c.execute('SELECT 1 FROM patients WHERE id=? AND hospital_id=?', (pid, hid)).fetchone() else False
+        new_stay = c.execute('SELECT expected_stay_days FROM patients WHERE id=?', (pid,)).fetchone()[0]
+        publish_patient(c, hid, pid, 'extended')
+        return new_stay
+    conn = get_db(hid)
+    new_stay = write_transaction(conn, extend)
+    if new_stay is False: return jsonify({'success': False, 'message': 'Patient not found'}), 404
+    if new_stay is None: return jsonify({'success': False})
+    return jsonify({'success': True, 'new_stay_days': new_stay})
+
+@app.route('/api/vitals', methods=['POST'])
+def post_vitals():
+    """Bedside monitor readings: one reading, a list, or {"readings": [...]}, each with patient_id and any vitals"""
+    if 'hospital_id' not in session: return jsonify({'error': 'Unauthorized'}), 401
+    data = request.get_json(silent=True)
+    readings = data.get('readings') if isinstance(data, dict) and 'readings' in data else data if isinstance(data, list) else [data]
+    if not isinstance(readings, list) or not readings or readings == [None]:
+        return jsonify({'success': False, 'message': 'Expected a reading or a non-empty list of readings.'}), 400
+    if len(readings) > VITALS_MAX_BATCH:
+        return jsonify({'success': False, 'message': f'At most {VITALS_MAX_BATCH} readings per request.'}), 400
+    conn = get_db()
+    ensure_bed_index(conn); ensure_waiting_queue(conn)
+    return jsonify(ingest_vitals(conn, session['hospital_id'], readings))
+
+@app.route('/api/vitals/<patient_id>')
+def recent_vitals(patient_id):
+    """The readings this process holds for a patient, oldest first (?limit=N for the newest N)"""
+    if 'hospital_id' not in session: return jsonify({'error': 'Unauthorized'}), 401
+    if not admitted_patients(get_db(), session['hospital_id'], [patient_id]): return jsonify({'success': False, 'message': 'Patient not found'}), 404
+    limit = request.args.get('limit', type=int) or VITALS_WINDOW
+    with VITALS_LOCK:
+        ring = VITALS.get(patient_id)
+        readings = ring.recent(max(1, limit)) if ring else []
+        band = ring.band if ring else None
+    return jsonify({'success': True, 'patient_id': patient_id, 'readings': readings, 'rule_band': band})
+
+@app.route('/api/events')
+def events():
+    """Server-Sent Events: bed, patient, capacity and stats deltas for the session's hospital"""
+    if 'hospital_id' not in session: return jsonify({'error': 'Unauthorized'}), 401
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    resp = app.response_class(event_stream(session['hospital_id'], last_event_id), mimetype='text/event-stream')
+    resp.headers['Cache-Control'] = 'no-cache'
+    resp.headers['X-Accel-Buffering'] = 'no'  # stop nginx-style proxies from buffering the stream
+    return resp
+
+@app.route('/metrics')
+def metrics():
+    """Prometheus text exposition of this process's metrics"""
+    return app.response_class(METRICS.exposition(), mimetype=None, content_type=METRICS_CONTENT_TYPE)
+
+# --- MODEL ADMIN ---
+def admin_authorized():
+    return bool(ADMIN_TOKEN) and hmac.compare_digest(request.headers.get('X-Admin-Token', ''), ADMIN_TOKEN)
+
+def process_report():
+    return {'pid': os.getpid(), 'startup_seconds': None if STARTUP_SECONDS is None else round(STARTUP_SECONDS, 4),
+            'rss_bytes': process_rss_bytes()}
+
+@app.route('/api/admin/models')
+def model_status():
+    """Published versions, the registry's active version and what this worker is serving"""
+    if not admin_authorized(): return jsonify({'error': 'Forbidden'}), 403
+    return jsonify({'active': model_registry.active_version(), 'versions': model_registry.list_versions(),
+                    'loaded': MODELS.info() if MODELS else None, 'process': process_report()})
+
+@app.route('/api/admin/models/activate', methods=['POST'])
+def activate_models():
+    """Loads {"version": ...} in this worker and swaps it in, then points models/CURRENT at it so other
+    workers running the watcher (SERBAS_MODEL_WATCH) follow. Requests in flight finish on the old bundle."""
+    if not admin_authorized(): return jsonify({'error': 'Forbidden'}), 403
+    data = request.json or {}
+    version = data.get('version') or model_registry.active_version()
+    try:
+        with MODELS_LOCK:  # keeps this worker's watcher from acting on the old pointer between the two steps
+            bundle = load_ml_models(data.get('engine'), version)
+            model_registry.activate(version)
+    except (OSError, ValueError, RuntimeError) as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    return jsonify({'success': True, 'loaded': bundle.info(), 'process': process_report()})
 
 @app.route('/logout')
 def logout(): session.clear(); return jsonify({'success': True})
 
 if __name__ == '__main__':
     init_db()
-    print(f"🚀 SERBAS AI Running (DB: {DB_NAME})")
+    current_models()
+    print(f"🚀 SERBAS AI Running (DB: {f'{SHARD_DIR}/ (sharded)' if SHARD_DIR else DB_NAME})")
     port = int(os.environ.get("PORT", 8001))
     app.run(host='0.0.0.0', port=port)
\ No newline at end of file
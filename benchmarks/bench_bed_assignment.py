@@ -0,0 +1,84 @@
+"""Greedy solve_bed_csp vs the batch min-cost matching in solve_bed_assignment.
+
+Both solvers see the same synthetic patient list and the same free beds. Reports wall time and the
+total priority score of the patients who got a bed.
+
+    python benchmarks/bench_bed_assignment.py [--seed 42] [--out results.json]
+"""
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)  # app.py loads its model files relative to the working directory
+import app as serbas
+
+# (name, patients, icu, general, flexible)
+SCENARIOS = [
+    ('surge_scarce_beds', 300, 20, 120, 30),
+    ('surge_icu_crunch', 500, 40, 300, 60),
+    ('large_hospital', 500, 500, 3500, 1000),
+    ('mass_casualty', 1000, 300, 2000, 700),
+]
+
+def make_patients(n, rng):
+    sev = rng.choice(['high', 'medium', 'low'], size=n, p=[0.25, 0.40, 0.35])
+    risk = rng.choice(['critical', 'moderate', 'low'], size=n, p=[0.2, 0.3, 0.5])
+    pref = rng.choice(['icu', 'general', 'flexible'], size=n, p=[0.2, 0.5, 0.3])
+    bonus = np.where(rng.random(n) < 0.3, 40, 0)
+    return [(serbas.calculate_priority_score(s, r, d, int(b)), s, d) for s, r, d, b in zip(sev, risk, pref, bonus)]
+
+def load_free_beds(hid, icu, general, flexible):
+    serbas.FREE_BEDS = {hid: {
+        'icu': {f'ICU{i:05d}': None for i in range(icu)},
+        'general': {f'BED{i:05d}': None for i in range(general)},
+        'flexible': {f'FLEX{i:05d}': None for i in range(flexible)},
+    }}
+    serbas.FREE_BEDS_READY = True
+
+def run_greedy(hid, patients, cursor):
+    served = 0
+    for priority, sev, pref in patients:
+        bed, _ = serbas.solve_bed_csp(cursor, hid, priority, sev, pref)
+        if bed: served += priority
+    return served
+
+def run_optimal(hid, patients):
+    chosen = serbas.solve_bed_assignment(patients, serbas.free_bed_counts(hid))
+    return sum(p[0] for p, t in zip(patients, chosen) if t)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--out', help='write the JSON report here as well as stdout')
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    cursor = sqlite3.connect(':memory:').cursor()
+    report = []
+    for name, n, icu, general, flexible in SCENARIOS:
+        patients = make_patients(n, rng)
+        load_free_beds('BENCH', icu, general, flexible)
+        t0 = time.perf_counter(); greedy = run_greedy('BENCH', patients, cursor); t_greedy = time.perf_counter() - t0
+        load_free_beds('BENCH', icu, general, flexible)
+        t0 = time.perf_counter(); optimal = run_optimal('BENCH', patients); t_optimal = time.perf_counter() - t0
+        report.append({
+            'scenario': name, 'patients': n, 'beds': icu + general + flexible,
+            'greedy': {'seconds': round(t_greedy, 4), 'priority_served': greedy},
+            'optimal': {'seconds': round(t_optimal, 4), 'priority_served': optimal},
+            'priority_gain': optimal - greedy,
+        })
+
+    out = json.dumps({'benchmark': 'bed_assignment', 'seed': args.seed, 'results': report}, indent=2)
+    print(out)
+    if args.out:
+        with open(args.out, 'w') as f: f.write(out)
+
+if __name__ == '__main__':
+    main()
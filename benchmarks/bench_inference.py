@@ -0,0 +1,71 @@
+"""Single-patient triage latency: sklearn artifacts vs the compiled flat-array engine.
+
+Runs predict_severity_ml and run_unsupervised_model one row at a time over the training CSVs with
+each engine, reports p50/p99 latency and checks that both engines return identical results.
+Run `python compile_models.py` first to produce compiled_models.npz.
+
+    python benchmarks/bench_inference.py [--rows 2000] [--out results.json]
+"""
+import argparse
+import contextlib
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)  # app.py loads its model files relative to the working directory
+with contextlib.redirect_stdout(sys.stderr):  # model loading messages; stdout carries only the report
+    import app as serbas
+
+CSV_FILES = ['new_random_synthetic_data.csv', 'synthetic_triage_data.csv']
+
+def load_rows(limit):
+    df = pd.concat([pd.read_csv(f) for f in CSV_FILES], ignore_index=True).head(limit)
+    return [{'age': r.age, 'heart_rate': r.heart_rate, 'blood_pressure_systolic': r.bp_systolic,
+             'blood_pressure_diastolic': r.bp_diastolic, 'spO2': r.spO2, 'temperature': r.temperature}
+            for r in df.itertuples()]
+
+def timed(fn, rows):
+    out, lat = [], np.empty(len(rows))
+    for i, row in enumerate(rows):
+        t0 = time.perf_counter()
+        out.append(fn(row))
+        lat[i] = time.perf_counter() - t0
+    return out, {'p50_us': round(float(np.percentile(lat, 50)) * 1e6, 1), 'p99_us': round(float(np.percentile(lat, 99)) * 1e6, 1)}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=2000)
+    parser.add_argument('--out', help='write the JSON report here as well as stdout')
+    args = parser.parse_args()
+
+    rows = load_rows(args.rows)
+    results, outputs = {}, {}
+    for engine in ('sklearn', 'compiled'):
+        with contextlib.redirect_stdout(sys.stderr): models = serbas.load_ml_models(engine)
+        if models.engine != engine:
+            sys.exit(f"{engine} engine unavailable (run compile_models.py first)")
+        for fn in (serbas.predict_severity_ml, serbas.run_unsupervised_model): fn(rows[0])  # warm-up
+        sev, sev_lat = timed(serbas.predict_severity_ml, rows)
+        clu, clu_lat = timed(serbas.run_unsupervised_model, rows)
+        outputs[engine] = (sev, clu)
+        results[engine] = {'predict_severity_ml': sev_lat, 'run_unsupervised_model': clu_lat}
+
+    report = {
+        'benchmark': 'inference', 'rows': len(rows), 'results': results,
+        'identical_predictions': outputs['sklearn'] == outputs['compiled'],
+        'speedup_p50': {k: round(results['sklearn'][k]['p50_us'] / results['compiled'][k]['p50_us'], 1) for k in results['sklearn']},
+    }
+    out = json.dumps(report, indent=2)
+    print(out)
+    if args.out:
+        with open(args.out, 'w') as f: f.write(out)
+    sys.exit(0 if report['identical_predictions'] else 1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+"""Per-worker model startup time and memory, lazy loading vs pre-fork loading.
+
+Forks --workers processes the way a pre-forking server does and has each one make its first
+prediction. 'lazy' workers load the model bundle themselves on that first call; 'preload' workers
+inherit a bundle the parent loaded before forking (gunicorn --preload, SERBAS_PRELOAD_MODELS=1).
+Reports, per worker, the time to the first prediction, resident memory (RSS) and proportional
+set size (PSS, Linux only: shared pages are split between the processes mapping them, so it shows
+what a worker really costs).
+
+    python benchmarks/bench_model_memory.py [--workers 4] [--engine sklearn|compiled] [--out results.json]
+"""
+import argparse
+import contextlib
+import json
+import multiprocessing as mp
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)  # app.py loads its model files relative to the working directory
+with contextlib.redirect_stdout(sys.stderr):  # model loading messages; stdout carries only the report
+    import app as serbas
+
+ROW = {'age': 70, 'heart_rate': 140, 'blood_pressure_systolic': 120, 'blood_pressure_diastolic': 80, 'spO2': 90, 'temperature': 38.0}
+
+def pss_bytes():
+    try:
+        with open('/proc/self/smaps_rollup') as f:
+            for line in f:
+                if line.startswith('Pss:'): return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+def worker(engine, ready, results):
+    serbas.INFERENCE_ENGINE = engine
+    ready.wait()
+    t0 = time.perf_counter()
+    with contextlib.redirect_stdout(sys.stderr):
+        serbas.predict_severity_ml(serbas.build_ml_data(ROW))
+        serbas.run_unsupervised_model(serbas.build_ml_data(ROW))
+    first = time.perf_counter() - t0
+    ready.wait()  # measure memory once every worker has loaded
+    pss = pss_bytes()
+    results.put({'pid': os.getpid(), 'first_prediction_seconds': round(first, 4),
+                 'rss_mb': round(serbas.process_rss_bytes() / 2**20, 1),
+                 'pss_mb': None if pss is None else round(pss / 2**20, 1)})
+
+def run(mode, engine, n):
+    serbas.MODELS = None
+    if mode == 'preload':
+        with contextlib.redirect_stdout(sys.stderr): serbas.load_ml_models(engine)
+    ready, results = mp.Barrier(n + 1), mp.Queue()
+    procs = [mp.Process(target=worker, args=(engine, ready, results)) for _ in range(n)]
+    for p in procs: p.start()
+    ready.wait(); ready.wait()
+    out = sorted((results.get() for _ in procs), key=lambda r: r['pid'])
+    for p in procs: p.join()
+    total_pss = sum(r['pss_mb'] for r in out) if all(r['pss_mb'] is not None for r in out) else None
+    return {'workers': out, 'total_rss_mb': round(sum(r['rss_mb'] for r in out), 1),
+            'total_pss_mb': None if total_pss is None else round(total_pss, 1)}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--engine', choices=('sklearn', 'compiled'), default=serbas.INFERENCE_ENGINE)
+    parser.add_argument('--out', help='write the JSON report here as well as stdout')
+    args = parser.parse_args()
+    mp.set_start_method('fork')
+
+    report = {'benchmark': 'model_memory', 'engine': args.engine, 'model_version': serbas.model_registry.active_version(),
+              'lazy': run('lazy', args.engine, args.workers), 'preload': run('preload', args.engine, args.workers)}
+    out = json.dumps(report, indent=2)
+    print(out)
+    if args.out:
+        with open(args.out, 'w') as f: f.write(out)
+
+if __name__ == '__main__':
+    main()
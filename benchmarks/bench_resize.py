@@ -0,0 +1,68 @@
+"""Capacity resize timing for very large hospitals.
+
+Drives /api/update-capacity on a scratch copy of the schema through a grow / shrink / grow cycle
+up to --beds beds and times each request. Each request is one write transaction: bed numbering
+comes from bed_sequences, beds are inserted and deleted with executemany, and the removable beds
+are picked with a single SELECT. After every step the bed counts, the free-bed index and the
+dashboard counters are checked against SQLite. Exits 1 when a step exceeds --budget seconds or a
+check fails.
+
+    python benchmarks/bench_resize.py [--beds 50000] [--budget 1.0] [--out results.json]
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)  # app.py loads its model files relative to the working directory
+import app as serbas
+
+HOSPITAL = ('HOSP001', 'password123')
+
+def consistent(conn, hid):
+    db = {t: n for t, n in conn.execute("SELECT type, COUNT(*) FROM beds WHERE hospital_id=? AND status='available' GROUP BY type", (hid,))}
+    index = {t: n for t, n in serbas.free_bed_counts(hid).items() if n}
+    stats = {k: v for k, v in serbas.DASHBOARD_STATS.get(hid, {}).items() if k not in ('version', 'db_version')}
+    return db == index and stats == serbas.compute_dashboard_stats(conn, hid)[hid]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--beds', type=int, default=50000, help='largest total bed count in the cycle')
+    parser.add_argument('--budget', type=float, default=1.0, help='seconds allowed per resize request')
+    parser.add_argument('--out', help='write the JSON report here as well as stdout')
+    args = parser.parse_args()
+
+    serbas.DB_NAME = os.path.join(tempfile.mkdtemp(prefix='serbas-resize-'), 'resize.db')
+    serbas.init_db()
+    client = serbas.app.test_client()
+    client.post('/login', json={'hospital_id': HOSPITAL[0], 'password': HOSPITAL[1]})
+    client.get('/api/dashboard-data')  # load the counters so they are maintained (and checked) throughout
+    conn = serbas.get_db()
+
+    big, half = args.beds, args.beds // 2
+    steps = [('grow', big, big // 10), ('shrink', half, half // 10), ('grow', big, big // 10), ('shrink', 150, 20)]
+    results, ok = [], True
+    for label, total, icu in steps:
+        t0 = time.perf_counter()
+        resp = client.post('/api/update-capacity', json={'total_beds': total, 'icu_beds': icu}).get_json()
+        elapsed = time.perf_counter() - t0
+        count = conn.execute("SELECT COUNT(*) FROM beds WHERE hospital_id=?", (HOSPITAL[0],)).fetchone()[0]
+        checks = resp['success'] and count == total and consistent(conn, HOSPITAL[0])
+        ok = ok and checks and elapsed <= args.budget
+        results.append({'step': label, 'total_beds': total, 'icu_beds': icu, 'seconds': round(elapsed, 4),
+                        'beds_per_second': round(abs(total - (results[-1]['total_beds'] if results else 150)) / elapsed),
+                        'consistent': checks})
+
+    report = {'benchmark': 'resize', 'db': serbas.DB_NAME, 'budget_seconds': args.budget, 'steps': results, 'within_budget': ok}
+    out = json.dumps(report, indent=2)
+    print(out)
+    if args.out:
+        with open(args.out, 'w') as f: f.write(out)
+    sys.exit(0 if ok else 1)
+
+if __name__ == '__main__':
+    main()
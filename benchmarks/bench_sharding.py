@@ -0,0 +1,94 @@
+"""Write throughput across hospitals: one shared database file vs one shard per hospital.
+
+For each hospital count in --hospitals, builds a scratch layout (single file, then SERBAS_SHARD_DIR
+style shards), forks one worker process per hospital and has every worker drive admissions and
+discharges for its own hospital through the Flask test client. With one file every admission at
+any branch queues on the same SQLite write lock; with shards each hospital has its own. Reports
+writes per second and the scaling relative to one hospital (1.0 per added hospital is linear).
+Scaling is bounded by the CPU cores available (reported as cpu_count).
+
+    python benchmarks/bench_sharding.py [--hospitals 1 2 4 8] [--requests 300] [--synchronous FULL] [--out results.json]
+"""
+import argparse
+import contextlib
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)  # app.py loads its model files relative to the working directory
+with contextlib.redirect_stdout(sys.stderr):  # model loading messages; stdout carries only the report
+    import app as serbas
+from workload import build_hospitals, patient_stream
+
+def drive(hid, n_requests, seed, results):
+    client = serbas.app.test_client()
+    client.post('/login', json={'hospital_id': hid, 'password': 'password123'})
+    admitted, writes, errors = [], 0, 0
+    patients = patient_stream(n_requests, seed)
+    for i in range(n_requests):
+        # Alternate admissions and discharges so beds keep turning over instead of running out
+        if i % 2 and admitted: resp = client.post('/api/discharge-patient', json={'patient_id': admitted.pop(0)})
+        else:
+            resp = client.post('/api/allocate-bed', json=patients[i])
+            if resp.status_code == 200: admitted.append(resp.get_json()['patient_id'])
+        if resp.status_code >= 500: errors += 1
+        else: writes += 1
+    results.put({'hospital': hid, 'writes': writes, 'errors': errors})
+
+def worker(hid, n_requests, seed, start, results):
+    start.wait()
+    # A fresh thread: sqlite connections opened by the parent must not be used across the fork
+    t = threading.Thread(target=drive, args=(hid, n_requests, seed, results))
+    t.start(); t.join()
+
+def run(layout, n_hospitals, args):
+    target = tempfile.mkdtemp(prefix=f'serbas-{layout}-')
+    sharded = layout == 'sharded'
+    hospitals = build_hospitals(serbas, target if sharded else os.path.join(target, 'bench.db'), n_hospitals, args.beds, sharded=sharded)
+    ctx = multiprocessing.get_context('fork')
+    start, results = ctx.Barrier(n_hospitals + 1), ctx.Queue()
+    procs = [ctx.Process(target=worker, args=(hid, args.requests, args.seed + i, start, results)) for i, hid in enumerate(hospitals)]
+    for p in procs: p.start()
+    start.wait()
+    t0 = time.perf_counter()
+    parts = [results.get() for _ in procs]
+    elapsed = time.perf_counter() - t0
+    for p in procs: p.join()
+    writes = sum(p['writes'] for p in parts)
+    return {'hospitals': n_hospitals, 'writes': writes, 'server_errors': sum(p['errors'] for p in parts),
+            'seconds': round(elapsed, 3), 'writes_per_s': round(writes / elapsed, 1)}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--hospitals', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--requests', type=int, default=300, help='admissions + discharges per hospital')
+    parser.add_argument('--beds', type=int, default=200, help='beds per hospital')
+    parser.add_argument('--engine', choices=('sklearn', 'compiled'), default='compiled', help='triage engine (compiled keeps the ML cost out of the way)')
+    parser.add_argument('--synchronous', choices=('NORMAL', 'FULL'), default='NORMAL',
+                        help='FULL fsyncs every commit while holding the write lock, as a durability-first deployment would')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--out', help='write the JSON report here as well as stdout')
+    args = parser.parse_args()
+
+    serbas.DB_PRAGMAS = tuple((name, args.synchronous if name == 'synchronous' else value) for name, value in serbas.DB_PRAGMAS)
+    with contextlib.redirect_stdout(sys.stderr): serbas.load_ml_models(args.engine)  # loaded once before forking; the workers share it
+    report = {'benchmark': 'sharding', 'cpu_count': os.cpu_count(), 'engine': serbas.current_models().engine,
+              'config': {k: v for k, v in vars(args).items() if k != 'out'}}
+    for layout in ('single', 'sharded'):
+        runs = [run(layout, n, args) for n in args.hospitals]
+        base = runs[0]['writes_per_s'] / runs[0]['hospitals']
+        for r in runs: r['scaling_per_hospital'] = round(r['writes_per_s'] / (base * r['hospitals']), 2)
+        report[layout] = runs
+    out = json.dumps(report, indent=2)
+    print(out)
+    if args.out:
+        with open(args.out, 'w') as f: f.write(out)
+
+if __name__ == '__main__':
+    main()
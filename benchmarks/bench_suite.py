@@ -0,0 +1,168 @@
+"""Regression benchmark suite: micro-benchmarks of the triage/placement functions plus an end-to-end load run.
+
+Patients come from benchmarks/workload.py (serbas.py's generator, training severity mix, seeded).
+
+  micro  predict_severity_ml, run_unsupervised_model, calculate_priority_score and solve_bed_csp
+         (planning mode: the bed is taken off the in-memory free list and put back), one call at a time.
+         The two model calls are timed with the prediction cache disabled (every call runs the model), then
+         again as *_cached rows with every row already cached (every call is a hit)
+  e2e    --threads clients per process drive the Flask app through its test client against a scratch
+         database of --hospitals hospitals with --beds beds each: admissions, discharges, stay extensions
+         and dashboard polls. Reports throughput, per-route latency and SQLite statements per request.
+
+Results are one JSON document (throughput, p50/p95/p99, query counts) for diffing between runs:
+
+    python benchmarks/bench_suite.py [--only micro|e2e] [--threads 8] [--hospitals 4] [--beds 200] [--out run.json]
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)  # app.py loads its model files relative to the working directory
+with contextlib.redirect_stdout(sys.stderr):  # model loading messages; stdout carries only the report
+    import app as serbas
+from workload import build_hospitals, ml_rows, patient_stream, percentiles
+
+def time_calls(fn, args_list):
+    lat = np.empty(len(args_list))
+    start = time.perf_counter()
+    for i, args in enumerate(args_list):
+        t0 = time.perf_counter()
+        fn(*args)
+        lat[i] = time.perf_counter() - t0
+    total = time.perf_counter() - start
+    return {'calls': len(args_list), 'ops_per_s': round(len(args_list) / total, 1), 'latency_us': percentiles(lat, scale=1e6)}
+
+@contextlib.contextmanager
+def prediction_cache_disabled():
+    """Every predict_severity_ml / run_unsupervised_model call runs its model while this is active"""
+    caches = (serbas.SEVERITY_CACHE, serbas.CLUSTER_CACHE)
+    sizes = [cache.size for cache in caches]
+    for cache in caches: cache.clear(); cache.size = 0
+    try:
+        yield
+    finally:
+        for cache, size in zip(caches, sizes): cache.size = size
+
+def run_micro(n, seed):
+    patients = patient_stream(n, seed)
+    rows = ml_rows(patients, serbas)
+    with prediction_cache_disabled():
+        for row in rows[:10]: serbas.predict_severity_ml(row); serbas.run_unsupervised_model(row)  # warm-up
+        uncached = {
+            'predict_severity_ml': time_calls(serbas.predict_severity_ml, [(r,) for r in rows]),
+            'run_unsupervised_model': time_calls(serbas.run_unsupervised_model, [(r,) for r in rows]),
+        }
+
+    # Fills the cache, so the *_cached rows below time hits only
+    severities = [serbas.predict_severity_ml(r)[0] for r in rows]
+    bonuses = [serbas.run_unsupervised_model(r)[0] for r in rows]
+    scores = [serbas.calculate_priority_score(s, p['health_risk'], p['doctor_recommendation'], b) for p, s, b in zip(patients, severities, bonuses)]
+
+    db_path = os.path.join(tempfile.mkdtemp(prefix='serbas-bench-'), 'micro.db')
+    hid = build_hospitals(serbas, db_path, 1, 200)[0]
+    cursor = serbas.get_db().cursor()
+    bed_types = dict(cursor.execute("SELECT id, type FROM beds"))
+    def place(score, sev, pref):
+        bed, _ = serbas.solve_bed_csp(cursor, hid, score, sev, pref)
+        if bed: serbas.push_free_bed(hid, bed_types[bed], bed)  # keep the free list full for the next call
+
+    return {
+        **uncached,
+        'predict_severity_ml_cached': time_calls(serbas.predict_severity_ml, [(r,) for r in rows]),
+        'run_unsupervised_model_cached': time_calls(serbas.run_unsupervised_model, [(r,) for r in rows]),
+        'calculate_priority_score': time_calls(serbas.calculate_priority_score, [(s, p['health_risk'], p['doctor_recommendation'], b) for p, s, b in zip(patients, severities, bonuses)]),
+        'solve_bed_csp': time_calls(place, [(sc, s, p['doctor_recommendation']) for p, s, sc in zip(patients, severities, scores)]),
+    }
+
+def e2e_worker(tid, hid, n_requests, discharge_ratio, poll_ratio, seed, samples, lock):
+    rng = random.Random(seed * 1000 + tid)
+    patients = patient_stream(n_requests, seed * 1000 + tid)
+    client = serbas.app.test_client()
+    client.post('/login', json={'hospital_id': hid, 'password': 'password123'})
+    mine, local, errors = [], defaultdict(list), 0
+    for i in range(n_requests):
+        roll = rng.random()
+        if roll < poll_ratio:
+            route, call = 'dashboard', lambda: client.get('/api/dashboard-data')
+        elif mine and roll < poll_ratio + discharge_ratio:
+            pid = mine.pop(rng.randrange(len(mine)))
+            route, call = 'discharge', lambda: client.post('/api/discharge-patient', json={'patient_id': pid})
+        elif mine and roll < poll_ratio + discharge_ratio + 0.05:
+            route, call = 'extend', lambda: client.post('/api/extend-stay', json={'patient_id': rng.choice(mine)})
+        else:
+            route, call = 'allocate', lambda: client.post('/api/allocate-bed', json=patients[i])
+        t0 = time.perf_counter()
+        resp = call()
+        elapsed = time.perf_counter() - t0
+        # The test client runs the request on this thread, so this is exactly that request's statement count
+        local[route].append((elapsed, serbas.DB_LOCAL.queries))
+        if resp.status_code >= 500: errors += 1
+        elif route == 'allocate': mine.append(resp.get_json()['patient_id'])
+    with lock:
+        for route, values in local.items(): samples[route].extend(values)
+        samples['_errors'].append(errors)
+
+def run_e2e(args):
+    db_path = os.path.join(tempfile.mkdtemp(prefix='serbas-bench-'), 'e2e.db')
+    hospitals = build_hospitals(serbas, db_path, args.hospitals, args.beds)
+    samples, lock = defaultdict(list), threading.Lock()
+    threads = [threading.Thread(target=e2e_worker, args=(t, hospitals[t % len(hospitals)], args.requests, args.discharge_ratio, args.poll_ratio, args.seed, samples, lock))
+               for t in range(args.threads)]
+    start = time.perf_counter()
+    for t in threads: t.start()
+    for t in threads: t.join()
+    elapsed = time.perf_counter() - start
+
+    errors = sum(samples.pop('_errors'))
+    total = sum(len(v) for v in samples.values())
+    routes = {}
+    for route, values in sorted(samples.items()):
+        lat, queries = [v[0] for v in values], np.array([v[1] for v in values])
+        routes[route] = {'requests': len(values), 'latency_ms': percentiles(lat),
+                         'db_queries': {'mean': round(float(queries.mean()), 2), 'p95': float(np.percentile(queries, 95)), 'max': int(queries.max())}}
+    return {'requests': total, 'seconds': round(elapsed, 3), 'throughput_rps': round(total / elapsed, 1),
+            'server_errors': errors, 'routes': routes,
+            'latency_ms': percentiles([v[0] for values in samples.values() for v in values])}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--only', choices=('micro', 'e2e'))
+    parser.add_argument('--micro-calls', type=int, default=2000)
+    parser.add_argument('--threads', type=int, default=8, help='concurrent e2e clients')
+    parser.add_argument('--requests', type=int, default=200, help='e2e requests per client')
+    parser.add_argument('--hospitals', type=int, default=4)
+    parser.add_argument('--beds', type=int, default=200, help='beds per hospital')
+    parser.add_argument('--discharge-ratio', type=float, default=0.3)
+    parser.add_argument('--poll-ratio', type=float, default=0.2, help='share of requests that are dashboard polls')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--out', help='write the JSON report here as well as stdout')
+    args = parser.parse_args()
+
+    with contextlib.redirect_stdout(sys.stderr): models = serbas.current_models()
+    report = {
+        'benchmark': 'suite', 'engine': models.engine, 'model_version': models.version, 'python': platform.python_version(),
+        'config': {k: v for k, v in vars(args).items() if k != 'out'},
+    }
+    if args.only in (None, 'micro'): report['micro'] = run_micro(args.micro_calls, args.seed)
+    if args.only in (None, 'e2e'): report['e2e'] = run_e2e(args)
+
+    out = json.dumps(report, indent=2)
+    print(out)
+    if args.out:
+        with open(args.out, 'w') as f: f.write(out)
+
+if __name__ == '__main__':
+    main()
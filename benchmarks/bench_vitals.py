@@ -0,0 +1,89 @@
+"""Vitals ingestion throughput: readings per second through /api/vitals per batch size.
+
+Admits --patients patients into a scratch hospital, then streams monitor readings for them: each reading
+jitters the patient's current vitals slightly (heart rate +-3, SpO2 +-1, BP +-4, temperature +-0.1), and a
+--crossing share of readings drops SpO2 below 92 and back so patients actually cross triage bands. Reports
+readings/s, the per-request latency and how many re-triages the band/cluster check triggered, for every
+batch size in --batch.
+
+    python benchmarks/bench_vitals.py [--patients 500] [--readings 20000] [--batch 1 10 100 1000] [--out results.json]
+"""
+import argparse
+import contextlib
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)  # app.py loads its model files relative to the working directory
+with contextlib.redirect_stdout(sys.stderr):  # model loading messages; stdout carries only the report
+    import app as serbas
+from workload import build_hospitals, patient_stream, percentiles
+
+def readings_stream(patients, n, crossing, seed):
+    """n readings in arrival order; a crossing reading crashes SpO2 and the patient's next reading restores it"""
+    rng = random.Random(seed)
+    state = {pid: dict(vitals) for pid, vitals in patients.items()}
+    crashed, out = set(), []
+    pids = list(patients)
+    for _ in range(n):
+        pid = rng.choice(pids)
+        v = state[pid]
+        v['heart_rate'] = min(max(v['heart_rate'] + rng.randint(-3, 3), 40), 180)
+        v['blood_pressure_systolic'] = min(max(v['blood_pressure_systolic'] + rng.randint(-4, 4), 80), 200)
+        v['blood_pressure_diastolic'] = min(max(v['blood_pressure_diastolic'] + rng.randint(-4, 4), 50), 120)
+        v['temperature'] = round(min(max(v['temperature'] + rng.choice((-0.1, 0.0, 0.1)), 35.0), 41.0), 1)
+        spo2 = min(max(v['spO2'] + rng.randint(-1, 1), 85), 100)
+        if pid in crashed: crashed.discard(pid)
+        elif rng.random() < crossing:
+            crashed.add(pid)
+            spo2 = 88
+        out.append(dict(v, patient_id=pid, spO2=spo2))
+    return out
+
+def run(client, readings, batch):
+    latencies, retriaged, upgrades = [], 0, 0
+    start = time.perf_counter()
+    for i in range(0, len(readings), batch):
+        chunk = readings[i:i + batch]
+        t0 = time.perf_counter()
+        resp = client.post('/api/vitals', json=chunk[0] if batch == 1 else {'readings': chunk}).get_json()
+        latencies.append(time.perf_counter() - t0)
+        retriaged += len(resp['retriaged'])
+        upgrades += len(resp['upgrades'])
+    elapsed = time.perf_counter() - start
+    return {'batch': batch, 'requests': len(latencies), 'readings_per_s': round(len(readings) / elapsed, 1),
+            'request_latency_ms': percentiles(latencies), 'retriaged': retriaged, 'upgrade_suggestions': upgrades}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--patients', type=int, default=500)
+    parser.add_argument('--readings', type=int, default=20000, help='readings per batch size')
+    parser.add_argument('--batch', type=int, nargs='+', default=[1, 10, 100, 1000])
+    parser.add_argument('--crossing', type=float, default=0.01, help='share of readings that cross into the high band')
+    parser.add_argument('--engine', choices=('sklearn', 'compiled'), default=serbas.INFERENCE_ENGINE)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--out', help='write the JSON report here as well as stdout')
+    args = parser.parse_args()
+
+    with contextlib.redirect_stdout(sys.stderr): serbas.load_ml_models(args.engine)
+    hid = build_hospitals(serbas, os.path.join(tempfile.mkdtemp(prefix='serbas-vitals-'), 'bench.db'), 1, args.patients)[0]
+    client = serbas.app.test_client()
+    client.post('/login', json={'hospital_id': hid, 'password': 'password123'})
+    admitted = patient_stream(args.patients, args.seed)
+    results = client.post('/api/allocate-beds-batch', json={'patients': admitted}).get_json()['results']
+    patients = {r['patient_id']: {k: p[k] for k in serbas.VITALS_FIELDS} for p, r in zip(admitted, results)}
+
+    report = {'benchmark': 'vitals', 'engine': serbas.current_models().engine, 'config': {k: v for k, v in vars(args).items() if k != 'out'},
+              'runs': [run(client, readings_stream(patients, args.readings, args.crossing, args.seed + b), b) for b in args.batch]}
+    out = json.dumps(report, indent=2)
+    print(out)
+    if args.out:
+        with open(args.out, 'w') as f: f.write(out)
+
+if __name__ == '__main__':
+    main()
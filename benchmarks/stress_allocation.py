@@ -0,0 +1,147 @@
+"""Concurrent admission/discharge stress test for double-bookings and duplicate patient ids.
+
+Hammers /api/allocate-bed, /api/discharge-patient and /api/extend-stay from many threads (and
+optionally several processes, each with its own in-memory bed index, like separate gunicorn
+workers) against a scratch copy of the schema, then checks the database invariants:
+
+  * no bed is held by two allocated patients
+  * every allocated patient's bed is occupied by that patient, and vice versa
+  * no request failed with a server error (e.g. a duplicate PATnnn primary key)
+
+    python benchmarks/stress_allocation.py --threads 16 --processes 4 --requests 200
+"""
+import argparse
+import contextlib
+import json
+import multiprocessing
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)  # app.py loads its model files relative to the working directory
+with contextlib.redirect_stdout(sys.stderr):  # model loading messages; stdout carries only the report
+    import app as serbas
+
+HOSPITAL = ('HOSP001', 'password123')
+
+def random_patient(rng, n):
+    return {
+        'patient_name': f'Stress {n}', 'age': rng.randint(18, 90), 'blood_group': 'O+', 'admission_cause': 'stress',
+        'heart_rate': rng.randint(50, 160), 'blood_pressure_systolic': rng.randint(90, 180),
+        'blood_pressure_diastolic': rng.randint(60, 110), 'spO2': rng.randint(85, 99),
+        'temperature': round(rng.uniform(36.0, 40.5), 1),
+        'health_risk': rng.choice(['low', 'moderate', 'critical']),
+        'doctor_recommendation': rng.choice(['general', 'icu', 'flexible']),
+    }
+
+def worker(seed, n_requests, discharge_ratio, stats, stats_lock):
+    rng = random.Random(seed)
+    client = serbas.app.test_client()
+    client.post('/login', json={'hospital_id': HOSPITAL[0], 'password': HOSPITAL[1]})
+    mine, latencies, errors, counts = [], [], 0, {'allocate': 0, 'discharge': 0, 'extend': 0}
+    for i in range(n_requests):
+        roll = rng.random()
+        t0 = time.perf_counter()
+        if mine and roll < discharge_ratio:
+            # Occasionally discharge a patient twice to exercise the "bed still mine" guard
+            pid = rng.choice(mine) if roll < discharge_ratio * 0.1 else mine.pop(rng.randrange(len(mine)))
+            resp = client.post('/api/discharge-patient', json={'patient_id': pid}); counts['discharge'] += 1
+        elif mine and roll < discharge_ratio + 0.05:
+            resp = client.post('/api/extend-stay', json={'patient_id': rng.choice(mine)}); counts['extend'] += 1
+        else:
+            resp = client.post('/api/allocate-bed', json=random_patient(rng, i)); counts['allocate'] += 1
+            if resp.status_code == 200: mine.append(resp.get_json()['patient_id'])
+        latencies.append(time.perf_counter() - t0)
+        if resp.status_code >= 500: errors += 1
+    with stats_lock:
+        stats['latencies'].extend(latencies)
+        stats['errors'] += errors
+        for k, v in counts.items(): stats[k] += v
+
+def run_process(db_path, seed, threads, n_requests, discharge_ratio, queue=None):
+    serbas.DB_NAME = db_path
+    stats = {'latencies': [], 'errors': 0, 'allocate': 0, 'discharge': 0, 'extend': 0}
+    lock = threading.Lock()
+    pool = [threading.Thread(target=worker, args=(seed * 1000 + t, n_requests, discharge_ratio, stats, lock)) for t in range(threads)]
+    for t in pool: t.start()
+    for t in pool: t.join()
+    if queue is not None: queue.put(stats)
+    return stats
+
+def check_invariants(db_path):
+    conn = sqlite3.connect(db_path)
+    q = lambda sql: conn.execute(sql).fetchone()[0]
+    result = {
+        'double_booked_beds': q("SELECT COUNT(*) FROM (SELECT bed_id FROM patients WHERE status='allocated' GROUP BY bed_id HAVING COUNT(*) > 1)"),
+        'allocated_without_bed': q("SELECT COUNT(*) FROM patients p LEFT JOIN beds b ON b.id = p.bed_id WHERE p.status='allocated' AND (b.id IS NULL OR b.status != 'occupied' OR b.patient_id != p.id)"),
+        'orphan_occupied_beds': q("SELECT COUNT(*) FROM beds b LEFT JOIN patients p ON p.id = b.patient_id WHERE b.status='occupied' AND (p.id IS NULL OR p.status != 'allocated' OR p.bed_id != b.id)"),
+        'patients': q("SELECT COUNT(*) FROM patients"),
+        'allocated': q("SELECT COUNT(*) FROM patients WHERE status='allocated'"),
+        'waiting': q("SELECT COUNT(*) FROM patients WHERE status='waiting'"),
+    }
+    conn.close()
+    return result
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100.0 * (len(values) - 1))))] if values else 0.0
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--threads', type=int, default=16, help='threads per process')
+    parser.add_argument('--processes', type=int, default=1, help='independent worker processes (each with its own in-memory bed index)')
+    parser.add_argument('--requests', type=int, default=200, help='requests per thread')
+    parser.add_argument('--discharge-ratio', type=float, default=0.35)
+    parser.add_argument('--beds', type=int, default=60, help='total beds, kept small so threads fight over them')
+    parser.add_argument('--icu-beds', type=int, default=10)
+    parser.add_argument('--out', help='write the JSON report here as well as stdout')
+    args = parser.parse_args()
+
+    db_path = os.path.join(tempfile.mkdtemp(prefix='serbas-stress-'), 'stress.db')
+    serbas.DB_NAME = db_path
+    serbas.init_db()
+    admin = serbas.app.test_client()
+    admin.post('/login', json={'hospital_id': HOSPITAL[0], 'password': HOSPITAL[1]})
+    admin.post('/api/update-capacity', json={'total_beds': args.beds, 'icu_beds': args.icu_beds})
+
+    with contextlib.redirect_stdout(sys.stderr): serbas.current_models()  # loaded before the clock starts and before forking
+    t0 = time.perf_counter()
+    if args.processes == 1:
+        stats = run_process(db_path, 1, args.threads, args.requests, args.discharge_ratio)
+    else:
+        ctx = multiprocessing.get_context('fork')
+        queue = ctx.Queue()
+        procs = [ctx.Process(target=run_process, args=(db_path, p + 1, args.threads, args.requests, args.discharge_ratio, queue)) for p in range(args.processes)]
+        for p in procs: p.start()
+        parts = [queue.get() for _ in procs]
+        for p in procs: p.join()
+        stats = {'latencies': [l for s in parts for l in s['latencies']]}
+        for k in ('errors', 'allocate', 'discharge', 'extend'): stats[k] = sum(s[k] for s in parts)
+    elapsed = time.perf_counter() - t0
+
+    lat = stats['latencies']
+    invariants = check_invariants(db_path)
+    report = {
+        'benchmark': 'stress_allocation', 'db': db_path,
+        'config': {'threads': args.threads, 'processes': args.processes, 'requests_per_thread': args.requests, 'beds': args.beds},
+        'requests': len(lat), 'seconds': round(elapsed, 3), 'throughput_rps': round(len(lat) / elapsed, 1),
+        'latency_ms': {'p50': round(percentile(lat, 50) * 1000, 2), 'p99': round(percentile(lat, 99) * 1000, 2)},
+        'mix': {k: stats[k] for k in ('allocate', 'discharge', 'extend')},
+        'server_errors': stats['errors'],
+        'invariants': invariants,
+    }
+    out = json.dumps(report, indent=2)
+    print(out)
+    if args.out:
+        with open(args.out, 'w') as f: f.write(out)
+    ok = stats['errors'] == 0 and not (invariants['double_booked_beds'] or invariants['allocated_without_bed'] or invariants['orphan_occupied_beds'])
+    sys.exit(0 if ok else 1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+"""Shared workload helpers for the benchmark scripts.
+
+Patient streams reuse generate_class_data() from serbas.py (the generator behind
+new_random_synthetic_data.csv), so benchmark vitals follow the same per-severity rules and the same
+low/medium/high mix the models were trained on. Everything is seeded, so a run is reproducible.
+"""
+import os
+import random
+import sys
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from serbas import CONTEXT, SEVERITY_MIX, generate_class_data
+
+def patient_stream(n, seed=42, mix=None):
+    """n /api/allocate-bed payloads in random arrival order; mix overrides the severity proportions"""
+    mix = mix or SEVERITY_MIX
+    np.random.seed(seed)  # generate_class_data draws from NumPy's global generator
+    rng = random.Random(seed)
+    counts = {sev: int(round(n * share)) for sev, share in mix.items()}
+    counts[max(counts, key=counts.get)] += n - sum(counts.values())
+    patients = []
+    for sev, count in counts.items():
+        if count <= 0: continue
+        risk_w, doc_w = CONTEXT[sev]
+        for r in generate_class_data(sev, count).itertuples():
+            patients.append({
+                'patient_name': f'Bench {len(patients)}', 'age': int(r.age), 'blood_group': rng.choice(['A+', 'B+', 'O+', 'AB+', 'O-']),
+                'admission_cause': 'benchmark', 'heart_rate': int(r.heart_rate), 'blood_pressure_systolic': int(r.bp_systolic),
+                'blood_pressure_diastolic': int(r.bp_diastolic), 'spO2': int(r.spO2), 'temperature': float(r.temperature),
+                'health_risk': rng.choices(list(risk_w), list(risk_w.values()))[0],
+                'doctor_recommendation': rng.choices(list(doc_w), list(doc_w.values()))[0],
+                'expected_severity': sev,
+            })
+    rng.shuffle(patients)
+    return patients
+
+def ml_rows(patients, serbas):
+    return [serbas.build_ml_data(p) for p in patients]
+
+def build_hospitals(serbas, db_path, hospitals, beds, icu_share=0.2, flex_share=0.2, sharded=False):
+    """Fresh database at db_path with hospitals HOSP001.. each holding `beds` beds; returns their ids.
+    With sharded=True db_path is a directory holding the catalog and one file per hospital instead.
+    All hospitals share the password 'password123' like the seeded demo hospital."""
+    serbas.DB_NAME, serbas.SHARD_DIR = (serbas.DB_NAME, db_path) if sharded else (db_path, None)
+    catalog = serbas.get_catalog_db()
+    ids = [f'HOSP{h:03d}' for h in range(1, hospitals + 1)]
+    n_icu, n_flex = int(beds * icu_share), int(beds * flex_share)
+    layout = (('icu', 'ICU', 'ICU', n_icu), ('flexible', 'FLEX', 'Flex Ward', n_flex), ('general', 'BED', 'General Ward', beds - n_icu - n_flex))
+    for hid in ids:
+        catalog.execute("INSERT INTO hospitals VALUES (?, ?, 'Bench', '000', ?, ?, 'password123')", (hid, f'Bench {hid}', beds, n_icu))
+        catalog.commit()
+        conn = serbas.get_db(hid)  # the catalog itself unless sharded
+        conn.executemany("INSERT INTO beds VALUES (?, ?, ?, ?, 'available', NULL, NULL)",
+                         [(f"{hid}-{prefix}{i:05d}", hid, bed_type, ward) for bed_type, prefix, ward, n in layout for i in range(1, n + 1)])
+        conn.commit()
+    serbas.reload_bed_state(catalog)
+    return ids
+
+def percentiles(seconds, scale=1000.0):
+    """p50/p95/p99 of a list of durations, in milliseconds by default"""
+    if len(seconds) == 0: return {'p50': 0.0, 'p95': 0.0, 'p99': 0.0}
+    p = np.percentile(np.asarray(seconds) * scale, [50, 95, 99])
+    return {'p50': round(float(p[0]), 3), 'p95': round(float(p[1]), 3), 'p99': round(float(p[2]), 3)}
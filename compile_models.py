@@ -0,0 +1,38 @@
+import sys
+import joblib
+import numpy as np
+import pandas as pd
+from compiled_models import COMPILED_MODELS_PATH, compile_forest, compile_clusters, CompiledForest, NearestCentroid, save_compiled
+
+# 1. Load the trained sklearn artifacts (the same files app.py loads)
+rf = joblib.load('random_forest_model.joblib')
+kmeans = joblib.load('kmeans_model.joblib')
+scaler = joblib.load('vitals_scaler.joblib')
+high_risk = joblib.load('high_risk_cluster_index.joblib')
+
+# 2. Compile them into flat arrays
+forest = CompiledForest(compile_forest(rf))
+clusters = NearestCentroid(compile_clusters(scaler, kmeans, high_risk))
+
+# 3. Verify: the compiled engine must give exactly sklearn's predictions on every training row
+rf_features = ['age', 'heart_rate', 'bp_systolic', 'bp_diastolic', 'spO2', 'temperature']
+km_features = rf_features[1:]
+mismatches = 0
+for csv in ['new_random_synthetic_data.csv', 'synthetic_triage_data.csv']:
+    df = pd.read_csv(csv)
+    X_rf = df[rf_features].to_numpy(dtype=np.float64)
+    X_km = df[km_features].to_numpy(dtype=np.float64)
+    rf_bad = int((forest.predict(X_rf) != rf.predict(df[rf_features])).sum())
+    proba_bad = int((forest.predict_proba(X_rf) != rf.predict_proba(df[rf_features])).any(axis=1).sum())
+    km_bad = int((clusters.predict(X_km) != kmeans.predict(scaler.transform(df[km_features]))).sum())
+    print(f"{csv}: {len(df)} rows, forest mismatches {rf_bad} (probability {proba_bad}), cluster mismatches {km_bad}")
+    mismatches += rf_bad + km_bad
+
+if mismatches:
+    print("❌ Compiled models disagree with sklearn; not saving.")
+    sys.exit(1)
+
+# 4. Save as one .npz (read fully into memory on load; registry versions store memory-mapped .npy files instead)
+save_compiled(COMPILED_MODELS_PATH, rf, scaler, kmeans, high_risk)
+print(f"✅ Compiled models saved to {COMPILED_MODELS_PATH}")
+print("   -> Start the app with SERBAS_INFERENCE_ENGINE=compiled to use them.")
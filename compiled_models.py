@@ -0,0 +1,123 @@
+"""Flat-array versions of the triage models for low-latency single-patient inference.
+
+compile_forest() flattens every tree of the trained RandomForestClassifier into shared contiguous
+arrays (feature, threshold, children, leaf class fractions) that CompiledForest walks with a few
+vectorised NumPy gathers. compile_clusters() packs the StandardScaler statistics with the K-Means
+centroids so NearestCentroid assigns a cluster straight from raw vitals in one pass. Both reproduce
+sklearn's arithmetic (float32 inputs to the trees, per-tree probability normalisation, tree-ordered
+accumulation), so predictions match sklearn exactly; compile_models.py checks that on the training
+CSVs before saving.
+"""
+import os
+
+import numpy as np
+
+COMPILED_MODELS_PATH = 'compiled_models.npz'
+
+def compile_forest(rf):
+    """Flattens a fitted RandomForestClassifier into a dict of contiguous arrays"""
+    features, thresholds, lefts, rights, values, roots = [], [], [], [], [], []
+    offset, max_depth = 0, 0
+    for est in rf.estimators_:
+        tree = est.tree_
+        n = tree.node_count
+        is_leaf = tree.children_left == -1
+        idx = np.arange(n)
+        # Leaves point at themselves, so extra traversal steps past a leaf are no-ops
+        lefts.append(np.where(is_leaf, idx, tree.children_left) + offset)
+        rights.append(np.where(is_leaf, idx, tree.children_right) + offset)
+        features.append(np.where(is_leaf, 0, tree.feature))
+        thresholds.append(np.where(is_leaf, np.inf, tree.threshold))
+        # Same normalisation DecisionTreeClassifier.predict_proba applies to the leaf values
+        proba = tree.value[:, 0, :rf.n_classes_]
+        normalizer = proba.sum(axis=1)[:, np.newaxis]
+        normalizer[normalizer == 0.0] = 1.0
+        values.append(proba / normalizer)
+        roots.append(offset)
+        offset += n
+        max_depth = max(max_depth, tree.max_depth)
+    return {
+        'rf_feature': np.concatenate(features).astype(np.intp),
+        'rf_threshold': np.concatenate(thresholds).astype(np.float64),
+        'rf_left': np.concatenate(lefts).astype(np.intp),
+        'rf_right': np.concatenate(rights).astype(np.intp),
+        'rf_value': np.ascontiguousarray(np.concatenate(values), dtype=np.float64),
+        'rf_roots': np.array(roots, dtype=np.intp),
+        'rf_classes': np.asarray(rf.classes_).astype(str),
+        'rf_max_depth': np.array(max_depth),
+    }
+
+def compile_clusters(scaler, kmeans, high_risk_cluster):
+    """Packs StandardScaler statistics and K-Means centroids into one nearest-centroid table"""
+    n_features = kmeans.cluster_centers_.shape[1]
+    mean = scaler.mean_ if scaler.with_mean else np.zeros(n_features)
+    scale = scaler.scale_ if scaler.with_std else np.ones(n_features)
+    return {
+        'km_mean': np.asarray(mean, dtype=np.float64),
+        'km_scale': np.asarray(scale, dtype=np.float64),
+        'km_centers': np.asarray(kmeans.cluster_centers_, dtype=np.float64),
+        'km_high_risk': np.array(int(high_risk_cluster)),
+    }
+
+class CompiledForest:
+    """Drop-in for RandomForestClassifier.predict / predict_proba on the arrays from compile_forest()"""
+
+    def __init__(self, arrays):
+        self.feature = arrays['rf_feature']
+        self.threshold = arrays['rf_threshold']
+        self.left = arrays['rf_left']
+        self.right = arrays['rf_right']
+        self.value = arrays['rf_value']
+        self.roots = arrays['rf_roots']
+        self.classes_ = np.asarray(arrays['rf_classes'])
+        self.max_depth = int(arrays['rf_max_depth'])
+
+    def leaves(self, X):
+        # sklearn trees compare float32 copies of the inputs against float64 thresholds
+        X = np.asarray(X, dtype=np.float32).astype(np.float64)
+        rows = np.arange(X.shape[0])[:, np.newaxis]
+        node = np.repeat(self.roots[np.newaxis, :], X.shape[0], axis=0)
+        for _ in range(self.max_depth):
+            go_left = X[rows, self.feature[node]] <= self.threshold[node]
+            node = np.where(go_left, self.left[node], self.right[node])
+        return node
+
+    def predict_proba(self, X):
+        node = self.leaves(X)
+        # cumsum adds tree by tree in estimator order (no pairwise summation), exactly like
+        # ForestClassifier.predict_proba accumulating each tree's output
+        proba = np.cumsum(self.value[node], axis=1)[:, -1]
+        proba /= node.shape[1]
+        return proba
+
+    def predict(self, X):
+        return self.classes_.take(np.argmax(self.predict_proba(X), axis=1), axis=0)
+
+class NearestCentroid:
+    """Scaler + K-Means predict in one kernel: argmin over ||(x - mean) / scale - centre||^2"""
+
+    def __init__(self, arrays):
+        self.mean = arrays['km_mean']
+        self.scale = arrays['km_scale']
+        self.centers = arrays['km_centers']
+        self.high_risk_cluster = int(arrays['km_high_risk'])
+
+    def predict(self, X):
+        z = (np.asarray(X, dtype=np.float64) - self.mean) / self.scale
+        d = ((z[:, np.newaxis, :] - self.centers[np.newaxis, :, :]) ** 2).sum(axis=2)
+        return np.argmin(d, axis=1)
+
+def save_compiled(path, rf, scaler, kmeans, high_risk_cluster):
+    np.savez(path, **compile_forest(rf), **compile_clusters(scaler, kmeans, high_risk_cluster))
+
+def load_compiled(path=COMPILED_MODELS_PATH):
+    """Returns (CompiledForest, NearestCentroid) from an .npz written by save_compiled, or from a directory
+    of <name>.npy files (model_registry versions). The .npy files are memory-mapped read-only, so forked
+    workers share one copy through the page cache; .npz members are always read into memory."""
+    if os.path.isdir(path):
+        arrays = {name[:-4]: np.load(os.path.join(path, name), mmap_mode='r', allow_pickle=False)
+                  for name in os.listdir(path) if name.endswith('.npy')}
+    else:
+        with np.load(path, allow_pickle=False) as data:
+            arrays = {k: data[k] for k in data.files}
+    return CompiledForest(arrays), NearestCentroid(arrays)
@@ -0,0 +1,158 @@
+"""Standalone Server-Sent Events server: /api/events for every open dashboard on one thread.
+
+The Flask app's own /api/events parks a server thread per open stream. This server holds all streams on a
+single asyncio event loop instead, so a thousand idle nurse stations cost a thousand sockets, not a thousand
+threads or a thousand sync workers. It streams exactly what /api/events does: the rows the app workers append
+to the events table (see EVENT STREAM in app.py), polled once per database file every SERBAS_EVENT_POLL
+seconds for all subscribers, with the same ids, Last-Event-ID replay, 'resync' and 'stats' events. SQLite is
+only touched from one helper thread, so the loop never blocks on it.
+
+Browsers authenticate with the app's session cookie, so serve it on the app's origin: route /api/events to
+this server in the reverse proxy (with buffering off) and everything else to the app workers.
+
+    python event_server.py [--host 127.0.0.1] [--port 8002]
+"""
+import argparse
+import asyncio
+import http.cookies
+import json
+import sqlite3
+import urllib.parse
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import app as serbas
+
+DB = ThreadPoolExecutor(1, thread_name_prefix='events-db')
+HEADER_TIMEOUT = 10  # seconds a client gets to send its request headers
+HUBS = {}  # database path -> Hub, while it has subscribers
+
+class Subscriber:
+    """One open stream: frames waiting to be written, and whether it fell too far behind"""
+    def __init__(self, hid):
+        self.hid, self.seq = hid, 0
+        self.frames, self.ready, self.missed = deque(), asyncio.Event(), False
+
+    def push(self, events):
+        if len(self.frames) + len(events) > serbas.EVENT_BUFFER_SIZE:
+            self.frames.clear(); self.missed = True  # the browser reloads instead of replaying
+        else: self.frames.extend(events)
+        self.ready.set()
+
+class Hub:
+    """The subscribers of one database file and the task that polls its events table for them"""
+    def __init__(self, path):
+        self.path, self.subscribers = path, set()
+        # Queued on the single DB thread before any subscriber's resume_point(), so the poll starts no later
+        # than the replay of any stream that joins it
+        self.start = asyncio.get_running_loop().run_in_executor(DB, read_latest, path)
+        asyncio.create_task(self.run())
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        try: seq = await self.start
+        except sqlite3.Error: seq = 0  # read from the oldest kept row; subscribers skip what they replayed
+        while self.subscribers:
+            await asyncio.sleep(serbas.EVENT_POLL)
+            hids = {s.hid for s in self.subscribers}
+            try: seq, batches = await loop.run_in_executor(DB, read_batches, self.path, seq, hids)
+            except sqlite3.Error: continue  # locked or gone; the next poll retries
+            for subscriber in self.subscribers:
+                if subscriber.hid in batches: subscriber.push(batches[subscriber.hid])
+        del HUBS[self.path]
+
+# --- DATABASE (on the DB thread) ---
+def read_latest(path):
+    return serbas.latest_event(serbas.pooled_db(path))
+
+def read_batches(path, after, hids):
+    return serbas.event_batches(serbas.pooled_db(path), after, hids)
+
+def read_resume_point(hid, last_event_id):
+    return serbas.resume_point(serbas.get_db(hid), hid, last_event_id)
+
+# --- HTTP ---
+def session_hospital(cookie_header):
+    """The hospital id in the app's signed session cookie, or None"""
+    cookies = http.cookies.SimpleCookie()
+    try: cookies.load(cookie_header)
+    except http.cookies.CookieError: return None
+    morsel = cookies.get(serbas.app.config['SESSION_COOKIE_NAME'])
+    serializer = serbas.app.session_interface.get_signing_serializer(serbas.app)
+    if morsel is None or serializer is None: return None
+    try: session = serializer.loads(morsel.value, max_age=int(serbas.app.permanent_session_lifetime.total_seconds()))
+    except Exception: return None
+    return session.get('hospital_id')
+
+async def respond(writer, status, body):
+    data = json.dumps(body).encode()
+    writer.write(f"HTTP/1.1 {status}\r\nContent-Type: application/json\r\nContent-Length: {len(data)}\r\nConnection: close\r\n\r\n".encode() + data)
+    await writer.drain()
+
+async def handle(reader, writer):
+    subscriber = hub = None
+    try:
+        try: head = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), HEADER_TIMEOUT)
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, asyncio.LimitOverrunError): return
+        request_line, *lines = head.decode('latin-1').split('\r\n')
+        method, target = (request_line.split(' ') + ['', ''])[:2]
+        headers = {k.strip().lower(): v.strip() for k, _, v in (line.partition(':') for line in lines if line)}
+        url = urllib.parse.urlsplit(target)
+        if method != 'GET' or url.path != '/api/events': return await respond(writer, '404 Not Found', {'error': 'Not found'})
+        hid = session_hospital(headers.get('cookie', ''))
+        if not hid: return await respond(writer, '401 Unauthorized', {'error': 'Unauthorized'})
+        last_event_id = headers.get('last-event-id') or urllib.parse.parse_qs(url.query).get('last_event_id', [None])[0]
+
+        # Subscribe before reading the resume point: polled batches that arrive meanwhile are filtered by seq
+        path = serbas.events_db_path(hid)
+        hub = HUBS.get(path) or HUBS.setdefault(path, Hub(path))
+        subscriber = Subscriber(hid)
+        hub.subscribers.add(subscriber)
+        seq, replay, stats = await asyncio.get_running_loop().run_in_executor(DB, read_resume_point, hid, last_event_id)
+
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nCache-Control: no-cache\r\n"
+                     b"X-Accel-Buffering: no\r\nConnection: close\r\n\r\n")
+        if replay is None: writer.write(serbas.sse_frame(seq, 'resync').encode())
+        writer.write(("retry: 3000\n" + serbas.sse_frame(last_event_id if replay else seq, 'hello')).encode())
+        for event in replay or (): writer.write(serbas.sse_frame(*event).encode())
+        if stats: writer.write(serbas.sse_frame(seq, 'stats', stats).encode())
+        subscriber.seq = seq
+        await writer.drain()
+        while True:
+            try: await asyncio.wait_for(subscriber.ready.wait(), serbas.EVENT_KEEPALIVE)
+            except asyncio.TimeoutError:
+                writer.write(b": keepalive\n\n")
+            subscriber.ready.clear()
+            if subscriber.missed:
+                subscriber.missed = False
+                writer.write(serbas.sse_frame(subscriber.seq, 'resync').encode())
+            sent = subscriber.seq
+            while subscriber.frames:
+                event = subscriber.frames.popleft()
+                if event[0] <= sent: continue  # already replayed
+                subscriber.seq = event[0]
+                writer.write(serbas.sse_frame(*event).encode())
+            await writer.drain()
+    except (ConnectionError, asyncio.CancelledError):
+        pass
+    finally:
+        if subscriber: hub.subscribers.discard(subscriber)
+        writer.close()
+
+async def serve(host, port, ready=None):
+    server = await asyncio.start_server(handle, host, port)
+    if ready: ready(server.sockets[0].getsockname()[1])
+    print(f"📡 SERBAS events on http://{host}:{server.sockets[0].getsockname()[1]}/api/events "
+          f"(DB: {f'{serbas.SHARD_DIR}/ (sharded)' if serbas.SHARD_DIR else serbas.DB_NAME})")
+    async with server: await server.serve_forever()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8002)
+    args = parser.parse_args()
+    try: asyncio.run(serve(args.host, args.port))
+    except KeyboardInterrupt: pass
+
+if __name__ == '__main__':
+    main()
@@ -24,4 +24,9 @@ rf_classifier.fit(X, y)
 joblib.dump(rf_classifier, 'random_forest_model.joblib')
 
 print("✅ Random Forest Model Retrained Successfully!")
-print("The model has been saved as random_forest_model.joblib, trained on the new balanced data.")
\ No newline at end of file
+print("The model has been saved as random_forest_model.joblib, trained on the new balanced data.")
+
+# 5. Publish a versioned snapshot (with the current K-Means artifacts) for hot-swapping into a running app
+from model_registry import publish
+version = publish()
+print(f"   -> Published as model version {version}. Activate it with: python model_registry.py activate {version}")
\ No newline at end of file
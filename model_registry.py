@@ -0,0 +1,185 @@
+"""Versioned model registry: immutable model bundles under models/<version>/ and an atomic CURRENT pointer.
+
+    models/CURRENT                    name of the active version (rewritten with os.replace, never half-written)
+    models/<version>/manifest.json    when the bundle was published and which files it holds
+    models/<version>/*.joblib         the four sklearn artifacts, same names as in the project root
+    models/<version>/compiled/*.npy   compile_models arrays for the compiled engine, one file per array
+
+Without models/CURRENT the artifacts in the project root are served as version 'legacy', so an
+untouched checkout behaves as before. Bundles are loaded with joblib mmap_mode='r' and np.load
+mmap_mode='r': their NumPy arrays are read-only file-backed pages that every forked worker shares
+through the page cache instead of private copies. The compiled engine is nothing but arrays; the
+sklearn trees copy their nodes while unpickling, so only the scaler and K-Means arrays stay mapped.
+
+    python model_registry.py publish [--version V] [--activate]   # snapshot the root artifacts
+    python model_registry.py activate V
+    python model_registry.py list
+"""
+import argparse
+import json
+import os
+import shutil
+import time
+from datetime import datetime
+
+import joblib
+import numpy as np
+from compiled_models import COMPILED_MODELS_PATH, compile_clusters, compile_forest, load_compiled
+
+MODELS_DIR = 'models'
+CURRENT_POINTER = os.path.join(MODELS_DIR, 'CURRENT')
+LEGACY_VERSION = 'legacy'
+COMPILED_DIR = 'compiled'
+ARTIFACTS = {
+    'rf': 'random_forest_model.joblib',
+    'kmeans': 'kmeans_model.joblib',
+    'scaler': 'vitals_scaler.joblib',
+    'high_risk': 'high_risk_cluster_index.joblib',
+}
+
+def version_dir(version):
+    if version == LEGACY_VERSION: return '.'
+    if not version or os.sep in version or '/' in version or version.startswith('.'):
+        raise ValueError(f"Invalid model version name: {version!r}")
+    return os.path.join(MODELS_DIR, version)
+
+def active_version():
+    try:
+        with open(CURRENT_POINTER) as f: return f.read().strip() or LEGACY_VERSION
+    except FileNotFoundError:
+        return LEGACY_VERSION
+
+def list_versions():
+    """Published versions, oldest first, with their manifests"""
+    if not os.path.isdir(MODELS_DIR): return []
+    out = []
+    for name in sorted(os.listdir(MODELS_DIR)):
+        try:
+            with open(os.path.join(MODELS_DIR, name, 'manifest.json')) as f: out.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+    return out
+
+def activate(version):
+    """Points models/CURRENT at version. Workers pick it up through the app's watcher or admin endpoint."""
+    if version != LEGACY_VERSION and not os.path.isfile(os.path.join(version_dir(version), 'manifest.json')):
+        raise FileNotFoundError(f"Model version '{version}' is not published")
+    os.makedirs(MODELS_DIR, exist_ok=True)
+    tmp = f"{CURRENT_POINTER}.{os.getpid()}.tmp"
+    with open(tmp, 'w') as f: f.write(version + '\n')
+    os.replace(tmp, CURRENT_POINTER)
+
+def publish(version=None, source='.', compiled=True, activate_now=False):
+    """Copies the four artifacts from source into a new models/<version>/ (plus compiled arrays) and returns the version.
+    The directory is assembled under a temporary name and renamed into place, so a half-published
+    version is never visible."""
+    version = version or datetime.now().strftime('%Y%m%d-%H%M%S')
+    if version == LEGACY_VERSION: raise ValueError(f"'{LEGACY_VERSION}' is reserved for the project root artifacts")
+    target = version_dir(version)
+    if os.path.exists(target): raise FileExistsError(f"Model version '{version}' already exists")
+    staging = f"{target}.{os.getpid()}.tmp"
+    os.makedirs(staging)
+    try:
+        for name in ARTIFACTS.values(): shutil.copy2(os.path.join(source, name), os.path.join(staging, name))
+        if compiled:
+            rf, kmeans, scaler, high_risk = (joblib.load(os.path.join(staging, ARTIFACTS[k])) for k in ('rf', 'kmeans', 'scaler', 'high_risk'))
+            os.makedirs(os.path.join(staging, COMPILED_DIR))
+            for name, array in {**compile_forest(rf), **compile_clusters(scaler, kmeans, high_risk)}.items():
+                np.save(os.path.join(staging, COMPILED_DIR, f'{name}.npy'), array)
+        manifest = {'version': version, 'published': datetime.now().isoformat(timespec='seconds'),
+                    'files': sorted(ARTIFACTS.values()), 'compiled': compiled}
+        with open(os.path.join(staging, 'manifest.json'), 'w') as f: json.dump(manifest, f, indent=2)
+        os.rename(staging, target)
+    except:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+    if activate_now: activate(version)
+    return version
+
+class ModelBundle:
+    """One loaded model version. Never mutated after load_bundle(), so a request that grabbed a bundle
+    keeps consistent models even if another one is swapped in mid-request."""
+
+    def __init__(self, version, engine, forest, kmeans, scaler, centroids, high_risk_cluster, load_seconds):
+        self.version, self.engine = version, engine
+        self.forest = forest          # RandomForestClassifier or CompiledForest
+        self.kmeans, self.scaler = kmeans, scaler
+        self.centroids = centroids    # fused scaler + K-Means kernel when the compiled engine is active
+        self.high_risk_cluster = high_risk_cluster
+        self.load_seconds = load_seconds
+        self.rf_ready = forest is not None
+        self.kmeans_ready = high_risk_cluster is not None and (centroids is not None or (kmeans is not None and scaler is not None))
+
+    def assign_clusters(self, feats):
+        if self.centroids is not None: return self.centroids.predict(feats)
+        return self.kmeans.predict(self.scaler.transform(feats))
+
+    def warm_up(self):
+        """One throwaway prediction per model, so the first real request does not pay for page faults
+        and lazy sklearn initialisation"""
+        row = np.array([[40, 80, 120, 80, 97, 37.0]])  # age, heart rate, BP systolic/diastolic, spO2, temperature
+        if self.rf_ready: self.forest.predict(row)
+        if self.kmeans_ready: self.assign_clusters(row[:, 1:])
+
+    def info(self):
+        return {'version': self.version, 'engine': self.engine, 'load_seconds': round(self.load_seconds, 4),
+                'random_forest': self.rf_ready, 'kmeans': self.kmeans_ready}
+
+def load_bundle(version=None, engine='sklearn'):
+    """Loads a version (default: the active one) memory-mapped. A model that fails to load is left as None,
+    and the app falls back to the rules for it, as before."""
+    version = version or active_version()
+    path = version_dir(version)
+    if not os.path.isdir(path): raise FileNotFoundError(f"Model version '{version}' not found")
+    start = time.perf_counter()
+    forest = kmeans = scaler = centroids = high_risk = None
+    if engine == 'compiled':
+        try:
+            forest, centroids = load_compiled(COMPILED_MODELS_PATH if version == LEGACY_VERSION else os.path.join(path, COMPILED_DIR))
+            high_risk = centroids.high_risk_cluster
+            print(f"✅ Compiled Models Loaded: {version} (Cluster {high_risk})")
+        except Exception as e:
+            print(f"⚠️ Compiled Models Failed: {e}. Falling back to sklearn.")
+            engine = 'sklearn'
+    if engine != 'compiled':
+        engine = 'sklearn'
+        try:
+            forest = joblib.load(os.path.join(path, ARTIFACTS['rf']), mmap_mode='r')
+            print(f"✅ Supervised Model Loaded: {version}")
+        except Exception as e:
+            print(f"❌ Supervised Failed: {e}")
+        try:
+            kmeans = joblib.load(os.path.join(path, ARTIFACTS['kmeans']), mmap_mode='r')
+            scaler = joblib.load(os.path.join(path, ARTIFACTS['scaler']), mmap_mode='r')
+            high_risk = int(joblib.load(os.path.join(path, ARTIFACTS['high_risk'])))
+            print(f"✅ Unsupervised Loaded: {version} (Cluster {high_risk})")
+        except Exception as e:
+            print(f"⚠️ Unsupervised Failed: {e}")
+            kmeans = scaler = high_risk = None
+    return ModelBundle(version, engine, forest, kmeans, scaler, centroids, high_risk, time.perf_counter() - start)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    sub = parser.add_subparsers(dest='command', required=True)
+    pub = sub.add_parser('publish', help='snapshot the artifacts in the project root as a new version')
+    pub.add_argument('--version', help='version name (default: a timestamp)')
+    pub.add_argument('--no-compiled', action='store_true', help='skip the compiled-engine arrays')
+    pub.add_argument('--activate', action='store_true', help='also make it the active version')
+    act = sub.add_parser('activate', help='point models/CURRENT at a published version')
+    act.add_argument('version')
+    sub.add_parser('list', help='show published versions')
+    args = parser.parse_args()
+
+    if args.command == 'publish':
+        version = publish(args.version, compiled=not args.no_compiled, activate_now=args.activate)
+        print(f"✅ Published model version {version}" + (" (active)" if args.activate else ""))
+    elif args.command == 'activate':
+        activate(args.version)
+        print(f"✅ Active model version: {args.version}")
+    else:
+        active = active_version()
+        for m in list_versions(): print(f"{'*' if m['version'] == active else ' '} {m['version']}  {m['published']}")
+        if active == LEGACY_VERSION: print(f"* {LEGACY_VERSION}  (project root artifacts)")
+
+if __name__ == '__main__':
+    main()
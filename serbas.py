@@ -11,6 +11,14 @@ TARGET_COUNTS = {
     'low': int(N_TOTAL * 0.35),    # 420 samples
     'high': int(N_TOTAL * 0.25)   # 300 samples
 }
+SEVERITY_MIX = {sev: n / N_TOTAL for sev, n in TARGET_COUNTS.items()}
+
+# Clinician inputs that plausibly go with each generated severity: (health_risk weights, recommendation weights)
+CONTEXT = {
+    'low': ({'low': 0.7, 'moderate': 0.25, 'critical': 0.05}, {'general': 0.75, 'flexible': 0.2, 'icu': 0.05}),
+    'medium': ({'low': 0.3, 'moderate': 0.5, 'critical': 0.2}, {'general': 0.4, 'flexible': 0.45, 'icu': 0.15}),
+    'high': ({'low': 0.05, 'moderate': 0.35, 'critical': 0.6}, {'general': 0.1, 'flexible': 0.2, 'icu': 0.7}),
+}
 
 # --- Function to Generate Data for a Specific Class ---
 def generate_class_data(severity_label, count):
@@ -97,16 +105,17 @@ def generate_class_data(severity_label, count):
     
     return df_class
 
-# --- 4. Generate and Combine the new data ---
-df_low = generate_class_data('low', TARGET_COUNTS['low'])
-df_medium = generate_class_data('medium', TARGET_COUNTS['medium'])
-df_high = generate_class_data('high', TARGET_COUNTS['high'])
+if __name__ == '__main__':
+    # --- 4. Generate and Combine the new data ---
+    df_low = generate_class_data('low', TARGET_COUNTS['low'])
+    df_medium = generate_class_data('medium', TARGET_COUNTS['medium'])
+    df_high = generate_class_data('high', TARGET_COUNTS['high'])
 
-df_new_synthetic = pd.concat([df_low, df_medium, df_high], ignore_index=True)
+    df_new_synthetic = pd.concat([df_low, df_medium, df_high], ignore_index=True)
 
-# Shuffle the final dataset
-df_new_synthetic = df_new_synthetic.sample(frac=1, random_state=42).reset_index(drop=True)
+    # Shuffle the final dataset
+    df_new_synthetic = df_new_synthetic.sample(frac=1, random_state=42).reset_index(drop=True)
 
-# Save the new dataset
-output_filename = 'new_random_synthetic_data.csv'
-df_new_synthetic.to_csv(output_filename, index=False)
\ No newline at end of file
+    # Save the new dataset
+    output_filename = 'new_random_synthetic_data.csv'
+    df_new_synthetic.to_csv(output_filename, index=False)
\ No newline at end of file
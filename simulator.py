@@ -0,0 +1,242 @@
+"""Offline discrete-event ER surge simulator for bed capacity planning.
+
+Answers questions like "with 20 ICU and 30 flex beds, how long do high-severity patients wait during a
+3x surge?" without touching the live app or its database. Arrivals are a Poisson process per day whose
+rate is multiplied inside the surge window. Vitals come from generate_class_data() in serbas.py with the
+training severity mix, and health risk and doctor recommendation from its CONTEXT weights. The whole
+arrival stream is triaged up front by the app's own batch pipeline (predict_severity_ml_batch,
+run_unsupervised_model_batch, calculate_priority_score), so the event loop only moves beds:
+
+  - a new patient takes the first free bed type in bed_search_order, as solve_bed_csp does;
+  - otherwise they wait in the queue of every type they accept, and a freed bed goes to the highest
+    priority score, then the earliest arrival, as hand_off_bed does;
+  - a stay lasts STAY_DAYS[severity] from the moment the bed is taken. At the expected discharge a
+    patient recommended a flexible bed is extended by STAY_EXTENSION_DAYS with probability
+    --extend-prob, at most MAX_STAY_EXTENSIONS times, as /api/extend-stay allows.
+
+Waits are reported per severity, for every arrival after --warmup days and for surge arrivals alone.
+--sweep runs the grid of every listed value across a process pool. Each distinct arrival stream
+(days, arrivals, surge window, seed) is generated and triaged once and shared by the runs that use it.
+
+    python simulator.py --icu 20 --flex 30 --general 100 --arrivals 20 --surge 3 --surge-start 30 --surge-days 7
+    python simulator.py --days 2000 --surge-every 90 --sweep icu=10,20,30 flex=20,30 surge=1,3 --out sweep.json
+"""
+import argparse
+import contextlib
+import heapq
+import itertools
+import json
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import app as serbas_app
+from serbas import CONTEXT, SEVERITY_MIX, generate_class_data
+
+SEVERITIES = ('low', 'medium', 'high')
+RECOMMENDATIONS = ('general', 'flexible', 'icu')
+RISKS = ('low', 'moderate', 'critical')
+STREAM_KEYS = ('days', 'arrivals', 'surge', 'surge_start', 'surge_days', 'surge_every', 'seed')
+SWEEP_KEYS = STREAM_KEYS + ('icu', 'flex', 'general', 'extend_prob', 'warmup')
+TRIAGE_BATCH = 10000  # rows per model call, so a long run never builds one huge feature matrix
+
+def surge_mask(t, surge_start, surge_days, surge_every):
+    """True where time t (in days) falls inside a surge window; with surge_every the window repeats"""
+    rel = np.asarray(t, dtype=float) - surge_start
+    if surge_every: rel = np.where(rel >= 0, rel % surge_every, rel)
+    return (rel >= 0) & (rel < surge_days)
+
+def generate_arrivals(days, arrivals, surge, surge_start, surge_days, surge_every, seed):
+    """Arrival times (days, sorted) with their vitals and clinician inputs, as column arrays"""
+    rng = np.random.default_rng(seed)
+    np.random.seed(seed)  # generate_class_data draws from NumPy's global generator
+    day = np.arange(days)
+    rate = np.where(surge_mask(day, surge_start, surge_days, surge_every), arrivals * surge, arrivals)
+    counts = rng.poisson(rate)
+    t = np.sort(np.repeat(day, counts) + rng.random(counts.sum()))
+    n = len(t)
+    true_sev = rng.choice(len(SEVERITIES), n, p=[SEVERITY_MIX[s] for s in SEVERITIES])
+    stream = {'time': t, 'surge': surge_mask(t, surge_start, surge_days, surge_every),
+              'risk': np.zeros(n, dtype=np.int8), 'pref': np.zeros(n, dtype=np.int8)}
+    for col in serbas_app.RF_FEATURES: stream[col] = np.zeros(n)
+    for code, sev in enumerate(SEVERITIES):
+        idx = np.flatnonzero(true_sev == code)
+        if not len(idx): continue
+        df = generate_class_data(sev, len(idx))
+        for col, src in zip(serbas_app.RF_FEATURES, ('age', 'heart_rate', 'bp_systolic', 'bp_diastolic', 'spO2', 'temperature')):
+            stream[col][idx] = df[src].to_numpy()
+        risk_w, doc_w = CONTEXT[sev]
+        stream['risk'][idx] = rng.choice(len(RISKS), len(idx), p=[risk_w[r] for r in RISKS])
+        stream['pref'][idx] = rng.choice(len(RECOMMENDATIONS), len(idx), p=[doc_w[r] for r in RECOMMENDATIONS])
+    return stream
+
+def triage(stream):
+    """Scores every arrival with the app's pipeline; adds 'severity' (index into SEVERITIES) and 'score'"""
+    n = len(stream['time'])
+    severity, score = np.zeros(n, dtype=np.int8), np.zeros(n, dtype=np.int16)
+    for lo in range(0, n, TRIAGE_BATCH):
+        hi = min(lo + TRIAGE_BATCH, n)
+        rows = [dict(zip(serbas_app.RF_FEATURES, vals)) for vals in zip(*(stream[col][lo:hi].tolist() for col in serbas_app.RF_FEATURES))]
+        sevs = [sev for sev, _, _ in serbas_app.predict_severity_ml_batch(rows)]
+        bonuses = [bonus for bonus, _ in serbas_app.run_unsupervised_model_batch(rows)]
+        severity[lo:hi] = [SEVERITIES.index(sev) for sev in sevs]
+        score[lo:hi] = [serbas_app.calculate_priority_score(sev, RISKS[r], RECOMMENDATIONS[p], bonus)
+                        for sev, r, p, bonus in zip(sevs, stream['risk'][lo:hi].tolist(), stream['pref'][lo:hi].tolist(), bonuses)]
+    stream['severity'], stream['score'] = severity, score
+    return stream
+
+def simulate(stream, icu, flex, general, extend_prob, days, seed):
+    """Runs the bed event loop over a triaged stream. Returns per-arrival placement time and bed type
+    (NaN / -1 while still waiting at the end) and the time each bed was released (capped at days)."""
+    rng = random.Random(seed)
+    t, sev, pref, score = (stream[k].tolist() for k in ('time', 'severity', 'pref', 'score'))
+    n = len(t)
+    orders = {(s, p): [serbas_app.BED_TYPES.index(b) for b in serbas_app.bed_search_order(SEVERITIES[s], RECOMMENDATIONS[p])[1]]
+              for s in range(len(SEVERITIES)) for p in range(len(RECOMMENDATIONS))}
+    stay = [serbas_app.STAY_DAYS[s] for s in SEVERITIES]
+    flexible = RECOMMENDATIONS.index('flexible')
+    free = [{'icu': icu, 'general': general, 'flexible': flex}[b] for b in serbas_app.BED_TYPES]
+    queues = [[] for _ in serbas_app.BED_TYPES]  # per bed type: heap of (-score, arrival index), stale entries skipped lazily
+    waiting, discharges = set(), []          # discharges: heap of (expected discharge, arrival index, bed type, extensions)
+    placed_at, bed_type, released_at = [float('nan')] * n, [-1] * n, [float(days)] * n
+
+    def place(i, b, now):
+        placed_at[i], bed_type[i] = now, b
+        heapq.heappush(discharges, (now + stay[sev[i]], i, b, 0))
+
+    def release_until(now):
+        while discharges and discharges[0][0] <= now:
+            due, i, b, ext = heapq.heappop(discharges)
+            if pref[i] == flexible and ext < serbas_app.MAX_STAY_EXTENSIONS and rng.random() < extend_prob:
+                heapq.heappush(discharges, (due + serbas_app.STAY_EXTENSION_DAYS, i, b, ext + 1))
+                continue
+            released_at[i] = due
+            queue = queues[b]
+            while queue and queue[0][1] not in waiting: heapq.heappop(queue)
+            if queue:
+                j = heapq.heappop(queue)[1]
+                waiting.discard(j)
+                place(j, b, due)
+            else: free[b] += 1
+
+    for i in range(n):
+        release_until(t[i])
+        order = orders[(sev[i], pref[i])]
+        for b in order:
+            if free[b]:
+                free[b] -= 1
+                place(i, b, t[i])
+                break
+        else:
+            waiting.add(i)
+            entry = (-score[i], i)
+            for b in order: heapq.heappush(queues[b], entry)
+    release_until(days)
+    return np.array(placed_at), np.array(bed_type, dtype=np.int8), np.minimum(np.array(released_at), days)
+
+def wait_stats(wait_hours, placed, mandatory):
+    """Summary for one group of arrivals: waits in hours over those who got a bed"""
+    n, got = len(placed), wait_hours[placed]
+    if not n: return {'arrivals': 0}
+    out = {'arrivals': n, 'placed': int(placed.sum()), 'still_waiting': int(n - placed.sum()),
+           'placed_immediately': round(float((got == 0).sum()) / n, 4),
+           'placed_in_mandatory_type': round(float(mandatory[placed].sum()) / max(len(got), 1), 4)}
+    if len(got):
+        p = np.percentile(got, [50, 95, 99])
+        out['wait_hours'] = {'mean': round(float(got.mean()), 2), 'p50': round(float(p[0]), 2), 'p95': round(float(p[1]), 2),
+                             'p99': round(float(p[2]), 2), 'max': round(float(got.max()), 2)}
+    return out
+
+def run(stream, config):
+    """One configuration over its (already triaged) stream; returns the report entry"""
+    start = time.perf_counter()
+    days, warmup = config['days'], config['warmup']
+    placed_at, bed_type, released_at = simulate(stream, config['icu'], config['flex'], config['general'], config['extend_prob'], days, config['seed'])
+    elapsed = time.perf_counter() - start
+    t, sev = stream['time'], stream['severity']
+    placed = ~np.isnan(placed_at)
+    wait = np.where(placed, (placed_at - t) * 24, np.nan)
+    mandatory_types = np.array([[serbas_app.BED_TYPES.index(serbas_app.bed_search_order(s, p)[0]) for p in RECOMMENDATIONS] for s in SEVERITIES])
+    mandatory = bed_type == mandatory_types[sev, stream['pref']]
+    measured = t >= warmup
+    groups = {'all': measured, 'surge': measured & stream['surge']}
+    result = {'config': config, 'arrivals': int(measured.sum()), 'seconds': round(elapsed, 3),
+              'simulated_days_per_s': round(days / elapsed, 1) if elapsed else None}
+    for name, mask in groups.items():
+        if name == 'surge' and not (config['surge'] != 1 and mask.any()): continue
+        result[name] = {s: wait_stats(wait[mask & (sev == code)], placed[mask & (sev == code)], mandatory[mask & (sev == code)])
+                        for code, s in enumerate(SEVERITIES)}
+    # Share of each bed type's bed-days (after warmup) that was occupied
+    beds = {'icu': config['icu'], 'general': config['general'], 'flexible': config['flex']}
+    span = max(days - warmup, 1e-9)
+    busy = np.clip(released_at - np.maximum(np.nan_to_num(placed_at, nan=days), warmup), 0, None)
+    result['utilisation'] = {b: round(float(busy[bed_type == k].sum()) / (beds[b] * span), 4) if beds[b] else None
+                             for k, b in enumerate(serbas_app.BED_TYPES)}
+    return result
+
+def run_job(job):
+    return run(*job)
+
+def parse_sweep(parser, args):
+    """--sweep key=v1,v2 ... -> list of full configurations (the cartesian product over the listed keys)"""
+    base = {k: getattr(args, k) for k in SWEEP_KEYS}
+    axes = {}
+    for item in args.sweep or []:
+        key, _, values = item.partition('=')
+        key = key.replace('-', '_')
+        if key not in SWEEP_KEYS or not values: parser.error(f"--sweep expects key=v1,v2,... with key one of {', '.join(SWEEP_KEYS)}")
+        try: axes[key] = [type(base[key])(v) for v in values.split(',')]
+        except ValueError: parser.error(f"--sweep {key}: bad value in {values!r}")
+    return [dict(base, **dict(zip(axes, combo))) for combo in itertools.product(*axes.values())]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--days', type=int, default=365, help='simulated days')
+    parser.add_argument('--warmup', type=float, default=14.0, help='days at the start left out of the statistics (the ward starts empty)')
+    parser.add_argument('--icu', type=int, default=20)
+    parser.add_argument('--flex', type=int, default=30)
+    parser.add_argument('--general', type=int, default=100)
+    parser.add_argument('--arrivals', type=float, default=20.0, help='mean arrivals per day outside a surge')
+    parser.add_argument('--surge', type=float, default=1.0, help='arrival rate multiplier inside the surge window')
+    parser.add_argument('--surge-start', type=float, default=30.0, help='day the surge starts')
+    parser.add_argument('--surge-days', type=float, default=7.0, help='length of the surge in days')
+    parser.add_argument('--surge-every', type=float, default=0.0, help='repeat the surge every N days (0: once)')
+    parser.add_argument('--extend-prob', type=float, default=0.3, help='chance a flexible-recommended stay is extended when due')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--sweep', nargs='+', metavar='KEY=V1,V2', help=f"grid over any of: {', '.join(SWEEP_KEYS)}")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='processes for the sweep')
+    parser.add_argument('--engine', choices=('sklearn', 'compiled'), default=serbas_app.INFERENCE_ENGINE)
+    parser.add_argument('--out', help='write the JSON report here as well as stdout')
+    args = parser.parse_args()
+    configs = parse_sweep(parser, args)
+
+    # The app's model loading messages go to stderr, so stdout carries only the report (pipe it to jq)
+    with contextlib.redirect_stdout(sys.stderr):
+        start = time.perf_counter()
+        models = serbas_app.load_ml_models(args.engine)
+        streams = {}
+        for config in configs:
+            key = tuple(config[k] for k in STREAM_KEYS)
+            if key not in streams: streams[key] = triage(generate_arrivals(*key))
+        triage_seconds = time.perf_counter() - start
+
+        jobs = [(streams[tuple(config[k] for k in STREAM_KEYS)], config) for config in configs]
+        start = time.perf_counter()
+        if len(jobs) > 1 and args.workers > 1:
+            with ProcessPoolExecutor(min(args.workers, len(jobs))) as pool: runs = list(pool.map(run_job, jobs))
+        else: runs = [run_job(job) for job in jobs]
+    report = {'simulator': 'er_surge', 'engine': models.engine, 'model_version': models.version,
+              'streams': len(streams), 'arrivals_triaged': int(sum(len(s['time']) for s in streams.values())),
+              'triage_seconds': round(triage_seconds, 3), 'simulation_seconds': round(time.perf_counter() - start, 3),
+              'runs': runs}
+    out = json.dumps(report, indent=2)
+    print(out)
+    if args.out:
+        with open(args.out, 'w') as f: f.write(out)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+"""One-shot migration from the single database file to per-hospital shards.
+
+Copies hospitals and transfer_costs into <out>/catalog.db and every hospital's beds, patients and
+bed numbering into <out>/<hospital_id>.db. The patient id sequence is copied into every shard so new
+ids continue past the old ones. Row counts are checked against the source before the tool reports
+success. The source is opened read-only (mode=ro) and never migrated: a source from an older schema
+version is copied by the columns it has, and only the shards are brought up to the current schema.
+
+    python split_db.py [--source hospital_hybrid_final.db] [--out shards]
+    SERBAS_SHARD_DIR=shards python app.py
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import urllib.parse
+
+import app as serbas
+
+# Tables copied per hospital, with the column holding the hospital id
+SHARDED_TABLES = (('beds', 'hospital_id'), ('patients', 'hospital_id'), ('bed_sequences', 'hospital_id'))
+CATALOG_TABLES = ('hospitals', 'transfer_costs')
+# Columns added by a migration that also backfills them; a source from before it gets the backfill on the copy
+BACKFILLED_COLUMNS = {('patients', 'expected_discharge'): 4}
+
+def read_only_uri(path):
+    return f"file:{urllib.parse.quote(os.path.abspath(path))}?mode=ro"
+
+def open_schema(path):
+    """A connection to path with the app's full schema (tables + migrations)"""
+    conn = serbas.open_db(path)
+    serbas.create_tables(conn.cursor()); conn.commit()
+    serbas.migrate_db(conn)
+    return conn
+
+def columns(conn, table, schema='main'):
+    return [r[1] for r in conn.execute(f"PRAGMA {schema}.table_info({table})")]
+
+def copy_rows(conn, table, where='', params=()):
+    """INSERT INTO main.table SELECT ... FROM src.table, by column name so column order cannot differ.
+    Tables the source predates are skipped, and migration backfills run for columns it predates."""
+    src_cols = columns(conn, table, 'src')
+    if not src_cols: return
+    cols = ', '.join(c for c in columns(conn, table) if c in src_cols)
+    conn.execute(f"INSERT INTO main.{table} ({cols}) SELECT {cols} FROM src.{table} {where}", params)
+    for (backfilled, column), version in BACKFILLED_COLUMNS.items():
+        if backfilled == table and column not in src_cols:
+            for sql in dict(serbas.SCHEMA_MIGRATIONS)[version]:
+                if sql.startswith('UPDATE'): conn.execute(sql)
+
+def count(conn, table, where='', params=(), schema='main'):
+    if not columns(conn, table, schema): return 0
+    return conn.execute(f"SELECT COUNT(*) FROM {schema}.{table} {where}", params).fetchone()[0]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--source', default=serbas.DB_NAME)
+    parser.add_argument('--out', default='shards', help='directory for catalog.db and one <hospital_id>.db per hospital')
+    args = parser.parse_args()
+
+    if not os.path.exists(args.source): sys.exit(f"❌ {args.source} not found")
+    if os.path.isdir(args.out) and os.listdir(args.out): sys.exit(f"❌ {args.out} is not empty; refusing to overwrite")
+    os.makedirs(args.out, exist_ok=True)
+
+    source = sqlite3.connect(read_only_uri(args.source), uri=True)
+    hospitals = [hid for (hid,) in source.execute("SELECT id FROM hospitals ORDER BY id")]
+    orphans = source.execute("SELECT COUNT(*) FROM patients WHERE hospital_id IS NULL OR hospital_id NOT IN (SELECT id FROM hospitals)").fetchone()[0]
+    source.close()
+
+    catalog = open_schema(os.path.join(args.out, serbas.CATALOG_NAME))
+    catalog.execute("ATTACH DATABASE ? AS src", (read_only_uri(args.source),))
+    with catalog:
+        for table in CATALOG_TABLES: copy_rows(catalog, table)
+    ok = all(count(catalog, t) == count(catalog, t, schema='src') for t in CATALOG_TABLES)
+    catalog.execute("DETACH DATABASE src"); catalog.close()
+
+    for hid in hospitals:
+        shard = open_schema(os.path.join(args.out, f"{hid}.db"))
+        shard.execute("ATTACH DATABASE ? AS src", (read_only_uri(args.source),))
+        with shard:
+            for table, column in SHARDED_TABLES: copy_rows(shard, table, f"WHERE {column}=?", (hid,))
+            copy_rows(shard, 'id_sequences')
+        counts = {t: count(shard, t) for t, _ in SHARDED_TABLES}
+        ok = ok and all(n == count(shard, t, f"WHERE {c}=?", (hid,), 'src') for (t, c), n in zip(SHARDED_TABLES, counts.values()))
+        shard.execute("DETACH DATABASE src"); shard.close()
+        print(f"   {hid}: {counts['beds']} beds, {counts['patients']} patients")
+
+    if orphans: print(f"⚠️ {orphans} patients belong to no known hospital and were not copied")
+    if not ok: sys.exit("❌ Row counts differ between the source and the shards")
+    print(f"✅ Split {args.source} into {len(hospitals)} shards under {args.out}/")
+    print(f"   -> Start the app with SERBAS_SHARD_DIR={args.out}")
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,9 @@
 // Global variable to store current hospital
 let currentHospital = null;
 
+// Live update stream (/api/events); null when not connected
+let eventSource = null;
+
 // Page navigation
 function showPage(pageName) {
     // Hide all pages
@@ -139,6 +142,7 @@ async function registerHospital() {
 async function logout() {
     try {
         await fetch('/logout');
+        disconnectEvents();
         currentHospital = null;
         showLoginPage();
     } catch (error) {
@@ -156,7 +160,87 @@ function showDashboard() {
     document.getElementById('loginPage').classList.remove('active');
     document.getElementById('dashboardPage').classList.add('active');
     document.getElementById('hospitalNameDisplay').textContent = currentHospital.name;
+    connectEvents();
+    loadDashboardData();
+}
+
+// Live updates: the server pushes compact deltas after every committed change, and the open
+// tables are patched in place instead of being re-fetched.
+function connectEvents() {
+    if (!window.EventSource || eventSource) return;
+    eventSource = new EventSource('/api/events');
+    eventSource.addEventListener('stats', e => renderStats(JSON.parse(e.data)));
+    eventSource.addEventListener('bed', e => applyBedEvent(JSON.parse(e.data)));
+    eventSource.addEventListener('patient', e => applyPatientEvent(JSON.parse(e.data)));
+    eventSource.addEventListener('capacity', e => applyCapacityEvent(JSON.parse(e.data)));
+    eventSource.addEventListener('upgrade', e => applyUpgradeEvent(JSON.parse(e.data)));
+    // Sent when the server could not replay what we missed while disconnected
+    eventSource.addEventListener('resync', refreshAll);
+}
+
+function disconnectEvents() {
+    if (eventSource) {
+        eventSource.close();
+        eventSource = null;
+    }
+}
+
+function refreshAll() {
     loadDashboardData();
+    loadAvailableBeds();
+    loadAllocatedPatients();
+}
+
+function applyBedEvent(bed) {
+    const row = document.getElementById(`bed-${bed.bed_id}`);
+    if (row) {
+        row.querySelector('.bed-status').innerHTML = bedStatusBadge(bed.status);
+    }
+}
+
+function applyCapacityEvent(change) {
+    const table = document.getElementById('bedsTable');
+    if (change.reload) {
+        // Large resizes are not listed bed by bed
+        loadAvailableBeds();
+        return;
+    }
+    change.removed.forEach(id => document.getElementById(`bed-${id}`)?.remove());
+    if (change.added.length > 0) {
+        table.querySelector('.empty-state')?.closest('tr').remove();
+        table.insertAdjacentHTML('beforeend', change.added.map(id => bedRow({
+            id: id, type: change.bed_type, ward: change.ward, status: 'available', last_occupied: null
+        })).join(''));
+    }
+    if (!table.querySelector('tr[id]')) {
+        table.innerHTML = emptyBedsRow();
+    }
+}
+
+function applyPatientEvent(event) {
+    const table = document.getElementById('patientsTable');
+    const row = document.getElementById(`patient-${event.patient.id}`);
+    if (event.action === 'discharged') {
+        row?.remove();
+    } else if (event.action === 'allocated' || event.action === 'extended') {
+        if (row) {
+            row.outerHTML = patientRow(event.patient);
+        } else {
+            table.querySelector('.empty-state')?.closest('tr').remove();
+            table.insertAdjacentHTML('afterbegin', patientRow(event.patient));
+        }
+    } else if (event.action === 'retriaged' && row) {
+        // New vitals changed the severity or risk flag of a patient already on the list
+        row.outerHTML = patientRow(event.patient);
+    }
+    if (!table.querySelector('tr[id]')) {
+        table.innerHTML = emptyPatientsRow();
+    }
+}
+
+function applyUpgradeEvent(upgrade) {
+    const availability = upgrade.beds_free > 0 ? `${upgrade.beds_free} free` : 'none free';
+    showNotification(`${upgrade.name} (${upgrade.bed_id}) is now ${upgrade.severity.toUpperCase()} severity: move from ${upgrade.from.toUpperCase()} to ${upgrade.to.toUpperCase()} (${availability}).`, 'error');
 }
 
 // Data loading functions
@@ -179,11 +263,7 @@ async function loadDashboardData() {
         }
         
         // Update stats
-        document.getElementById('totalBeds').textContent = data.stats?.total_beds || 0;
-        document.getElementById('availableBeds').textContent = data.stats?.available_beds || 0;
-        document.getElementById('icuBeds').textContent = data.stats?.icu_beds || 0;
-        document.getElementById('flexibleBeds').textContent = data.stats?.flexible_beds || 0;
-        document.getElementById('occupiedBeds').textContent = data.stats?.occupied_beds || 0;
+        renderStats(data.stats);
         
         // Update recent allocations table
         const table = document.getElementById('recentAllocationsTable');
@@ -215,6 +295,41 @@ async function loadDashboardData() {
     }
 }
 
+function renderStats(stats) {
+    document.getElementById('totalBeds').textContent = stats?.total_beds || 0;
+    document.getElementById('availableBeds').textContent = stats?.available_beds || 0;
+    document.getElementById('icuBeds').textContent = stats?.icu_beds || 0;
+    document.getElementById('flexibleBeds').textContent = stats?.flexible_beds || 0;
+    document.getElementById('occupiedBeds').textContent = stats?.occupied_beds || 0;
+}
+
+function bedStatusBadge(status) {
+    return `<span class="badge ${status === 'available' ? 'low' : 'high'}">${status}</span>`;
+}
+
+function bedRow(bed) {
+    return `
+        <tr id="bed-${bed.id}">
+            <td>${bed.id}</td>
+            <td>${bed.type}</td>
+            <td>${bed.ward}</td>
+            <td class="bed-status">${bedStatusBadge(bed.status)}</td>
+            <td>${bed.last_occupied || 'Never'}</td>
+        </tr>
+    `;
+}
+
+function emptyBedsRow() {
+    return `
+        <tr>
+            <td colspan="5" class="empty-state">
+                <i class="fas fa-bed"></i>
+                <p>No beds found</p>
+            </td>
+        </tr>
+    `;
+}
+
 async function loadAvailableBeds() {
     try {
         showLoading('bedsTable', 'Loading beds...');
@@ -235,24 +350,9 @@ async function loadAvailableBeds() {
         
         const table = document.getElementById('bedsTable');
         if (data.beds && data.beds.length > 0) {
-            table.innerHTML = data.beds.map(bed => `
-                <tr>
-                    <td>${bed.id}</td>
-                    <td>${bed.type}</td>
-                    <td>${bed.ward}</td>
-                    <td><span class="badge ${bed.status === 'available' ? 'low' : 'high'}">${bed.status}</span></td>
-                    <td>${bed.last_occupied || 'Never'}</td>
-                </tr>
-            `).join('');
+            table.innerHTML = data.beds.map(bedRow).join('');
         } else {
-            table.innerHTML = `
-                <tr>
-                    <td colspan="5" class="empty-state">
-                        <i class="fas fa-bed"></i>
-                        <p>No beds found</p>
-                    </td>
-                </tr>
-            `;
+            table.innerHTML = emptyBedsRow();
         }
     } catch (error) {
         console.error('Error loading beds:', error);
@@ -260,6 +360,42 @@ async function loadAvailableBeds() {
     }
 }
 
+function patientRow(patient) {
+    return `
+        <tr id="patient-${patient.id}">
+            <td>${patient.name}</td>
+            <td>${patient.age}</td>
+            <td>${patient.blood_group}</td>
+            <td>${patient.condition}</td>
+            <td><span class="badge ${patient.severity}">${patient.severity}</span></td>
+            <td>${patient.bed_id}</td>
+            <td>${patient.admission_date}</td>
+            <td>${patient.expected_discharge || 'N/A'}</td>
+            <td>
+                ${patient.can_extend ? 
+                    `<button class="btn btn-sm btn-success" onclick="extendStay('${patient.id}', '${patient.name}')" style="margin-bottom: 5px;">
+                        Extend 2 Days
+                    </button><br>` : ''
+                }
+                <button class="btn btn-sm btn-warning" onclick="dischargePatient('${patient.id}', '${patient.name}')">
+                    Discharge
+                </button>
+            </td>
+        </tr>
+    `;
+}
+
+function emptyPatientsRow() {
+    return `
+        <tr>
+            <td colspan="9" class="empty-state">
+                <i class="fas fa-user-injured"></i>
+                <p>No patients currently allocated</p>
+            </td>
+        </tr>
+    `;
+}
+
 async function loadAllocatedPatients() {
     try {
         showLoading('patientsTable', 'Loading patients...');
@@ -280,37 +416,9 @@ async function loadAllocatedPatients() {
         
         const table = document.getElementById('patientsTable');
         if (data.patients && data.patients.length > 0) {
-            table.innerHTML = data.patients.map(patient => `
-                <tr>
-                    <td>${patient.name}</td>
-                    <td>${patient.age}</td>
-                    <td>${patient.blood_group}</td>
-                    <td>${patient.condition}</td>
-                    <td><span class="badge ${patient.severity}">${patient.severity}</span></td>
-                    <td>${patient.bed_id}</td>
-                    <td>${patient.admission_date}</td>
-                    <td>${patient.expected_discharge || 'N/A'}</td>
-                    <td>
-                        ${patient.can_extend ? 
-                            `<button class="btn btn-sm btn-success" onclick="extendStay('${patient.id}', '${patient.name}')" style="margin-bottom: 5px;">
-                                Extend 2 Days
-                            </button><br>` : ''
-                        }
-                        <button class="btn btn-sm btn-warning" onclick="dischargePatient('${patient.id}', '${patient.name}')">
-                            Discharge
-                        </button>
-                    </td>
-                </tr>
-            `).join('');
+            table.innerHTML = data.patients.map(patientRow).join('');
         } else {
-            table.innerHTML = `
-                <tr>
-                    <td colspan="9" class="empty-state">
-                        <i class="fas fa-user-injured"></i>
-                        <p>No patients currently allocated</p>
-                    </td>
-                </tr>
-            `;
+            table.innerHTML = emptyPatientsRow();
         }
     } catch (error) {
         console.error('Error loading patients:', error);
@@ -391,12 +499,14 @@ async function allocateBed(event) {
             showNotification(`Bed allocated successfully! ML Severity: ${data.ml_severity}, Risk: ${data.risk_flag}, Bed: ${data.bed_id}, Admission: ${data.admission_date}`, 'success');
             // Reset form
             event.target.reset();
-            // Refresh all data
-            loadDashboardData();
-            loadAvailableBeds();
-            loadAllocatedPatients();
+            // Re-fetch after our own change: its event may be streamed by another worker, or not at all
+            refreshAll();
         } else {
-            showNotification(data.message, 'error');
+            // Patient is queued here; name sister hospitals that could take them now
+            const alternatives = (data.alternatives || [])
+                .map(a => `${a.name} (${a.bed_type.toUpperCase()}, ${a.free_beds} free, transfer cost ${a.transfer_cost})`);
+            showNotification(alternatives.length ? `${data.message} Beds available at: ${alternatives.join('; ')}` : data.message, 'error');
+            refreshAll();  // the patient is on the waiting list now
         }
     } catch (error) {
         showNotification('Error allocating bed. Please try again.', 'error');
@@ -425,10 +535,8 @@ async function extendStay(patientId, patientName) {
         
         if (data.success) {
             showNotification(data.message, 'success');
-            // Refresh all data
-            loadDashboardData();
-            loadAvailableBeds();
-            loadAllocatedPatients();
+            // Re-fetch after our own change: its event may be streamed by another worker, or not at all
+            refreshAll();
         } else {
             showNotification(data.message, 'error');
         }
@@ -459,10 +567,8 @@ async function dischargePatient(patientId, patientName) {
         
         if (data.success) {
             showNotification(data.message, 'success');
-            // Refresh all data
-            loadDashboardData();
-            loadAvailableBeds();
-            loadAllocatedPatients();
+            // Re-fetch after our own change: its event may be streamed by another worker, or not at all
+            refreshAll();
         } else {
             showNotification(data.message, 'error');
         }
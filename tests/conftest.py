@@ -0,0 +1,52 @@
+"""Shared fixtures: a scratch single-file database with one logged-in hospital.
+
+HOSP001 has 6 general, 2 ICU and 2 flexible beds, the split update-capacity uses for 10 beds.
+"""
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)  # app.py loads its model files relative to the working directory
+import app as serbas
+
+HID = 'HOSP001'
+LAYOUT = (('general', 'BED', 'General Ward', 6), ('icu', 'ICU', 'ICU', 2), ('flexible', 'FLEX', 'Flex Ward', 2))
+
+def add_hospital(hid, layout=LAYOUT):
+    conn = serbas.get_catalog_db()
+    conn.execute("INSERT INTO hospitals VALUES (?, 'Test', 'Test', '000', ?, ?, 'password123')",
+                 (hid, sum(n for *_, n in layout), sum(n for t, *_, n in layout if t == 'icu')))
+    conn.executemany("INSERT INTO beds VALUES (?, ?, ?, ?, 'available', NULL, NULL)",
+                     [(f"{hid}-{prefix}{i:05d}", hid, bed_type, ward) for bed_type, prefix, ward, n in layout for i in range(1, n + 1)])
+    conn.commit()
+    serbas.reload_bed_state(conn)
+
+def login(hid=HID):
+    client = serbas.app.test_client()
+    client.post('/login', json={'hospital_id': hid, 'password': 'password123'})
+    return client
+
+# Vitals the shipped models triage as low / high severity (the high ones also land in the high-risk cluster)
+CALM = {'age': 40, 'heart_rate': 75, 'blood_pressure_systolic': 120, 'blood_pressure_diastolic': 80, 'spO2': 98, 'temperature': 36.8}
+CRITICAL = {'age': 60, 'heart_rate': 140, 'blood_pressure_systolic': 85, 'blood_pressure_diastolic': 50, 'spO2': 84, 'temperature': 39.5}
+
+@pytest.fixture
+def client(tmp_path):
+    serbas.DB_NAME, serbas.SHARD_DIR = str(tmp_path / 'test.db'), None
+    with serbas.VITALS_LOCK: serbas.VITALS.clear()  # patient ids restart at PAT001 in every scratch database
+    add_hospital(HID)
+    yield login()
+    serbas.close_thread_dbs()
+
+def patient(vitals=CALM, **overrides):
+    """An admission payload, calm (low severity, general ward) by default"""
+    data = dict(vitals, patient_name='Test Patient', blood_group='O+', admission_cause='Observation',
+                health_risk='low', doctor_recommendation='general')
+    data.update(overrides)
+    return data
+
+def admit(client, vitals=CALM, **overrides):
+    return client.post('/api/allocate-bed', json=patient(vitals, **overrides)).get_json()
@@ -0,0 +1,31 @@
+"""Batch triage-and-allocate: one transaction, a result per patient, the overflow queued (user-001)."""
+import pytest
+
+from conftest import CRITICAL, patient
+
+@pytest.mark.parametrize('solver', ['greedy', 'optimal'])
+def test_batch_larger_than_capacity_returns_partial_results(client, solver):
+    batch = [patient(CRITICAL, patient_name=f'Critical {i}') for i in range(3)] + [patient(patient_name=f'Calm {i}') for i in range(9)]
+    body = client.post('/api/allocate-beds-batch', json={'patients': batch, 'solver': solver}).get_json()
+    assert body['success'] and body['solver'] == solver
+    assert (body['allocated'], body['waiting']) == (10, 2)
+    results = body['results']
+    assert len(results) == 12 and len({r['patient_id'] for r in results}) == 12
+    assert [r['ml_severity'] for r in results[:3]] == ['high'] * 3
+    assert all(r['success'] for r in results[:3])  # the critical patients are placed whatever the order
+    bed_ids = [r['bed_id'] for r in results if r['success']]
+    assert len(set(bed_ids)) == 10
+    assert all(r['bed_id'] is None for r in results if not r['success'])
+    assert client.get('/api/waiting-queue').get_json()['total_waiting'] == 2
+    assert client.get('/api/dashboard-data?verify=1').get_json()['verified']['consistent']
+
+def test_batch_with_a_bad_patient_admits_nobody(client):
+    batch = [patient(), {'patient_name': 'No details'}]
+    resp = client.post('/api/allocate-beds-batch', json={'patients': batch})
+    assert resp.status_code == 400
+    assert 'Patient #2' in resp.get_json()['message']
+    assert client.get('/api/allocated-patients').get_json()['patients'] == []
+
+def test_batch_rejects_empty_list_and_unknown_solver(client):
+    assert client.post('/api/allocate-beds-batch', json={'patients': []}).status_code == 400
+    assert client.post('/api/allocate-beds-batch', json={'patients': [patient()], 'solver': 'magic'}).status_code == 400
@@ -0,0 +1,16 @@
+"""The benchmarks' own correctness checks, run small so a change that breaks them fails here first."""
+import os
+import sys
+
+import pytest
+
+from conftest import ROOT
+
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+import bench_resize
+
+def test_bench_resize_checks_pass(monkeypatch, capsys):
+    monkeypatch.setattr(sys, 'argv', ['bench_resize.py', '--beds', '2000', '--budget', '60'])
+    with pytest.raises(SystemExit) as done:
+        bench_resize.main()
+    assert done.value.code == 0, capsys.readouterr().out
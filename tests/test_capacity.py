@@ -0,0 +1,40 @@
+"""Bulk capacity resize around occupied beds (user-013)."""
+from conftest import CRITICAL, admit
+
+def bed_counts(client):
+    stats = client.get('/api/dashboard-data?verify=1').get_json()
+    assert stats['verified']['consistent']
+    return stats['stats']
+
+def resize(client, total, icu):
+    return client.post('/api/update-capacity', json={'total_beds': total, 'icu_beds': icu}).get_json()
+
+def test_shrink_removes_only_free_beds(client):
+    occupied = [admit(client)['bed_id'] for _ in range(3)] + [admit(client, CRITICAL)['bed_id']]
+    assert resize(client, 5, 1)['success']  # 1 ICU, 1 flexible, 3 general: exactly the occupied ones survive
+    beds = {b['id']: b['status'] for b in client.get('/api/available-beds').get_json()['beds']}
+    assert all(beds[bed] == 'occupied' for bed in occupied)
+    assert len(beds) == 5
+    assert (bed_counts(client)['total_beds'], bed_counts(client)['available_beds']) == (5, 1)
+
+def test_shrink_below_occupied_is_refused_and_rolled_back(client):
+    for _ in range(4): admit(client)
+    before = client.get('/api/available-beds').get_json()['beds']
+    result = resize(client, 5, 2)  # would leave 2 general beds for 4 general patients
+    assert not result['success'] and 'GENERAL' in result['message']
+    assert client.get('/api/available-beds').get_json()['beds'] == before
+    assert bed_counts(client)['total_beds'] == 10
+
+def test_grow_after_shrink_issues_fresh_bed_ids(client):
+    assert resize(client, 5, 1)['success']
+    assert resize(client, 40, 8)['success']
+    ids = [b['id'] for b in client.get('/api/available-beds').get_json()['beds']]
+    assert len(ids) == len(set(ids)) == 40
+    assert bed_counts(client)['icu_beds'] == 8
+
+def test_grow_places_waiting_patients(client):
+    for _ in range(8): admit(client)
+    queued = admit(client)
+    assert not queued['success']
+    promoted = resize(client, 20, 2)['promoted_waiting']
+    assert [p['patient_id'] for p in promoted] == [queued['patient_id']]
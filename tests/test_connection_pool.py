@@ -0,0 +1,37 @@
+"""Pooled connections are handed to one request at a time, including while an NDJSON listing streams."""
+import json
+
+import app as serbas
+from conftest import login
+
+def record_checkouts(monkeypatch):
+    pool, handed = serbas.db_pool(serbas.DB_NAME), []
+    checkout = pool.checkout
+    def recording():
+        handed.append(checkout())
+        return handed[-1]
+    monkeypatch.setattr(pool, 'checkout', recording)
+    return pool, handed
+
+def test_ndjson_stream_keeps_its_connection_until_closed(client, monkeypatch):
+    pool, handed = record_checkouts(monkeypatch)
+    resp = client.get('/api/available-beds?format=ndjson', buffered=False)
+    lines = iter(resp.response)
+    assert json.loads(next(lines))['type'] == 'flexible'
+    streaming = handed[0]
+    assert streaming not in pool.idle
+
+    # A second request while the stream is mid-flight gets a connection of its own
+    assert login().get('/api/available-beds?limit=3').get_json()['next_cursor']
+    assert all(conn is not streaming for conn in handed[1:])
+
+    rest = [json.loads(line) for line in lines]
+    assert len(rest) == 9  # ten beds, one line each
+    resp.close()
+    assert streaming in pool.idle  # back in the pool once the stream is closed
+
+def test_abandoned_stream_returns_its_connection(client, monkeypatch):
+    pool, handed = record_checkouts(monkeypatch)
+    resp = client.get('/api/available-beds?format=ndjson', buffered=False)
+    resp.close()  # client went away before reading anything
+    assert handed[0] in pool.idle
@@ -0,0 +1,54 @@
+"""Dashboard counters must notice writes committed by another worker process.
+
+Each worker keeps its own in-memory counters and answers If-None-Match polls from them; the
+dashboard_versions row is how a worker learns that another process changed the hospital.
+"""
+import multiprocessing
+import os
+
+import app as serbas
+from conftest import login
+
+def resize_in_child(db_name, total, icu):
+    """Another worker: its own process, its own connection and counters"""
+    serbas.DB_NAME, serbas.SHARD_DIR = db_name, None
+    serbas.close_thread_dbs()
+    serbas.reload_bed_state(serbas.get_db())
+    ok = login().post('/api/update-capacity', json={'total_beds': total, 'icu_beds': icu}).get_json()['success']
+    os._exit(0 if ok else 1)
+
+def other_worker_resizes(total, icu):
+    child = multiprocessing.get_context('fork').Process(target=resize_in_child, args=(serbas.DB_NAME, total, icu))
+    child.start(); child.join(30)
+    assert child.exitcode == 0
+
+def test_poll_sees_other_process_write(client):
+    first = client.get('/api/dashboard-data')
+    assert first.get_json()['stats']['total_beds'] == 10
+    etag = first.headers['ETag']
+    assert client.get('/api/dashboard-data', headers={'If-None-Match': etag}).status_code == 304
+
+    other_worker_resizes(20, 4)
+
+    again = client.get('/api/dashboard-data', headers={'If-None-Match': etag})
+    assert again.status_code == 200
+    assert again.headers['ETag'] != etag
+    stats = again.get_json()['stats']
+    assert (stats['total_beds'], stats['icu_beds'], stats['available_beds']) == (20, 4, 20)
+
+def test_own_write_after_other_process_write_reloads(client):
+    client.get('/api/dashboard-data')
+    other_worker_resizes(20, 4)
+    # This worker's next commit finds the version two ahead of its counters and drops them instead of
+    # applying its delta on top of numbers that miss the other worker's change
+    assert client.post('/api/update-capacity', json={'total_beds': 30, 'icu_beds': 6}).get_json()['success']
+    body = client.get('/api/dashboard-data?verify=1').get_json()
+    assert body['stats']['total_beds'] == 30
+    assert body['verified']['consistent']
+
+def test_counters_follow_own_writes_without_reload(client):
+    client.get('/api/dashboard-data')
+    loaded = serbas.DASHBOARD_STATS['HOSP001']
+    assert client.post('/api/update-capacity', json={'total_beds': 14, 'icu_beds': 3}).get_json()['success']
+    assert serbas.DASHBOARD_STATS['HOSP001'] is loaded  # applied in place: the version row moved by exactly one
+    assert client.get('/api/dashboard-data?verify=1').get_json()['verified']['consistent']
@@ -0,0 +1,108 @@
+"""Event stream: changes from any worker process reach every stream, from Flask and from event_server.py."""
+import asyncio
+import itertools
+import multiprocessing
+import os
+import socket
+import threading
+
+import app as serbas
+import event_server
+from conftest import CRITICAL, admit, login
+
+def admit_in_other_process(vitals=CRITICAL):
+    def child():
+        serbas.close_thread_dbs()
+        os._exit(0 if admit(login(), vitals)['success'] else 1)
+    worker = multiprocessing.get_context('fork').Process(target=child)
+    worker.start(); worker.join(30)
+    assert worker.exitcode == 0
+
+def sse_events(chunks):
+    """(id, event) of each SSE frame in a byte stream, keepalive comments and HTTP headers skipped"""
+    buffer = ''
+    for chunk in chunks:
+        buffer += chunk.decode()
+        *complete, buffer = buffer.replace('\r\n\r\n', '\n\n').split('\n\n')
+        for frame in complete:
+            fields = dict(line.split(': ', 1) for line in frame.splitlines() if ': ' in line and not line.startswith(':'))
+            if 'event' in fields: yield fields['id'], fields['event']
+
+def frames(events, n):
+    return list(itertools.islice(events, n))
+
+def test_stream_carries_another_process_commit(client):
+    resp = client.get('/api/events', buffered=False)
+    events = sse_events(resp.response)
+    assert frames(events, 1) == [('0', 'hello')]
+    admit_in_other_process()
+    assert [event for _, event in frames(events, 3)] == ['bed', 'patient', 'stats']
+    resp.close()
+
+def test_resume_replays_missed_events_and_unknown_ids_resync(client):
+    admit(client); admit(client)
+    resp = client.get('/api/events', headers={'Last-Event-ID': '2'}, buffered=False)
+    assert frames(sse_events(resp.response), 4) == [('2', 'hello'), ('3', 'bed'), ('4', 'patient'), ('4', 'stats')]
+    resp.close()
+    resp = client.get('/api/events', headers={'Last-Event-ID': '999'}, buffered=False)
+    assert frames(sse_events(resp.response), 2) == [('4', 'resync'), ('4', 'hello')]
+    resp.close()
+
+def test_dispatcher_stops_with_its_last_stream(client):
+    resp = client.get('/api/events', buffered=False)
+    next(iter(resp.response))
+    dispatcher = serbas.EVENT_DISPATCHERS[serbas.DB_NAME]
+    resp.close()
+    dispatcher.wake.set()
+    for _ in range(100):
+        if serbas.DB_NAME not in serbas.EVENT_DISPATCHERS: break
+        threading.Event().wait(0.01)
+    assert serbas.DB_NAME not in serbas.EVENT_DISPATCHERS
+
+def start_event_server():
+    ready, ports = threading.Event(), []
+    def run():
+        asyncio.run(event_server.serve('127.0.0.1', 0, lambda port: (ports.append(port), ready.set())))
+    threading.Thread(target=run, daemon=True).start()
+    assert ready.wait(10)
+    return ports[0]
+
+def event_server_get(port, cookie=None, last_event_id=None):
+    sock = socket.create_connection(('127.0.0.1', port), timeout=10)
+    headers = ''.join(f'{k}: {v}\r\n' for k, v in (('Cookie', cookie), ('Last-Event-ID', last_event_id)) if v)
+    sock.sendall(f"GET /api/events HTTP/1.1\r\nHost: test\r\n{headers}\r\n".encode())
+    return sock
+
+def socket_chunks(sock):
+    while True:
+        data = sock.recv(65536)
+        if not data: return
+        yield data
+
+def test_event_server_streams_every_worker_commit(client):
+    port = start_event_server()
+    cookie = f"session={client.get_cookie('session').value}"
+    sock = event_server_get(port, cookie)
+    chunks = socket_chunks(sock)
+    head = next(chunks)
+    assert head.startswith(b'HTTP/1.1 200 OK') and b'text/event-stream' in head
+    events = sse_events(itertools.chain([head], chunks))
+    assert frames(events, 1) == [('0', 'hello')]
+    admit(client)                 # this process
+    admit_in_other_process()      # another worker
+    names = [event for _, event in frames(events, 5)]  # one stats per poll, so 5 or 6 frames
+    assert names.count('bed') == 2 and names.count('patient') == 2 and 'stats' in names
+    sock.close()
+
+    resumed = event_server_get(port, cookie, last_event_id='2')
+    assert frames(sse_events(socket_chunks(resumed)), 4)[1:] == [('3', 'bed'), ('4', 'patient'), ('4', 'stats')]
+    resumed.close()
+
+def test_event_server_requires_a_session(client):
+    port = start_event_server()
+    sock = event_server_get(port)
+    assert sock.recv(65536).startswith(b'HTTP/1.1 401')
+    sock.close()
+    forged = event_server_get(port, 'session=eyJob3NwaXRhbF9pZCI6IkhPU1AwMDEifQ.forged.sig')
+    assert forged.recv(65536).startswith(b'HTTP/1.1 401')
+    forged.close()
@@ -0,0 +1,39 @@
+"""Keyset pagination and NDJSON output of the two listings (user-010)."""
+import json
+
+from conftest import admit
+
+def all_pages(client, url, key, limit):
+    items, cursor, pages = [], None, 0
+    while True:
+        body = client.get(url, query_string={'limit': limit, **({'cursor': cursor} if cursor else {})}).get_json()
+        items += body[key]; pages += 1
+        cursor = body['next_cursor']
+        if not cursor: return items, pages
+
+def test_available_beds_pages_cover_every_bed_once_in_order(client):
+    beds, pages = all_pages(client, '/api/available-beds', 'beds', 3)
+    assert pages == 4
+    ids = [(b['type'], b['id']) for b in beds]
+    assert len(ids) == 10 and ids == sorted(set(ids))
+    assert client.get('/api/available-beds').get_json()['beds'] == beds  # unpaged: the same rows
+
+def test_allocated_patients_pages_newest_first(client):
+    pids = [admit(client)['patient_id'] for _ in range(5)]
+    patients, pages = all_pages(client, '/api/allocated-patients', 'patients', 2)
+    assert pages == 3
+    assert [p['id'] for p in patients] == pids[::-1]  # same admission date: newest row first
+
+def test_bad_cursor_is_rejected(client):
+    for cursor in ('not-base64!', 'W10=', 'WzEsMiwzXQ=='):  # garbage, [] and [1, 2, 3]
+        assert client.get('/api/available-beds', query_string={'cursor': cursor}).status_code == 400
+        assert client.get('/api/allocated-patients', query_string={'cursor': cursor}).status_code == 400
+
+def test_ndjson_streams_one_object_per_line_then_the_cursor(client):
+    resp = client.get('/api/available-beds?format=ndjson&limit=4')
+    assert resp.mimetype == 'application/x-ndjson'
+    lines = [json.loads(line) for line in resp.get_data(as_text=True).splitlines()]
+    assert [b['id'] for b in lines[:4]] == [b['id'] for b in client.get('/api/available-beds?limit=4').get_json()['beds']]
+    assert set(lines[4]) == {'next_cursor'}
+    rest = client.get(f"/api/available-beds?format=ndjson&cursor={lines[4]['next_cursor']}").get_data(as_text=True).splitlines()
+    assert len(rest) == 6 and 'next_cursor' not in json.loads(rest[-1])
@@ -0,0 +1,31 @@
+"""No-bed suggestions: a patient queued for lack of beds is pointed at sister hospitals (user-017)."""
+from conftest import CRITICAL, add_hospital, admit
+
+def fill(client):
+    for _ in range(2): admit(client, CRITICAL)
+    for _ in range(8): admit(client)
+
+def test_full_hospital_suggests_sister_hospitals_by_bed_type_then_cost(client):
+    add_hospital('HOSP002', (('general', 'BED', 'General Ward', 3),))
+    add_hospital('HOSP003', (('general', 'BED', 'General Ward', 1), ('icu', 'ICU', 'ICU', 1)))
+    fill(client)
+    calm = admit(client)
+    assert not calm['success']
+    # Both have a general bed and no cost is configured (equal default cost), so more free beds ranks first
+    assert [(a['hospital_id'], a['bed_type'], a['free_beds']) for a in calm['alternatives']] == [('HOSP002', 'general', 3), ('HOSP003', 'general', 1)]
+
+    critical = admit(client, CRITICAL)
+    assert [(a['hospital_id'], a['bed_type']) for a in critical['alternatives']][0] == ('HOSP003', 'icu')
+
+    assert client.post('/api/transfer-costs', json={'costs': {'HOSP003': 5}}).get_json()['success']
+    options = client.get(f"/api/overflow-options?patient_id={calm['patient_id']}").get_json()
+    assert [a['hospital_id'] for a in options['alternatives']] == ['HOSP003', 'HOSP002']
+    assert options['alternatives'][0]['transfer_cost'] == 5
+
+def test_no_suggestions_when_every_hospital_is_full(client):
+    fill(client)
+    assert admit(client)['alternatives'] == []
+
+def test_placed_patient_gets_no_suggestions(client):
+    add_hospital('HOSP002')
+    assert 'alternatives' not in admit(client)
@@ -0,0 +1,43 @@
+"""Discharge and stay extension act only on the logged-in hospital's patients, in its shard (user-018)."""
+import app as serbas
+import split_db
+from conftest import HID, add_hospital, admit, login
+
+def details(client, pid):
+    return client.get(f'/api/patient-details/{pid}').get_json()['details']
+
+def test_both_need_a_session(client):
+    pid = admit(client, doctor_recommendation='flexible')['patient_id']
+    anonymous = serbas.app.test_client()
+    assert anonymous.post('/api/discharge-patient', json={'patient_id': pid}).status_code == 401
+    assert anonymous.post('/api/extend-stay', json={'patient_id': pid}).status_code == 401
+    assert details(client, pid)['status'] == 'allocated'
+
+def test_another_hospitals_patient_is_not_found(client):
+    add_hospital('HOSP002')
+    other = login('HOSP002')
+    pid = admit(other, doctor_recommendation='flexible')['patient_id']
+    assert client.post('/api/discharge-patient', json={'patient_id': pid}).status_code == 404
+    assert client.post('/api/extend-stay', json={'patient_id': pid}).status_code == 404
+    assert serbas.get_db().execute("SELECT status, extended_stay FROM patients WHERE id=?", (pid,)).fetchone() == ('allocated', 0)
+    assert client.post('/api/discharge-patient', json={'patient_id': 'PAT999'}).status_code == 404
+
+def test_extend_stay_still_refuses_ineligible_patients(client):
+    pid = admit(client)['patient_id']  # recommended a general bed
+    resp = client.post('/api/extend-stay', json={'patient_id': pid})
+    assert resp.status_code == 200 and not resp.get_json()['success']
+
+def test_sharded_mode_updates_the_hospitals_shard(client, tmp_path, monkeypatch):
+    flexible = admit(client, doctor_recommendation='flexible')['patient_id']
+    general = admit(client)['patient_id']
+    serbas.close_thread_dbs()
+    monkeypatch.setattr('sys.argv', ['split_db.py', '--source', serbas.DB_NAME, '--out', str(tmp_path / 'shards')])
+    split_db.main()
+    serbas.SHARD_DIR = str(tmp_path / 'shards')
+    client = login(HID)
+    assert client.post('/api/extend-stay', json={'patient_id': flexible}).get_json()['success']
+    assert client.post('/api/discharge-patient', json={'patient_id': general}).get_json()['success']
+    shard = serbas.pooled_db(serbas.shard_path(HID))
+    assert shard.execute("SELECT status, extended_stay FROM patients WHERE id=?", (flexible,)).fetchone() == ('allocated', 1)
+    assert shard.execute("SELECT status FROM patients WHERE id=?", (general,)).fetchone() == ('discharged',)
+    assert client.get('/api/dashboard-data?verify=1').get_json()['verified']['consistent']
@@ -0,0 +1,28 @@
+"""Prediction cache: hits for repeated vitals, emptied when the models are reloaded (user-014)."""
+import app as serbas
+from conftest import CALM
+
+def test_repeat_prediction_is_served_from_cache():
+    serbas.SEVERITY_CACHE.clear()
+    first = serbas.predict_severity_ml(dict(CALM))
+    assert len(serbas.SEVERITY_CACHE.entries) == 1
+    assert serbas.predict_severity_ml(dict(CALM)) == first
+    assert len(serbas.SEVERITY_CACHE.entries) == 1
+
+def test_uncacheable_vitals_are_not_stored():
+    serbas.SEVERITY_CACHE.clear()
+    serbas.predict_severity_ml(dict(CALM, temperature=36.85))
+    assert len(serbas.SEVERITY_CACHE.entries) == 0
+
+def test_model_reload_clears_both_caches():
+    serbas.predict_severity_ml(dict(CALM)); serbas.run_unsupervised_model(dict(CALM))
+    generation = serbas.SEVERITY_CACHE.generation
+    serbas.load_ml_models()
+    assert len(serbas.SEVERITY_CACHE.entries) == len(serbas.CLUSTER_CACHE.entries) == 0
+    assert serbas.SEVERITY_CACHE.generation == generation + 1
+
+def test_result_computed_before_a_reload_is_not_stored():
+    generation = serbas.SEVERITY_CACHE.generation
+    serbas.load_ml_models()  # a swap lands while the old prediction is in flight
+    serbas.SEVERITY_CACHE.put(('stale',), 'high', generation)
+    assert ('stale',) not in serbas.SEVERITY_CACHE.entries
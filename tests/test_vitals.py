@@ -0,0 +1,42 @@
+"""Vitals ingestion: re-triage only on a band or cluster change, and the bed-upgrade suggestion (user-020)."""
+from conftest import CALM, CRITICAL, admit
+
+def reading(pid, vitals):
+    return dict({k: v for k, v in vitals.items() if k != 'age'}, patient_id=pid)
+
+def test_steady_readings_do_not_retriage(client):
+    pid = admit(client)['patient_id']
+    body = client.post('/api/vitals', json={'readings': [reading(pid, dict(CALM, heart_rate=hr)) for hr in (74, 76, 75)]}).get_json()
+    assert body['accepted'] == 3 and body['retriaged'] == [] and body['upgrades'] == []
+    assert len(client.get(f'/api/vitals/{pid}').get_json()['readings']) == 3
+
+def test_deterioration_retriages_and_suggests_an_upgrade(client):
+    admitted = admit(client)
+    pid = admitted['patient_id']
+    assert admitted['bed_id'].startswith('HOSP001-BED')
+    body = client.post('/api/vitals', json=reading(pid, CRITICAL)).get_json()
+    [change] = body['retriaged']
+    assert (change['previous_severity'], change['severity'], change['status']) == ('low', 'high', 'allocated')
+    assert change['priority_score'] > change['previous_priority_score']
+    [upgrade] = body['upgrades']
+    assert (upgrade['from'], upgrade['to'], upgrade['bed_id'], upgrade['beds_free']) == ('general', 'icu', admitted['bed_id'], 2)
+    details = client.get(f'/api/patient-details/{pid}').get_json()['details']
+    assert (details['ml_severity'], details['spO2']) == ('high', CRITICAL['spO2'])
+    stats = client.get('/api/dashboard-data?verify=1').get_json()
+    assert stats['stats']['critical_load'] == 1 and stats['verified']['consistent']
+
+def test_waiting_patient_is_placed_once_the_new_severity_allows_it(client):
+    for _ in range(8): admit(client)  # general and flexible beds full; the ICU stays free
+    waiting = admit(client)
+    assert not waiting['success']
+    body = client.post('/api/vitals', json=reading(waiting['patient_id'], CRITICAL)).get_json()
+    [change] = body['retriaged']
+    assert change['status'] == 'allocated' and change['bed_id'].startswith('HOSP001-ICU')  # high severity may take the ICU
+
+def test_unknown_patient_and_bad_readings_are_rejected(client):
+    pid = admit(client)['patient_id']
+    body = client.post('/api/vitals', json=[reading('PAT999', CALM), {'patient_id': pid}, reading(pid, CALM)]).get_json()
+    assert body['accepted'] == 1
+    assert [r['patient_id'] for r in body['rejected'] if 'patient_id' in r] == ['PAT999']
+    assert any(r.get('index') == 1 for r in body['rejected'])
+    assert client.post('/api/vitals', json=[]).status_code == 400
@@ -0,0 +1,41 @@
+"""Waiting list: a discharge hands the freed bed to the highest-priority waiting patient (user-004)."""
+from conftest import CALM, CRITICAL, admit
+
+def fill_hospital(client):
+    """2 critical patients in the ICU beds, 8 calm ones in the general and flexible beds"""
+    admitted = [admit(client, CRITICAL) for _ in range(2)] + [admit(client) for _ in range(8)]
+    assert all(r['success'] for r in admitted)
+    return admitted
+
+def waiting_ids(client, bed_type):
+    return [p['patient_id'] for p in client.get('/api/waiting-queue').get_json()['queues'].get(bed_type, [])]
+
+def test_full_hospital_queues_patient(client):
+    fill_hospital(client)
+    queued = admit(client)
+    assert not queued['success'] and queued['bed_id'] is None
+    assert queued['patient_id'] in waiting_ids(client, 'general')
+
+def test_discharge_hands_bed_to_highest_priority_first(client):
+    admitted = fill_hospital(client)
+    general = [r for r in admitted if r['bed_id'].startswith('HOSP001-BED')]
+    early_calm, late_critical = admit(client, CALM), admit(client, CRITICAL)
+    assert not early_calm['success'] and not late_critical['success']
+
+    first = client.post('/api/discharge-patient', json={'patient_id': general[0]['patient_id']}).get_json()
+    assert first['handed_off_to'] == late_critical['patient_id']  # priority beats arrival order
+    second = client.post('/api/discharge-patient', json={'patient_id': general[1]['patient_id']}).get_json()
+    assert second['handed_off_to'] == early_calm['patient_id']
+
+    details = client.get(f"/api/patient-details/{late_critical['patient_id']}").get_json()['details']
+    assert details['status'] == 'allocated' and details['bed_id'] == general[0]['bed_id']
+    assert waiting_ids(client, 'general') == []
+    assert client.get('/api/dashboard-data?verify=1').get_json()['verified']['consistent']
+
+def test_discharging_a_waiting_patient_leaves_the_queue(client):
+    admitted = fill_hospital(client)
+    queued = admit(client)
+    client.post('/api/discharge-patient', json={'patient_id': queued['patient_id']})
+    assert queued['patient_id'] not in waiting_ids(client, 'general')
+    freed = client.post('/api/discharge-patient', json={'patient_id': admitted[-1]['patient_id']}).get_json()
+    assert freed['handed_off_to'] is None
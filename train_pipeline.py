@@ -0,0 +1,218 @@
+"""Out-of-core training pipeline: Random Forest + scaler + K-Means from admissions of any size.
+
+hhhh.py and train_unsupervised.py load one small CSV into pandas. This pipeline streams the training rows
+in chunks instead, so memory stays flat however many rows the source holds:
+
+    scan      one pass: StandardScaler.partial_fit on the K-Means vitals, class counts, and a bounded
+              uniform reservoir sample (--rf-sample rows) plus a small holdout for the forest
+    kmeans    second pass: MiniBatchKMeans.partial_fit over scaled mini-batches. The high-risk cluster
+              is the centroid with the lowest SpO2, as in train_unsupervised.py
+    forest    RandomForestClassifier on the reservoir, on every core (--jobs, default -1)
+    evaluate  forest accuracy on the holdout rows
+    publish   writes the four artifacts and publishes them as a new version in the model registry
+              (with compiled-engine arrays), so a running app can hot-swap to it
+
+Sources: a SQLite database (its patients table, the stored triage severity is the label), a directory of
+SQLite shards (SERBAS_SHARD_DIR layout), a CSV or a Parquet file (needs pyarrow) with the training CSV
+columns. Every stage reports its wall time and the peak resident memory seen while it ran.
+
+    python train_pipeline.py --source hospital_hybrid_final.db
+    python train_pipeline.py --source admissions.parquet --chunksize 200000 --rf-sample 1000000 --activate --report train.json
+"""
+import argparse
+import glob
+import json
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.cluster import MiniBatchKMeans
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.preprocessing import StandardScaler
+
+import model_registry
+from metrics import process_rss_bytes
+
+RF_COLUMNS = ['age', 'heart_rate', 'bp_systolic', 'bp_diastolic', 'spO2', 'temperature']  # order the app predicts with
+KMEANS_COLUMNS = RF_COLUMNS[1:]
+LABELS = ('low', 'medium', 'high')
+N_CLUSTERS = 3  # low / medium / high risk, as in train_unsupervised.py
+
+# --- SOURCES ---
+def sqlite_chunks(path, chunksize):
+    # Quoted so a path with ?, # or % still names the file (as split_db.read_only_uri does)
+    conn = sqlite3.connect(f"file:{urllib.parse.quote(os.path.abspath(path))}?mode=ro", uri=True)
+    try:
+        sql = f"SELECT {', '.join(RF_COLUMNS)}, severity FROM patients WHERE severity IN ('low', 'medium', 'high')"
+        yield from pd.read_sql_query(sql, conn, chunksize=chunksize)
+    finally:
+        conn.close()
+
+def csv_chunks(path, chunksize):
+    yield from pd.read_csv(path, usecols=RF_COLUMNS + ['severity'], chunksize=chunksize)
+
+def parquet_chunks(path, chunksize):
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        sys.exit("❌ Reading Parquet needs pyarrow: pip install pyarrow")
+    for batch in pq.ParquetFile(path).iter_batches(batch_size=chunksize, columns=RF_COLUMNS + ['severity']):
+        yield batch.to_pandas()
+
+def source_chunks(source, chunksize):
+    """DataFrame chunks (RF_COLUMNS + severity) from a database, shard directory, CSV or Parquet file"""
+    if os.path.isdir(source):
+        for path in sorted(glob.glob(os.path.join(source, '*.db'))):
+            if os.path.basename(path) != 'catalog.db': yield from sqlite_chunks(path, chunksize)
+    elif source.endswith('.csv'): yield from csv_chunks(source, chunksize)
+    elif source.endswith(('.parquet', '.pq')): yield from parquet_chunks(source, chunksize)
+    else: yield from sqlite_chunks(source, chunksize)
+
+def clean(chunk):
+    """Feature matrix and labels of a chunk, without rows that have missing vitals or unknown labels"""
+    chunk = chunk.dropna()
+    chunk = chunk[chunk['severity'].isin(LABELS)]
+    return chunk[RF_COLUMNS].to_numpy(dtype=np.float64), chunk['severity'].to_numpy(dtype=object)
+
+# --- STAGE REPORTING ---
+class Stage:
+    """Times a stage and samples resident memory in a background thread to catch its peak"""
+    INTERVAL = 0.02
+
+    def __init__(self, report, name):
+        self.report, self.name = report, name
+
+    def __enter__(self):
+        self.done = threading.Event()
+        self.peak = process_rss_bytes()
+        self.sampler = threading.Thread(target=self.sample, daemon=True)
+        self.sampler.start()
+        self.start = time.perf_counter()
+        return self
+
+    def sample(self):
+        while not self.done.wait(self.INTERVAL): self.peak = max(self.peak, process_rss_bytes())
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.start
+        self.done.set(); self.sampler.join()
+        self.peak = max(self.peak, process_rss_bytes())
+        self.report[self.name] = {'seconds': round(elapsed, 3), 'peak_rss_mb': round(self.peak / 2**20, 1)}
+        if exc[0] is None: print(f"✅ {self.name}: {elapsed:.2f}s, peak RSS {self.peak / 2**20:.0f} MB")
+
+class Reservoir:
+    """Uniform sample of at most `size` rows from a stream of unknown length (vectorised Algorithm R)"""
+
+    def __init__(self, size, n_features, rng):
+        self.X = np.empty((size, n_features))
+        self.y = np.empty(size, dtype=object)
+        self.size, self.seen, self.rng = size, 0, rng
+
+    def add(self, X, y):
+        fill = min(max(self.size - self.seen, 0), len(X))
+        self.X[self.seen:self.seen + fill], self.y[self.seen:self.seen + fill] = X[:fill], y[:fill]
+        if fill < len(X):
+            # Row number t (0-based) replaces a random slot with probability size / (t + 1)
+            t = np.arange(self.seen + fill, self.seen + len(X))
+            slots = (self.rng.random(len(t)) * (t + 1)).astype(np.int64)
+            keep = slots < self.size
+            self.X[slots[keep]], self.y[slots[keep]] = X[fill:][keep], y[fill:][keep]
+        self.seen += len(X)
+
+    def rows(self):
+        n = min(self.seen, self.size)
+        return self.X[:n], self.y[:n]
+
+# --- PIPELINE ---
+def train(args):
+    stages, rng = {}, np.random.default_rng(args.seed)
+    scaler = StandardScaler()
+    sample = Reservoir(args.rf_sample, len(RF_COLUMNS), rng)
+    holdout = Reservoir(args.holdout, len(RF_COLUMNS), rng)
+    classes = dict.fromkeys(LABELS, 0)
+
+    with Stage(stages, 'scan'):
+        for chunk in source_chunks(args.source, args.chunksize):
+            X, y = clean(chunk)
+            if not len(X): continue
+            scaler.partial_fit(X[:, 1:])
+            held = rng.random(len(X)) < args.holdout_share
+            sample.add(X[~held], y[~held]); holdout.add(X[held], y[held])
+            for label, n in zip(*np.unique(y, return_counts=True)): classes[label] += int(n)
+    rows = sum(classes.values())
+    if rows < N_CLUSTERS: sys.exit(f"❌ {args.source} has {rows} usable rows; nothing to train on")
+    print(f"   {rows} rows ({', '.join(f'{k}: {v}' for k, v in classes.items())}), forest sample {min(sample.seen, sample.size)}")
+
+    with Stage(stages, 'kmeans'):
+        kmeans = MiniBatchKMeans(n_clusters=N_CLUSTERS, batch_size=args.batch_size, random_state=args.seed, n_init=3)
+        for _ in range(args.kmeans_epochs):
+            for chunk in source_chunks(args.source, args.chunksize):
+                X_scaled = scaler.transform(clean(chunk)[0][:, 1:])
+                for lo in range(0, len(X_scaled), args.batch_size):
+                    batch = X_scaled[lo:lo + args.batch_size]
+                    if len(batch) >= N_CLUSTERS: kmeans.partial_fit(batch)
+        centroids = pd.DataFrame(scaler.inverse_transform(kmeans.cluster_centers_), columns=KMEANS_COLUMNS)
+        high_risk = int(centroids['spO2'].idxmin())  # the cluster with the lowest average SpO2 is 'High Risk'
+    print(f"   High Risk Cluster Index: {high_risk}")
+
+    with Stage(stages, 'forest'):
+        X, y = sample.rows()
+        forest = RandomForestClassifier(n_estimators=args.trees, random_state=args.seed, n_jobs=args.jobs)
+        forest.fit(X, y)
+        del X, y
+
+    with Stage(stages, 'evaluate'):
+        X, y = holdout.rows()
+        accuracy = float((forest.predict(X) == y).mean()) if len(X) else None
+    if accuracy is not None: print(f"   Holdout accuracy: {accuracy:.4f} on {len(X)} rows")
+
+    with Stage(stages, 'publish'):
+        staging = tempfile.mkdtemp(prefix='serbas-train-')
+        try:
+            joblib.dump(forest, os.path.join(staging, model_registry.ARTIFACTS['rf']))
+            joblib.dump(kmeans, os.path.join(staging, model_registry.ARTIFACTS['kmeans']))
+            joblib.dump(scaler, os.path.join(staging, model_registry.ARTIFACTS['scaler']))
+            joblib.dump(high_risk, os.path.join(staging, model_registry.ARTIFACTS['high_risk']))
+            version = model_registry.publish(args.version, source=staging, activate_now=args.activate)
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+    print(f"✅ Published model version {version}" + (" (active)" if args.activate else f". Activate it with: python model_registry.py activate {version}"))
+
+    return {'source': args.source, 'version': version, 'active': args.activate, 'rows': rows, 'classes': classes,
+            'forest_sample': min(sample.seen, sample.size), 'holdout_rows': min(holdout.seen, holdout.size),
+            'holdout_accuracy': None if accuracy is None else round(accuracy, 4), 'high_risk_cluster': high_risk,
+            'centroids': centroids.round(2).to_dict(orient='records'), 'jobs': args.jobs, 'cpu_count': os.cpu_count(),
+            'stages': stages, 'peak_rss_mb': round(max(s['peak_rss_mb'] for s in stages.values()), 1)}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--source', default='hospital_hybrid_final.db', help='SQLite database, shard directory, .csv or .parquet')
+    parser.add_argument('--chunksize', type=int, default=100000, help='rows read per chunk')
+    parser.add_argument('--rf-sample', type=int, default=500000, help='most rows the forest trains on (uniform reservoir sample)')
+    parser.add_argument('--holdout', type=int, default=50000, help='most rows kept back for the accuracy check')
+    parser.add_argument('--holdout-share', type=float, default=0.05, help='share of rows routed to the holdout sample')
+    parser.add_argument('--trees', type=int, default=100)
+    parser.add_argument('--jobs', type=int, default=-1, help='parallel jobs for the forest (-1: every core)')
+    parser.add_argument('--batch-size', type=int, default=4096, help='K-Means mini-batch size')
+    parser.add_argument('--kmeans-epochs', type=int, default=1, help='passes over the source for K-Means')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--version', help='model version name (default: a timestamp)')
+    parser.add_argument('--activate', action='store_true', help='make the new version active (models/CURRENT)')
+    parser.add_argument('--report', help='write the JSON report here as well')
+    args = parser.parse_args()
+
+    report = json.dumps(train(args), indent=2)
+    print(report)
+    if args.report:
+        with open(args.report, 'w') as f: f.write(report)
+
+if __name__ == '__main__':
+    main()
@@ -37,4 +37,9 @@ joblib.dump(kmeans, 'kmeans_model.joblib')
 joblib.dump(HIGH_RISK_CLUSTER_INDEX, 'high_risk_cluster_index.joblib')
 
 print("\n✅ Unsupervised Models (Scaler, K-Means) trained and saved.")
-print(f"   -> The High Risk Cluster Index is: {HIGH_RISK_CLUSTER_INDEX}")
\ No newline at end of file
+print(f"   -> The High Risk Cluster Index is: {HIGH_RISK_CLUSTER_INDEX}")
+
+# 7. Publish a versioned snapshot (with the current Random Forest) for hot-swapping into a running app
+from model_registry import publish
+version = publish()
+print(f"   -> Published as model version {version}. Activate it with: python model_registry.py activate {version}")
\ No newline at end of file